@@ -3,9 +3,11 @@ from fastapi import APIRouter
 from app.api.warehouse import router as warehouse_router
 from app.api.heatmap import router as heatmap_router
 from app.api.import_data import router as import_router
+from app.api.export_data import router as export_router
 from app.api.report import router as report_router
 from app.api.auth import router as auth_router
 from app.api.user import router as user_router
+from app.api.pick_events import router as pick_events_router
 
 api_router = APIRouter()
 
@@ -17,4 +19,6 @@ api_router.include_router(user_router, prefix="/users", tags=["用户管理"])
 api_router.include_router(warehouse_router, prefix="/warehouse", tags=["仓库管理"])
 api_router.include_router(heatmap_router, prefix="/heatmap", tags=["热力图"])
 api_router.include_router(import_router, prefix="/import", tags=["数据导入"])
+api_router.include_router(export_router, prefix="/export", tags=["数据导出"])
 api_router.include_router(report_router, prefix="/report", tags=["分析报告"])
+api_router.include_router(pick_events_router, prefix="/pick-events", tags=["拣货事件"])
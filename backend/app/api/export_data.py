@@ -0,0 +1,42 @@
+"""数据导出 API"""
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.schemas.warehouse import ExportFormatEnum
+from app.services.export_service import HeatDataExportService
+
+router = APIRouter()
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormatEnum.CSV: "text/csv; charset=utf-8",
+    ExportFormatEnum.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@router.get("/heat-data", summary="导出热度数据")
+async def export_heat_data(
+    format: ExportFormatEnum = Query(ExportFormatEnum.CSV, description="导出格式: csv 或 xlsx"),
+    zone_id: Optional[int] = Query(None, description="库区ID（不指定则导出全部库区）"),
+    start_date: Optional[date] = Query(None, description="开始日期（含）"),
+    end_date: Optional[date] = Query(None, description="结束日期（含）")
+):
+    """
+    按日期范围和库区导出热度数据（含库位、库区、巷道、货架编码）
+    
+    使用服务端游标分批读取并流式输出，导出大量数据时不会整体载入内存。
+    CSV 边读边发送；XLSX 先写入临时文件，写完后开始发送。
+    前几列与导入模板相同，导出的文件可以直接导入
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    
+    service = HeatDataExportService(zone_id, start_date, end_date)
+    content = service.stream_csv() if format == ExportFormatEnum.CSV else service.stream_xlsx()
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f"attachment; filename={service.filename(format.value)}"
+        }
+    )
@@ -1,12 +1,24 @@
 """热力图 API"""
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
-from app.database import get_db
-from app.services.heatmap_service import HeatmapService
+from app.config import settings
+from app.database import get_db, AsyncSessionLocal
+from app.services.heatmap_service import HeatmapService, DEFAULT_HEAT_BUCKETS
+from app.services.heatmap_cache import HeatmapCache
+from app.services.heatmap_render_service import HeatmapRenderService
+from app.services.heat_push_service import HeatPushHub
+from app.services.heat_scoring import HeatScoringService
+from app.services.data_version import DataVersion
+from app.utils.etag import not_modified, set_etag
+from app.models.warehouse import Zone
 from app.schemas.warehouse import (
-    HeatmapFilterParams, HeatmapDataResponse, ShelfTypeEnum
+    HeatmapFilterParams, HeatmapDataResponse, WarehouseHeatmapResponse,
+    ShelfTypeEnum, HeatmapFormatEnum, HeatScaleMethodEnum
 )
 
 router = APIRouter()
@@ -14,11 +26,16 @@ router = APIRouter()
 
 @router.get("/zone/{zone_id}", response_model=HeatmapDataResponse, summary="获取热力图数据")
 async def get_heatmap_data(
+    request: Request,
+    response: Response,
     zone_id: int,
     time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
     shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
     start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
     end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    response_format: HeatmapFormatEnum = Query(HeatmapFormatEnum.JSON, alias="format", description="响应格式: json, columnar, packed"),
+    scale: Optional[HeatScaleMethodEnum] = Query(None, description="热度分级方法: quantile, jenks；为空时不分级"),
+    buckets: int = Query(DEFAULT_HEAT_BUCKETS, ge=2, le=20, description="热度分级的档数"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -29,6 +46,17 @@ async def get_heatmap_data(
     - **shelf_type**: 货架类型筛选（可选）
     - **start_date**: 自定义开始日期（time_range=custom 时使用）
     - **end_date**: 自定义结束日期（time_range=custom 时使用）
+    - **format**: 响应格式
+        - json: 嵌套对象（默认）
+        - columnar: 库位字段为平行数组，编码字典编码到 strings 中
+        - packed: 二进制（application/octet-stream），JSON 头部 + 8 字节对齐的类型数组，
+          格式见 app.utils.packed.pack_columns
+    - **scale**: 热度分级方法（可选），返回 heat_scale（断点和 p50/p90/p99）及每个库位的 heat_bucket
+        - quantile: 每档库位数相同，不受个别极热库位影响
+        - jenks: 自然断点，档内差异最小
+    - **buckets**: 分级档数（2~20，默认 5）
+    
+    响应带有 ETag，请求头 If-None-Match 匹配时直接返回 304，不查询数据
     """
     params = HeatmapFilterParams(
         zone_id=zone_id,
@@ -39,14 +67,346 @@ async def get_heatmap_data(
     )
     
     service = HeatmapService(db)
-    result = await service.get_heatmap_data(zone_id, params)
+    etag = service.get_heatmap_etag(zone_id, params, response_format, scale, buckets)
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    if response_format != HeatmapFormatEnum.JSON:
+        columns = await service.get_heatmap_columns(zone_id, params, scale, buckets)
+        if not columns:
+            raise HTTPException(status_code=404, detail="库区不存在")
+        
+        if response_format == HeatmapFormatEnum.PACKED:
+            columns_response = Response(
+                content=service.pack_heatmap_columns(columns),
+                media_type="application/octet-stream"
+            )
+        else:
+            columns_response = JSONResponse(content=columns)
+        set_etag(columns_response, etag)
+        return columns_response
+    
+    result = await service.get_heatmap_data(zone_id, params, scale, buckets)
     
     if not result:
         raise HTTPException(status_code=404, detail="库区不存在")
     
+    set_etag(response, etag)
+    return result
+
+
+@router.get("/warehouse/{warehouse_id}", response_model=WarehouseHeatmapResponse, summary="获取仓库热力图数据")
+async def get_warehouse_heatmap(
+    request: Request,
+    response: Response,
+    warehouse_id: int,
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    scale: Optional[HeatScaleMethodEnum] = Query(None, description="热度分级方法: quantile, jenks；为空时不分级"),
+    buckets: int = Query(DEFAULT_HEAT_BUCKETS, ge=2, le=20, description="热度分级的档数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    一次获取仓库所有启用库区的热力图数据
+    
+    - **warehouse_id**: 仓库ID
+    - 筛选参数和分级参数与 /zone/{zone_id} 相同
+    
+    顶层 min_heat / max_heat 和 heat_scale 为所有库区共用的范围和分级，用于统一配色；
+    响应带有 ETag，请求头 If-None-Match 匹配时直接返回 304
+    """
+    params = HeatmapFilterParams(
+        shelf_type=shelf_type,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    service = HeatmapService(db)
+    etag = await service.get_warehouse_heatmap_etag(warehouse_id, params, scale, buckets)
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    result = await service.get_warehouse_heatmap(warehouse_id, params, scale, buckets)
+    if not result:
+        raise HTTPException(status_code=404, detail="仓库不存在")
+    
+    set_etag(response, etag)
     return result
 
 
+def _image_response(path: str, etag: str) -> FileResponse:
+    response = FileResponse(path, media_type="image/png")
+    set_etag(response, etag)
+    return response
+
+
+@router.get("/zone/{zone_id}/image", summary="获取库区热力图图片")
+async def get_zone_heatmap_image(
+    request: Request,
+    zone_id: int,
+    zoom: Optional[int] = Query(None, ge=0, le=HeatmapRenderService.MAX_ZOOM, description="缩放级别，每个库位 2^zoom 像素；为空时自动适配最大尺寸"),
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    将库区热力图渲染为 PNG 整图（用于大屏展示和报告）
+    
+    货架按 x_coordinate / 通道 y_coordinate 排布，配色与前端热力图一致；
+    渲染结果按数据版本缓存在磁盘上，响应带有 ETag
+    """
+    params = HeatmapFilterParams(
+        zone_id=zone_id,
+        shelf_type=shelf_type,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    service = HeatmapRenderService(db)
+    etag = service.get_zone_image_etag(zone_id, params, zoom)
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    try:
+        path = await service.render_zone_image(zone_id, params, zoom)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not path:
+        raise HTTPException(status_code=404, detail="库区不存在")
+    return _image_response(path, etag)
+
+
+@router.get("/zone/{zone_id}/tiles/{zoom}/{x}/{y}.png", summary="获取库区热力图瓦片")
+async def get_zone_heatmap_tile(
+    request: Request,
+    zone_id: int,
+    zoom: int,
+    x: int,
+    y: int,
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    库区热力图的 256x256 PNG 瓦片
+    
+    - **zoom**: 缩放级别（0~5），每个库位 2^zoom 像素
+    - **x / y**: 瓦片列号 / 行号，从左上角 (0, 0) 开始；超出图像范围时返回空白瓦片
+    """
+    if not 0 <= zoom <= HeatmapRenderService.MAX_ZOOM:
+        raise HTTPException(status_code=404, detail="缩放级别不存在")
+    
+    params = HeatmapFilterParams(
+        zone_id=zone_id,
+        shelf_type=shelf_type,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    service = HeatmapRenderService(db)
+    etag = service.get_zone_image_etag(zone_id, params, zoom, (x, y))
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    path = await service.render_zone_image(zone_id, params, zoom, (x, y))
+    if not path:
+        raise HTTPException(status_code=404, detail="库区不存在")
+    return _image_response(path, etag)
+
+
+@router.get("/warehouse/{warehouse_id}/image", summary="获取仓库热力图图片")
+async def get_warehouse_heatmap_image(
+    request: Request,
+    warehouse_id: int,
+    zoom: Optional[int] = Query(None, ge=0, le=HeatmapRenderService.MAX_ZOOM, description="缩放级别，每个库位 2^zoom 像素；为空时自动适配最大尺寸"),
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """将仓库所有启用库区的热力图渲染为 PNG 整图，库区自上而下排列，共用同一配色"""
+    params = HeatmapFilterParams(
+        shelf_type=shelf_type,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    service = HeatmapRenderService(db)
+    etag = await service.get_warehouse_image_etag(warehouse_id, params, zoom)
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    try:
+        path = await service.render_warehouse_image(warehouse_id, params, zoom)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not path:
+        raise HTTPException(status_code=404, detail="仓库不存在")
+    return _image_response(path, etag)
+
+
+@router.get("/warehouse/{warehouse_id}/tiles/{zoom}/{x}/{y}.png", summary="获取仓库热力图瓦片")
+async def get_warehouse_heatmap_tile(
+    request: Request,
+    warehouse_id: int,
+    zoom: int,
+    x: int,
+    y: int,
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    shelf_type: Optional[ShelfTypeEnum] = Query(None, description="货架类型筛选"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """仓库热力图的 256x256 PNG 瓦片，参数与 /zone/{zone_id}/tiles 相同"""
+    if not 0 <= zoom <= HeatmapRenderService.MAX_ZOOM:
+        raise HTTPException(status_code=404, detail="缩放级别不存在")
+    
+    params = HeatmapFilterParams(
+        shelf_type=shelf_type,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    service = HeatmapRenderService(db)
+    etag = await service.get_warehouse_image_etag(warehouse_id, params, zoom, (x, y))
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    path = await service.render_warehouse_image(warehouse_id, params, zoom, (x, y))
+    if not path:
+        raise HTTPException(status_code=404, detail="仓库不存在")
+    return _image_response(path, etag)
+
+
+@router.get("/zone/{zone_id}/stream", summary="订阅库区热度实时推送")
+async def stream_zone_heat(
+    request: Request,
+    zone_id: int,
+    time_range: str = Query("today", description="时间范围: today, 7days, 30days, custom"),
+    start_date: Optional[datetime] = Query(None, description="开始日期（自定义时间范围时使用）"),
+    end_date: Optional[datetime] = Query(None, description="结束日期（自定义时间范围时使用）")
+):
+    """
+    以 Server-Sent Events 推送库区热度变化（用于大屏，替代轮询）
+    
+    热度写入、批量更新或导入提交后，合并短时间窗口内的变更再推送：
+    - **delta**: `{"zone_id", "locations": {"location_id": [...], "heat_value": [...], "pick_frequency": [...], "turnover_rate": [...], "inventory_qty": [...]}}`，
+      为所选时间范围内的聚合值，直接替换对应库位
+    - **reload**: 布局变化或变化过多，应重新拉取 /zone/{zone_id}
+    - **close**: 服务关闭，客户端稍后重连
+    
+    连接建立后先发送 ready 事件；空闲时定期发送注释行作为心跳
+    """
+    # 连接期间不持有数据库会话，只在订阅前检查库区是否存在
+    async with AsyncSessionLocal() as db:
+        if not await db.get(Zone, zone_id):
+            raise HTTPException(status_code=404, detail="库区不存在")
+    
+    params = HeatmapFilterParams(
+        zone_id=zone_id,
+        time_range=time_range,
+        start_date=start_date,
+        end_date=end_date
+    )
+    subscriber = HeatPushHub.subscribe(zone_id, params)
+    
+    def format_event(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+    
+    async def event_stream():
+        try:
+            yield format_event("ready", {"zone_id": zone_id})
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.HEAT_PUSH_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                
+                # 同一条消息会发给多个订阅者，不修改消息本身
+                event = message["type"]
+                yield format_event(event, {key: value for key, value in message.items() if key != "type"})
+                if event == "close":
+                    break
+        finally:
+            HeatPushHub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats", summary="热力图缓存统计")
+async def get_heatmap_cache_stats():
+    """
+    热力图响应缓存的统计信息
+    
+    - **backend**: 缓存后端（local/redis/none）
+    - **entries / max_entries**: 当前与最大缓存条目数（Redis 后端不统计）
+    - **hits / misses / hit_rate**: 本进程的命中、未命中次数和命中率
+    - **images**: 图片/瓦片磁盘缓存的统计
+    """
+    return {**HeatmapCache.stats(), "images": HeatmapRenderService.stats()}
+
+
+@router.get("/formula", summary="获取热度计算公式")
+async def get_heat_formula(db: AsyncSession = Depends(get_db)):
+    """
+    当前的热度计算公式及重算状态
+
+    - **scorer / signature**: 当前使用的公式（HEAT_SCORER，留空时配置了权重即为 weighted）及其参数签名
+    - **stored_signature**: 已存储热度值使用的公式签名
+    - **needs_recompute**: 两者不一致，已存储的热度值需要重算
+    - **zone_norms**: 各库区的归一化基准（单日各指标的最大值）
+    """
+    try:
+        return await HeatScoringService(db).get_state()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/formula/recompute", summary="重算全部热度值")
+async def recompute_heat_values(db: AsyncSession = Depends(get_db)):
+    """
+    按当前公式重算全部已存储的热度值，并刷新库区归一化基准和热度汇总
+
+    修改热度公式或权重后应用启动时会自动执行；
+    新写入的数据超出库区基准较多时也可手动调用，使归一化基准更新。
+    热度值分批提交，重算期间不阻塞其他写入
+    """
+    try:
+        result = await HeatScoringService(db).recompute(commit_batches=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    return {"success": True, **result}
+
+
 @router.post("/update", summary="更新库位热度数据")
 async def update_heat_data(
     location_id: int,
@@ -177,10 +537,12 @@ async def clear_all_heat_data(
 ):
     """清空所有热力数据，用于重新导入"""
     from sqlalchemy import delete
-    from app.models.warehouse import LocationHeatData
+    from app.models.warehouse import LocationHeatData, LocationHeatRollup
     
-    # 删除所有热力数据
+    # 删除所有热力数据及其汇总
     result = await db.execute(delete(LocationHeatData))
+    await db.execute(delete(LocationHeatRollup))
+    DataVersion.mark_all(db)
     await db.commit()
     
     deleted_count = result.rowcount
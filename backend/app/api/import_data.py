@@ -5,7 +5,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from io import BytesIO
 from typing import List, Dict, Any
 from app.database import get_db
+from app.schemas.warehouse import ImportModeEnum
 from app.services.import_service import ImportService
+from app.services.import_job_service import ImportJobService
+from app.utils.upload import spool_upload, save_upload
 
 router = APIRouter()
 
@@ -15,14 +18,37 @@ async def get_import_history(
     limit: int = Query(20, description="返回记录数量"),
     db: AsyncSession = Depends(get_db)
 ) -> List[Dict[str, Any]]:
-    """获取最近的导入记录"""
+    """获取最近的导入记录（排队中和执行中的异步导入任务排在最前）"""
     service = ImportService(db)
-    return await service.get_import_history(limit)
+    active_jobs = await ImportJobService(db).get_active_history()
+    return active_jobs + await service.get_import_history(limit)
+
+
+@router.get("/jobs/{job_id}", summary="获取异步导入任务状态")
+async def get_import_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    获取异步导入任务的进度
+    
+    返回已处理行数、预估总行数、吞吐量(rows_per_second)、预计剩余时间(eta_seconds)
+    以及目前为止的错误信息；任务结束后 result 为完整的导入结果
+    """
+    job = await ImportJobService(db).get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job
 
 
 @router.post("/excel", summary="导入 Excel 数据")
 async def import_excel(
     file: UploadFile = File(..., description="Excel 文件 (.xlsx, .xls)"),
+    mode: ImportModeEnum = Query(
+        ImportModeEnum.REPLACE,
+        description="导入模式: replace(清空后导入), merge(按库位和日期合并), replace_range(只替换文件中的日期)"
+    ),
+    async_mode: bool = Query(False, description="是否异步导入（立即返回任务 ID）"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -36,14 +62,21 @@ async def import_excel(
     - 库存数量 / inventory_qty (可选)
     - 入库数量 / inbound_qty (可选)
     - 出库数量 / outbound_qty (可选)
+    
+    上传内容先写入临时文件，再按块读取、处理并提交，大文件不会整体载入内存。
+    async_mode=true 时立即返回任务 ID，通过 /import/jobs/{job_id} 查询进度。
+    默认 mode=replace 会清空全部历史热度数据；日常增量文件使用 merge 或 replace_range
     """
     # 验证文件类型
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="仅支持 .xlsx 和 .xls 格式")
     
-    content = await file.read()
+    if async_mode:
+        return await _submit_import_job(file, "excel", mode, db)
+    
     service = ImportService(db)
-    result = await service.import_from_excel(content, file.filename)
+    async with spool_upload(file) as source:
+        result = await service.import_excel_file(source, file.filename, mode)
     
     return result
 
@@ -51,23 +84,49 @@ async def import_excel(
 @router.post("/csv", summary="导入 CSV 数据")
 async def import_csv(
     file: UploadFile = File(..., description="CSV 文件"),
+    mode: ImportModeEnum = Query(
+        ImportModeEnum.REPLACE,
+        description="导入模式: replace(清空后导入), merge(按库位和日期合并), replace_range(只替换文件中的日期)"
+    ),
+    async_mode: bool = Query(False, description="是否异步导入（立即返回任务 ID）"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     从 CSV 文件导入热度数据
     
-    支持 UTF-8 和 GBK 编码
+    支持 UTF-8 和 GBK 编码，按文件开头判断编码后分块读取。
+    async_mode=true 时立即返回任务 ID，通过 /import/jobs/{job_id} 查询进度。
+    默认 mode=replace 会清空全部历史热度数据；日常增量文件使用 merge 或 replace_range
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="仅支持 .csv 格式")
     
-    content = await file.read()
+    if async_mode:
+        return await _submit_import_job(file, "csv", mode, db)
+    
     service = ImportService(db)
-    result = await service.import_from_csv(content, file.filename)
+    async with spool_upload(file) as source:
+        result = await service.import_csv_file(source, file.filename, mode)
     
     return result
 
 
+async def _submit_import_job(
+    file: UploadFile,
+    file_type: str,
+    mode: ImportModeEnum,
+    db: AsyncSession
+) -> Dict[str, Any]:
+    """将上传文件落盘并提交后台导入任务"""
+    path = await save_upload(file)
+    job = await ImportJobService(db).submit(path, file.filename, file_type, mode)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/import/jobs/{job.id}"
+    }
+
+
 @router.get("/template/excel", summary="下载 Excel 导入模板")
 async def download_excel_template(db: AsyncSession = Depends(get_db)):
     """下载 Excel 导入模板（使用数据库中实际的库位编码）"""
@@ -0,0 +1,84 @@
+"""拣货事件上报 API"""
+import math
+from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import TypeAdapter, ValidationError
+from app.config import settings
+from app.schemas.warehouse import PickEvent
+from app.services.pick_event_service import PickEventBuffer
+
+router = APIRouter()
+
+_event_list_adapter = TypeAdapter(List[PickEvent])
+
+
+def _parse_events(content_type: str, body: bytes) -> List[PickEvent]:
+    """解析请求体：NDJSON（每行一个事件），或 JSON 单个事件 / 事件数组"""
+    if "ndjson" in content_type or "jsonl" in content_type:
+        events = []
+        for line_number, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                events.append(PickEvent.model_validate_json(line))
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=f"第 {line_number} 行格式错误: {e.errors()[0]['msg']}")
+        return events
+
+    stripped = body.lstrip()
+    try:
+        if stripped.startswith(b"["):
+            return _event_list_adapter.validate_json(body)
+        return [PickEvent.model_validate_json(body)]
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise HTTPException(status_code=400, detail=f"事件格式错误 ({location}): {error['msg']}")
+
+
+@router.post("", status_code=202, summary="上报拣货事件")
+async def ingest_pick_events(request: Request):
+    """
+    上报扫码枪的拣货事件，事件在内存中合并后批量累加到热度数据
+
+    请求体为单个事件、事件数组（application/json），
+    或每行一个事件的 NDJSON（application/x-ndjson）:
+    ```
+    {"location_code": "WH001-A-01巷-货架01-A1", "timestamp": "2024-01-01T08:30:00", "qty": 2}
+    ```
+    - 每个事件使拣货频次 +1、出库数量 +qty（qty 默认为 1）
+    - 整批格式校验通过才会接受；返回 202 时事件已进入缓冲，数秒内写入
+    - 缓冲已满时返回 429（带 Retry-After），调用方应稍后重试整批
+    - 无法识别的库位编码在写入时丢弃，计入 /stats 的 unknown_events
+    """
+    events = _parse_events(request.headers.get("content-type", ""), await request.body())
+    if not events:
+        return {"accepted": 0, "pending_events": PickEventBuffer.pending_events()}
+
+    if not PickEventBuffer.add(events):
+        raise HTTPException(
+            status_code=429,
+            detail="拣货事件缓冲已满，请稍后重试",
+            headers={"Retry-After": str(math.ceil(settings.PICK_FLUSH_INTERVAL_SECONDS))}
+        )
+
+    return {"accepted": len(events), "pending_events": PickEventBuffer.pending_events()}
+
+
+@router.get("/stats", summary="拣货事件缓冲统计")
+async def get_pick_event_stats():
+    """缓冲中的事件数、已写入/拒绝/无法识别/丢弃的事件数、写入失败次数和最近的错误等（本进程的统计）"""
+    return PickEventBuffer.stats()
+
+
+@router.post("/flush", summary="立即写入拣货事件")
+async def flush_pick_events():
+    """立即写入缓冲中的事件（通常由后台任务定时写入，无需调用）"""
+    try:
+        rows = await PickEventBuffer.flush()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"写入失败，事件已保留在缓冲中（连续失败达到上限时丢弃，见 /stats 的 dropped_events）: {str(e)}"
+        )
+    return {"written_rows": rows, **PickEventBuffer.stats()}
@@ -1,16 +1,17 @@
 """仓库管理 API"""
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.database import get_db
 from app.services.warehouse_service import WarehouseService
+from app.utils.etag import not_modified, set_etag
 from app.schemas.warehouse import (
     WarehouseCreate, WarehouseUpdate, WarehouseResponse,
     ZoneCreate, ZoneResponse,
     AisleCreate, AisleResponse,
     ShelfCreate, ShelfResponse,
     LocationResponse, ShelfTypeEnum,
-    ShelfDisplayLabelUpdate
+    ShelfDisplayLabelUpdate, LayoutModeEnum
 )
 
 router = APIRouter()
@@ -170,14 +171,28 @@ async def get_locations(
 
 @router.get("/{warehouse_id}/layout", summary="获取仓库布局数据")
 async def get_warehouse_layout(
+    request: Request,
+    response: Response,
     warehouse_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """获取仓库的完整布局数据，用于画布编辑器加载"""
+    """
+    获取仓库的完整布局数据，用于画布编辑器加载
+    
+    响应带有 ETag，请求头 If-None-Match 匹配时直接返回 304，不查询布局数据
+    （仍先确认仓库存在，已删除或不存在的仓库返回 404）
+    """
     service = WarehouseService(db)
     warehouse = await service.get_warehouse(warehouse_id)
     if not warehouse:
         raise HTTPException(status_code=404, detail="仓库不存在")
+    
+    etag = service.get_layout_etag(warehouse_id)
+    cached_response = not_modified(request, etag)
+    if cached_response:
+        return cached_response
+    
+    set_etag(response, etag)
     return await service.get_warehouse_layout(warehouse_id)
 
 
@@ -186,11 +201,17 @@ async def setup_warehouse_layout(
     warehouse_code: str,
     warehouse_name: str,
     zones_config: List[dict] = Body(..., description="库区配置列表"),
+    mode: LayoutModeEnum = Query(LayoutModeEnum.REPLACE, description="设置模式"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     批量设置仓库布局
     
+    mode:
+    - replace: 删除现有布局和热度数据后重建
+    - reconcile: 按编码与现有布局对比，只新增、更新、停用变化的库区 / 巷道 / 货架 / 库位，
+      保留的库位 ID 和热度数据不变（提交中不存在的对象停用而不删除）
+    
     zones_config 示例:
     ```json
     [
@@ -222,10 +243,10 @@ async def setup_warehouse_layout(
     logger = logging.getLogger(__name__)
     
     try:
-        logger.info(f"Setting up warehouse layout: code={warehouse_code}, name={warehouse_name}")
+        logger.info(f"Setting up warehouse layout: code={warehouse_code}, name={warehouse_name}, mode={mode.value}")
         logger.info(f"Zones config: {zones_config}")
         service = WarehouseService(db)
-        result = await service.setup_warehouse_layout(warehouse_code, warehouse_name, zones_config)
+        result = await service.setup_warehouse_layout(warehouse_code, warehouse_name, zones_config, mode)
         logger.info(f"Layout setup successful for warehouse: {warehouse_code}")
         return result
     except Exception as e:
@@ -19,10 +19,78 @@ class Settings(BaseSettings):
     # CORS 配置（支持 * 表示允许所有源）
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
     
-    # 热度计算权重
+    # 热度计算公式（见 app/services/heat_scoring.py）
+    # frequency: 热度值等于拣货频率；weighted: 按库区归一化后的各指标加权
+    # 留空时：配置了 HEAT_WEIGHT_* 或 HEAT_SCORE_SCALE 则使用 weighted，否则使用 frequency
+    # 公式或参数变化后，启动时自动重算已存储的热度值及其汇总
+    HEAT_SCORER: str = ""
+    # 热度计算权重（weighted 公式使用）
     HEAT_WEIGHT_FREQUENCY: float = 0.6
     HEAT_WEIGHT_TURNOVER: float = 0.4
+    HEAT_WEIGHT_OUTBOUND: float = 0.0
+    # weighted 公式的热度值上限（各指标都达到库区最大值时的单日热度）
+    HEAT_SCORE_SCALE: float = 1000.0
+
+    # 数据导入：每块处理的行数（merge / replace_range 模式逐块提交）
+    IMPORT_CHUNK_SIZE: int = 20000
     
+    # 热力图响应缓存
+    # CACHE_BACKEND: local（进程内 LRU）、redis（多进程共享，需安装 redis 包）或 none（不缓存）
+    CACHE_BACKEND: str = "local"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    # 进程内缓存的最大条目数
+    HEATMAP_CACHE_SIZE: int = 256
+    # Redis 缓存项的过期时间（秒）
+    CACHE_TTL_SECONDS: int = 3600
+
+    # 热度分级（scale 参数）：参与统计的库位数不超过该值时精确计算分位数，
+    # 超出后使用近似分位数草图（相对误差 1%），耗时与库位数成线性
+    HEAT_SCALE_EXACT_MAX_VALUES: int = 50000
+
+    # 热力图图片/瓦片的磁盘缓存目录（文件名包含数据版本，数据变化后自动生成新文件）
+    HEATMAP_TILE_DIR: str = "./heatmap_tiles"
+    # 磁盘缓存的最大文件数，超出后删除最久未使用的文件
+    HEATMAP_TILE_CACHE_MAX_FILES: int = 5000
+    # 整图渲染的最大边长（像素），未指定缩放级别时自动选取不超过该尺寸的最大级别
+    HEATMAP_IMAGE_MAX_SIZE: int = 4096
+
+    # 热度实时推送（SSE）
+    # 合并变更的时间窗口（秒），窗口内的多次提交合并为一条消息
+    HEAT_PUSH_INTERVAL_SECONDS: float = 1.0
+    # 单个库区一次变更的库位数超过该值时，推送 reload 让客户端重新拉取，而不是发送增量
+    HEAT_PUSH_MAX_DELTA: int = 5000
+    # 空闲连接的心跳间隔（秒）
+    HEAT_PUSH_HEARTBEAT_SECONDS: float = 15.0
+    # 每个订阅者待发送消息的上限，积压超过上限时丢弃积压并改为推送 reload
+    HEAT_PUSH_QUEUE_SIZE: int = 100
+
+    # 分析报告的热度分布：各档的分界值（逗号分隔，升序）和档名（比分界值多一个）
+    REPORT_HEAT_BUCKETS: str = "50,100,200,300"
+    REPORT_HEAT_BUCKET_LABELS: str = "极冷,较冷,一般,较热,极热"
+    # 分析报告的统计来源：detail（逐条热度记录，默认）、rollup（全部历史汇总，按库位日均值）
+    # 或 auto（库区报告用 detail，全部范围用 rollup）。
+    # rollup 的热度分布按库位计数、TOP 库位和频率范围按日均值，与 detail 的数字不同，需显式开启
+    REPORT_DATA_SOURCE: str = "detail"
+    # 分析报告生成任务：同时执行的任务数（也是生成 Word 文档的工作进程数）
+    REPORT_WORKERS: int = 2
+    # 生成 Word 文档的执行方式：process（进程池，不占用 API 进程的 GIL）或 thread（线程池）
+    REPORT_EXECUTOR: str = "process"
+    # 报告文件保留策略（0 表示不限制，只清理报告任务生成的文件）：超过保留天数的文件删除，
+    # 文件数或总大小超出上限时从最早的文件开始删除
+    REPORT_RETENTION_DAYS: int = 30
+    REPORT_MAX_FILES: int = 200
+    REPORT_MAX_TOTAL_MB: int = 500
+
+    # 拣货事件实时上报：事件在内存中按 (库位, 日期) 合并后批量累加写入
+    # 定时写入的间隔（秒）
+    PICK_FLUSH_INTERVAL_SECONDS: float = 2.0
+    # 缓冲中的事件数达到该值时立即写入
+    PICK_FLUSH_EVENTS: int = 20000
+    # 缓冲的最大事件数（含写入中的），超出时拒绝上报（HTTP 429）
+    PICK_BUFFER_MAX_EVENTS: int = 200000
+    # 连续写入失败（非临时性错误，如约束缺失）达到该次数时丢弃本批事件，避免缓冲一直占满
+    PICK_FLUSH_MAX_FAILURES: int = 5
+
     @property
     def cors_origins_list(self) -> List[str]:
         """获取 CORS 允许的源列表"""
@@ -32,6 +100,36 @@ class Settings(BaseSettings):
             return ["*"]
         return [origin.strip() for origin in origins.split(",")]
     
+    @property
+    def heat_weights_configured(self) -> bool:
+        """是否显式配置了 weighted 公式的权重或上限（环境变量或 .env）"""
+        return bool(self.model_fields_set & {
+            "HEAT_WEIGHT_FREQUENCY", "HEAT_WEIGHT_TURNOVER", "HEAT_WEIGHT_OUTBOUND", "HEAT_SCORE_SCALE"
+        })
+    
+    @property
+    def heat_scorer_name(self) -> str:
+        """实际使用的热度公式：HEAT_SCORER 留空时，配置了权重即为 weighted，否则为 frequency"""
+        name = self.HEAT_SCORER.strip()
+        if name:
+            return name
+        return "weighted" if self.heat_weights_configured else "frequency"
+    
+    @property
+    def report_heat_bucket_edges(self) -> List[float]:
+        """报告热度分布的分界值（去重并升序）"""
+        edges = {float(edge) for edge in self.REPORT_HEAT_BUCKETS.split(",") if edge.strip()}
+        return sorted(edges)
+    
+    @property
+    def report_heat_bucket_labels(self) -> List[str]:
+        """报告热度分布的档名，数量与档数不一致时使用“第 N 档”"""
+        labels = [label.strip() for label in self.REPORT_HEAT_BUCKET_LABELS.split(",")]
+        bucket_count = len(self.report_heat_bucket_edges) + 1
+        if len(labels) != bucket_count:
+            return [f"第 {i + 1} 档" for i in range(bucket_count)]
+        return labels
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
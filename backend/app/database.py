@@ -1,8 +1,12 @@
 """数据库连接模块"""
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import select
+import logging
+from sqlalchemy import select, inspect, text
 from app.config import settings
+from app.utils.bulk import enable_multirow_inserts
+
+logger = logging.getLogger(__name__)
 
 # 根据数据库类型配置引擎参数
 engine_kwargs = {
@@ -19,6 +23,8 @@ if not settings.DATABASE_URL.startswith("sqlite"):
 
 # 创建异步引擎
 engine = create_async_engine(settings.DATABASE_URL, **engine_kwargs)
+# 批量 upsert 以多行 INSERT 发送
+enable_multirow_inserts(engine)
 
 # 创建异步会话工厂
 AsyncSessionLocal = async_sessionmaker(
@@ -47,9 +53,62 @@ async def get_db():
 
 
 async def init_db():
-    """初始化数据库表"""
+    """初始化数据库表，并为旧版本创建的数据库补齐缺少的约束"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_ensure_heat_unique_key)
+
+
+# 热度数据 (location_id, date) 唯一约束，批量 upsert（ON CONFLICT / ON DUPLICATE KEY）依赖该约束
+HEAT_UNIQUE_KEY = "uq_heat_location_date"
+HEAT_UNIQUE_COLUMNS = ["location_id", "date"]
+
+# 各数据库中把 date 归一化为当天 00:00:00 的表达式
+_HEAT_DAY_EXPRESSIONS = {
+    "sqlite": "date(date) || ' 00:00:00.000000'",
+    "postgresql": "date_trunc('day', date)",
+    "mysql": "CAST(DATE(date) AS DATETIME)",
+}
+
+
+def _ensure_heat_unique_key(conn) -> None:
+    """
+    为旧版本创建的 location_heat_data 补建 (location_id, date) 唯一索引
+
+    create_all 不会修改已存在的表。缺少唯一约束时：
+    1. date 归一化为当天 00:00:00
+    2. 同一库位同一天的重复记录只保留 id 最大的一条
+    3. 创建唯一索引
+    已有唯一约束或唯一索引时不做任何修改。删除重复记录后热度汇总与原始数据不一致，
+    由启动时的 HeatRollupService.rebuild_if_inconsistent 重建
+    """
+    inspector = inspect(conn)
+    table = "location_heat_data"
+    if not inspector.has_table(table):
+        return
+    for constraint in inspector.get_unique_constraints(table):
+        if constraint["column_names"] == HEAT_UNIQUE_COLUMNS:
+            return
+    for index in inspector.get_indexes(table):
+        if index.get("unique") and index["column_names"] == HEAT_UNIQUE_COLUMNS:
+            return
+
+    dialect_name = conn.dialect.name
+    logger.warning("location_heat_data 缺少 (location_id, date) 唯一约束，开始补建")
+    day = _HEAT_DAY_EXPRESSIONS.get(dialect_name)
+    if day is not None:
+        conn.execute(text(f"UPDATE {table} SET date = {day} WHERE date <> {day}"))
+    # 子查询包一层派生表，MySQL 不允许在 DELETE 的子查询中直接读取被删除的表
+    deleted = conn.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT id FROM (SELECT MAX(id) AS id FROM {table} GROUP BY location_id, date) AS keep_rows)"
+    )).rowcount
+    # MySQL 不支持 CREATE INDEX IF NOT EXISTS，上面已确认索引不存在
+    if_not_exists = "" if dialect_name == "mysql" else "IF NOT EXISTS "
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX {if_not_exists}{HEAT_UNIQUE_KEY} ON {table} ({', '.join(HEAT_UNIQUE_COLUMNS)})"
+    ))
+    logger.warning("已创建唯一索引 %s，删除重复热度记录 %s 条", HEAT_UNIQUE_KEY, deleted)
 
 
 async def init_default_admin():
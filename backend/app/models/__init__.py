@@ -6,6 +6,9 @@ from app.models.warehouse import (
     Shelf,
     Location,
     LocationHeatData,
+    LocationHeatRollup,
+    ZoneHeatNorm,
+    HeatFormulaState,
     ShelfType
 )
 from app.models.user import User, UserRole
@@ -17,6 +20,9 @@ __all__ = [
     "Shelf",
     "Location",
     "LocationHeatData",
+    "LocationHeatRollup",
+    "ZoneHeatNorm",
+    "HeatFormulaState",
     "ShelfType",
     "User",
     "UserRole"
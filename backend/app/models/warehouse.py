@@ -1,7 +1,7 @@
 """仓库相关数据模型"""
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, 
-    Enum, Text, Boolean, Index
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, 
+    Enum, Text, Boolean, Index, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -129,6 +129,7 @@ class Location(Base):
     # 关系
     shelf = relationship("Shelf", back_populates="locations")
     heat_data = relationship("LocationHeatData", back_populates="location", cascade="all, delete-orphan")
+    heat_rollups = relationship("LocationHeatRollup", back_populates="location", cascade="all, delete-orphan")
     
     __table_args__ = (
         Index("idx_location_shelf", "shelf_id"),
@@ -160,9 +161,71 @@ class LocationHeatData(Base):
         Index("idx_heat_location", "location_id"),
         Index("idx_heat_date", "date"),
         Index("idx_heat_location_date", "location_id", "date"),
+        # 每个库位每天一条记录（date 统一存储为当天 00:00:00），批量导入依赖该约束做 upsert
+        UniqueConstraint("location_id", "date", name="uq_heat_location_date"),
     )
 
 
+class LocationHeatRollup(Base):
+    """
+    库位热度汇总表
+    
+    按库位预聚合 location_heat_data，粒度分为:
+    - day: 按日汇总，bucket 为当天日期
+    - month: 按月汇总，bucket 为当月 1 日
+    - all: 全部历史汇总，bucket 固定为 2000-01-01
+    
+    由 HeatRollupService 在热度数据写入时增量维护
+    """
+    __tablename__ = "location_heat_rollups"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    location_id = Column(Integer, ForeignKey("locations.id", ondelete="CASCADE"), nullable=False)
+    granularity = Column(String(10), nullable=False, comment="汇总粒度(day/month/all)")
+    bucket = Column(Date, nullable=False, comment="汇总周期起始日期")
+    record_count = Column(Integer, default=0, comment="汇总的原始记录数")
+    pick_frequency = Column(Integer, default=0, comment="拣货频率合计")
+    turnover_rate_sum = Column(Float, default=0.0, comment="周转率合计（除以记录数得到平均值）")
+    heat_value = Column(Float, default=0.0, comment="热度值合计")
+    inventory_qty = Column(Integer, default=0, comment="库存数量合计")
+    inbound_qty = Column(Integer, default=0, comment="入库数量合计")
+    outbound_qty = Column(Integer, default=0, comment="出库数量合计")
+    
+    # 关系
+    location = relationship("Location", back_populates="heat_rollups")
+    
+    __table_args__ = (
+        UniqueConstraint("location_id", "granularity", "bucket", name="uq_rollup_location_bucket"),
+        Index("idx_rollup_bucket", "granularity", "bucket"),
+    )
+
+
+class ZoneHeatNorm(Base):
+    """
+    库区热度归一化基准
+
+    各指标在该库区单日记录中的最大值，热度公式按库区归一化时使用；
+    由 HeatScoringService.recompute 重算热度时刷新
+    """
+    __tablename__ = "zone_heat_norms"
+
+    zone_id = Column(Integer, ForeignKey("zones.id", ondelete="CASCADE"), primary_key=True)
+    max_pick_frequency = Column(Float, default=0.0, comment="单日拣货频率最大值")
+    max_turnover_rate = Column(Float, default=0.0, comment="单日周转率最大值")
+    max_outbound_qty = Column(Float, default=0.0, comment="单日出库数量最大值")
+    updated_at = Column(DateTime, comment="计算时间")  # 由代码设置本地时间
+
+
+class HeatFormulaState(Base):
+    """已存储热度值所使用的热度公式（单行，id 固定为 1）"""
+    __tablename__ = "heat_formula_state"
+
+    id = Column(Integer, primary_key=True)
+    signature = Column(String(255), nullable=False, comment="热度公式及参数的签名")
+    recomputed_rows = Column(Integer, default=0, comment="上次重算更新的记录数")
+    recomputed_at = Column(DateTime, comment="上次重算时间")  # 由代码设置本地时间
+
+
 class ImportRecord(Base):
     """导入记录表"""
     __tablename__ = "import_records"
@@ -180,3 +243,49 @@ class ImportRecord(Base):
     __table_args__ = (
         Index("idx_import_time", "import_time"),
     )
+
+
+class ImportJob(Base):
+    """导入任务表（异步导入的进度和结果）"""
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    filename = Column(String(255), nullable=False, comment="文件名")
+    file_type = Column(String(20), nullable=False, comment="文件类型(excel/csv)")
+    status = Column(String(20), default="pending", comment="状态(pending/running/success/partial/failed)")
+    processed_rows = Column(Integer, default=0, comment="已处理行数")
+    imported_rows = Column(Integer, default=0, comment="成功导入行数")
+    skipped_rows = Column(Integer, default=0, comment="跳过行数")
+    failed_rows = Column(Integer, default=0, comment="失败行数")
+    estimated_total_rows = Column(Integer, comment="预估总行数")
+    errors = Column(Text, comment="已产生的错误信息JSON（部分）")
+    result = Column(Text, comment="导入结果JSON")
+    created_at = Column(DateTime, nullable=False, comment="创建时间")  # 由代码设置本地时间
+    started_at = Column(DateTime, comment="开始处理时间")
+    finished_at = Column(DateTime, comment="结束时间")
+    updated_at = Column(DateTime, comment="最近一次进度更新时间")
+    
+    __table_args__ = (
+        Index("idx_import_job_status", "status"),
+    )
+
+
+class ReportJob(Base):
+    """分析报告生成任务表"""
+    __tablename__ = "report_jobs"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    zone_id = Column(Integer, comment="库区ID（为空表示全部范围）")
+    source = Column(String(20), comment="统计来源(detail/rollup)")
+    cache_key = Column(String(64), comment="报告缓存键（范围、统计来源、数据版本和模板版本的摘要）")
+    status = Column(String(20), default="pending", comment="状态(pending/running/success/failed)")
+    filename = Column(String(255), nullable=False, comment="报告文件名")
+    error = Column(Text, comment="失败原因")
+    created_at = Column(DateTime, nullable=False, comment="创建时间")  # 由代码设置本地时间
+    started_at = Column(DateTime, comment="开始生成时间")
+    finished_at = Column(DateTime, comment="结束时间")
+    
+    __table_args__ = (
+        Index("idx_report_job_status", "status"),
+        Index("idx_report_job_cache_key", "cache_key"),
+    )
@@ -12,8 +12,17 @@ from app.schemas.warehouse import (
     LocationResponse,
     LocationHeatDataResponse,
     HeatmapDataResponse,
+    WarehouseHeatmapResponse,
     HeatmapFilterParams,
-    ShelfTypeEnum
+    ShelfTypeEnum,
+    ImportModeEnum,
+    LayoutModeEnum,
+    ReportDataSourceEnum,
+    HeatmapFormatEnum,
+    ExportFormatEnum,
+    HeatScaleMethodEnum,
+    HeatScale,
+    PickEvent
 )
 from app.schemas.user import (
     UserRoleEnum,
@@ -42,8 +51,17 @@ __all__ = [
     "LocationResponse",
     "LocationHeatDataResponse",
     "HeatmapDataResponse",
+    "WarehouseHeatmapResponse",
     "HeatmapFilterParams",
     "ShelfTypeEnum",
+    "ImportModeEnum",
+    "LayoutModeEnum",
+    "ReportDataSourceEnum",
+    "HeatmapFormatEnum",
+    "ExportFormatEnum",
+    "HeatScaleMethodEnum",
+    "HeatScale",
+    "PickEvent",
     # User schemas
     "UserRoleEnum",
     "LoginRequest",
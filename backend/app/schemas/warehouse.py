@@ -1,6 +1,6 @@
 """仓库相关 Pydantic 模式"""
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -14,6 +14,44 @@ class ShelfTypeEnum(str, Enum):
     CANTILEVER = "cantilever"
 
 
+class ImportModeEnum(str, Enum):
+    """热度数据导入模式"""
+    REPLACE = "replace"              # 清空全部热度数据后导入
+    MERGE = "merge"                  # 只覆盖文件中出现的 (库位, 日期)
+    REPLACE_RANGE = "replace_range"  # 只清空文件覆盖的日期后导入
+
+
+class LayoutModeEnum(str, Enum):
+    """仓库布局设置模式"""
+    REPLACE = "replace"      # 删除现有布局（及热度数据）后重建
+    RECONCILE = "reconcile"  # 按编码对比，只新增、更新、停用变化的部分
+
+
+class ReportDataSourceEnum(str, Enum):
+    """分析报告的统计来源"""
+    DETAIL = "detail"  # 逐条热度记录
+    ROLLUP = "rollup"  # 全部历史汇总（每个库位一行）
+
+
+class HeatmapFormatEnum(str, Enum):
+    """热力图响应格式"""
+    JSON = "json"            # 嵌套对象（HeatmapDataResponse）
+    COLUMNAR = "columnar"    # 库位字段为平行数组的 JSON
+    PACKED = "packed"        # 二进制: JSON 头部 + 按类型对齐的数组
+
+
+class ExportFormatEnum(str, Enum):
+    """热度数据导出格式"""
+    CSV = "csv"
+    XLSX = "xlsx"
+
+
+class HeatScaleMethodEnum(str, Enum):
+    """热度分级方法"""
+    QUANTILE = "quantile"    # 等数量分级（分位数断点）
+    JENKS = "jenks"          # 自然断点分级
+
+
 # ==================== Warehouse ====================
 
 class WarehouseBase(BaseModel):
@@ -194,6 +232,7 @@ class LocationHeatItem(BaseModel):
     pick_frequency: int
     turnover_rate: float
     inventory_qty: int
+    heat_bucket: Optional[int] = None  # 热度分级的档位（请求分级时返回）
 
 
 class ShelfHeatData(BaseModel):
@@ -224,6 +263,21 @@ class AisleHeatData(BaseModel):
     shelves: List[ShelfHeatData]
 
 
+class HeatScale(BaseModel):
+    """
+    服务端计算的热度分级
+
+    热度为 0 的库位不参与统计，归入第 0 档；
+    库位数超过 HEAT_SCALE_EXACT_MAX_VALUES 时使用近似分位数草图（approximate 为 True）
+    """
+    method: HeatScaleMethodEnum
+    bucket_count: int = Field(..., description="实际档数（大量相同热度值时可能少于请求的档数）")
+    breaks: List[float] = Field(..., description="第 1 档起各档的下界，升序")
+    percentiles: Dict[str, float] = Field(..., description="p50 / p90 / p99")
+    sample_count: int = Field(..., description="参与统计的库位数（热度大于 0）")
+    approximate: bool = False
+
+
 class HeatmapDataResponse(BaseModel):
     """热力图数据响应"""
     zone_id: int
@@ -235,3 +289,37 @@ class HeatmapDataResponse(BaseModel):
     time_range: str
     start_date: datetime
     end_date: datetime
+    heat_scale: Optional[HeatScale] = None
+
+
+class ZoneHeatData(BaseModel):
+    """库区热度数据（min_heat / max_heat 为库区内的范围）"""
+    zone_id: int
+    zone_code: str
+    zone_name: str
+    aisles: List[AisleHeatData]
+    min_heat: float
+    max_heat: float
+
+
+class WarehouseHeatmapResponse(BaseModel):
+    """仓库热力图数据响应（min_heat / max_heat 为所有库区共用的范围）"""
+    warehouse_id: int
+    warehouse_code: str
+    warehouse_name: str
+    zones: List[ZoneHeatData]
+    min_heat: float
+    max_heat: float
+    time_range: str
+    start_date: datetime
+    end_date: datetime
+    heat_scale: Optional[HeatScale] = None  # 所有库区共用的分级
+
+
+# ==================== Pick Event ====================
+
+class PickEvent(BaseModel):
+    """拣货事件（扫码枪实时上报）"""
+    location_code: str = Field(..., max_length=100, description="库位完整编码")
+    timestamp: datetime = Field(..., description="拣货时间")
+    qty: int = Field(1, ge=0, description="拣货数量")
@@ -2,9 +2,11 @@
 from app.services.warehouse_service import WarehouseService
 from app.services.heatmap_service import HeatmapService
 from app.services.import_service import ImportService
+from app.services.import_job_service import ImportJobService
 
 __all__ = [
     "WarehouseService",
     "HeatmapService",
-    "ImportService"
+    "ImportService",
+    "ImportJobService"
 ]
@@ -0,0 +1,179 @@
+"""数据版本"""
+import logging
+from typing import Callable, Dict, Iterable, List, NamedTuple, Set
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.warehouse import Aisle, Shelf, Location
+from app.utils.bulk import chunked
+from app.utils.cache import get_cache_backend
+
+logger = logging.getLogger(__name__)
+
+
+class DataChanges(NamedTuple):
+    """一次提交中登记的变更"""
+    # 布局或显示标识变化的库区（通过 mark_zones 登记）
+    zone_ids: Set[int]
+    # 热度数据变化的库位 {库区ID: {库位ID}}（通过 mark_locations 登记）
+    locations: Dict[int, Set[int]]
+    # 全部库区的数据都发生变化
+    changed_all: bool
+    # 布局变化的仓库
+    warehouse_ids: Set[int]
+
+
+class DataVersion:
+    """
+    数据版本登记
+
+    维护三类版本号，用于响应缓存和 ETag：
+    - 库区版本：库区内的热度数据或布局（通道、货架、库位、显示标识）变化时递增
+    - 全局版本：无法确定库区的变化（如清空热度数据、按日期删除、重建布局）时递增，
+      所有库区的数据视为已变化
+    - 布局版本：仓库的 库区-通道-货架 结构变化时递增
+
+    写入时登记到会话，会话提交后递增，事务回滚时丢弃登记。
+    版本号保存在缓存后端中，使用 Redis 后端时多个进程共享。
+    递增后把本次提交的变更（DataChanges）通知给 add_listener 注册的监听函数
+    """
+
+    GLOBAL_KEY = "version:global"
+    ZONE_KEY = "version:zone:{}"
+    LAYOUT_KEY = "version:layout:{}"
+
+    # 会话 info 中登记变更的键
+    INFO_ZONES = "data_version_zones"
+    INFO_ALL = "data_version_all"
+    INFO_LAYOUTS = "data_version_layouts"
+    INFO_LOCATIONS = "data_version_locations"
+    INFO_HOOKED = "data_version_hooked"
+
+    # 按库位查询库区时每批的库位数量
+    LOOKUP_BATCH_SIZE = 500
+
+    # 提交后的变更监听函数，在提交所在的线程中同步调用，不应阻塞
+    _listeners: List[Callable[[DataChanges], None]] = []
+
+    # ==================== 读取 ====================
+
+    @classmethod
+    def zone_version(cls, zone_id: int) -> str:
+        """库区数据版本（包含全局版本）"""
+        backend = get_cache_backend()
+        return "{}.{}.{}".format(
+            backend.epoch,
+            backend.get_counter(cls.GLOBAL_KEY),
+            backend.get_counter(cls.ZONE_KEY.format(zone_id))
+        )
+
+    @classmethod
+    def layout_version(cls, warehouse_id: int) -> str:
+        """仓库布局版本"""
+        backend = get_cache_backend()
+        return "{}.{}".format(backend.epoch, backend.get_counter(cls.LAYOUT_KEY.format(warehouse_id)))
+
+    @classmethod
+    def warehouse_version(cls, warehouse_id: int, zone_ids: Iterable[int]) -> str:
+        """仓库热度数据版本（布局版本 + 各库区数据版本）"""
+        backend = get_cache_backend()
+        zone_versions = ",".join(
+            "{}={}".format(zone_id, backend.get_counter(cls.ZONE_KEY.format(zone_id)))
+            for zone_id in zone_ids
+        )
+        return "{}.{}.{}.{}".format(
+            backend.epoch,
+            backend.get_counter(cls.GLOBAL_KEY),
+            backend.get_counter(cls.LAYOUT_KEY.format(warehouse_id)),
+            zone_versions
+        )
+
+    @classmethod
+    def global_version(cls) -> int:
+        return get_cache_backend().get_counter(cls.GLOBAL_KEY)
+
+    # ==================== 登记 ====================
+
+    @classmethod
+    def mark_zones(cls, db: AsyncSession, zone_ids: Iterable[int]) -> None:
+        """登记数据发生变化的库区"""
+        db.sync_session.info.setdefault(cls.INFO_ZONES, set()).update(zone_ids)
+        cls._ensure_hooks(db)
+
+    @classmethod
+    def mark_all(cls, db: AsyncSession) -> None:
+        """登记全部库区的数据发生变化"""
+        db.sync_session.info[cls.INFO_ALL] = True
+        cls._ensure_hooks(db)
+
+    @classmethod
+    async def mark_locations(cls, db: AsyncSession, location_ids: Iterable[int]) -> None:
+        """登记热度数据发生变化的库位（及其所在的库区）"""
+        locations = db.sync_session.info.setdefault(cls.INFO_LOCATIONS, {})
+        for batch in chunked(sorted(set(location_ids)), cls.LOOKUP_BATCH_SIZE):
+            result = await db.execute(
+                select(Location.id, Aisle.zone_id)
+                .join(Shelf, Location.shelf_id == Shelf.id)
+                .join(Aisle, Shelf.aisle_id == Aisle.id)
+                .where(Location.id.in_(batch))
+            )
+            for location_id, zone_id in result.all():
+                locations.setdefault(zone_id, set()).add(location_id)
+        if locations:
+            cls._ensure_hooks(db)
+
+    @classmethod
+    def mark_layout(cls, db: AsyncSession, warehouse_id: int) -> None:
+        """登记仓库布局发生变化"""
+        db.sync_session.info.setdefault(cls.INFO_LAYOUTS, set()).add(warehouse_id)
+        cls._ensure_hooks(db)
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[DataChanges], None]) -> None:
+        """注册提交后的变更监听函数（重复注册同一函数只保留一个）"""
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener: Callable[[DataChanges], None]) -> None:
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    @classmethod
+    def _ensure_hooks(cls, db: AsyncSession) -> None:
+        session = db.sync_session
+        if session.info.get(cls.INFO_HOOKED):
+            return
+        session.info[cls.INFO_HOOKED] = True
+        event.listen(session, "after_commit", cls._after_commit)
+        event.listen(session, "after_rollback", cls._after_rollback)
+
+    @classmethod
+    def _after_commit(cls, session) -> None:
+        zone_ids = session.info.pop(cls.INFO_ZONES, set())
+        locations = session.info.pop(cls.INFO_LOCATIONS, {})
+        changed_all = session.info.pop(cls.INFO_ALL, False)
+        warehouse_ids = session.info.pop(cls.INFO_LAYOUTS, set())
+        if not zone_ids and not locations and not changed_all and not warehouse_ids:
+            return
+
+        backend = get_cache_backend()
+        if changed_all:
+            backend.incr(cls.GLOBAL_KEY)
+        else:
+            for zone_id in zone_ids | set(locations):
+                backend.incr(cls.ZONE_KEY.format(zone_id))
+        for warehouse_id in warehouse_ids:
+            backend.incr(cls.LAYOUT_KEY.format(warehouse_id))
+
+        changes = DataChanges(zone_ids, locations, changed_all, warehouse_ids)
+        for listener in list(cls._listeners):
+            try:
+                listener(changes)
+            except Exception:
+                # 通知失败不影响已经完成的提交
+                logger.exception("数据变更通知失败")
+
+    @classmethod
+    def _after_rollback(cls, session) -> None:
+        for key in (cls.INFO_ZONES, cls.INFO_LOCATIONS, cls.INFO_ALL, cls.INFO_LAYOUTS):
+            session.info.pop(key, None)
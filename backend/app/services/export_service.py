@@ -0,0 +1,180 @@
+"""热度数据导出服务"""
+import asyncio
+import codecs
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, List, Optional, Sequence
+from sqlalchemy import and_, select
+from app.database import AsyncSessionLocal
+from app.models.warehouse import Zone, Aisle, Shelf, Location, LocationHeatData
+
+
+class HeatDataExportService:
+    """
+    热度数据导出服务类
+
+    按日期范围和库区导出 location_heat_data（附库位、库区、巷道、货架编码），
+    使用服务端游标按批读取（db.stream + yield_per），边读边写：
+    - CSV: 每批编码后立即输出，内存只与批大小有关
+    - XLSX: openpyxl 只写模式逐行写入临时文件，全部写完后分块输出文件内容
+      （xlsx 是 zip 格式，文件末尾的目录要在全部数据写完后才能生成）
+
+    导出在独立的数据库会话中进行（StreamingResponse 发送数据时请求的会话已经关闭）。
+    前几列与导入模板一致，导出的文件可以直接用于导入
+    """
+
+    # 每批读取的行数
+    BATCH_SIZE = 5000
+    # XLSX 单个工作表的最大行数（含表头），超出后写入新的工作表
+    XLSX_MAX_ROWS = 1048576
+    # 输出 XLSX 文件内容时每块的字节数
+    FILE_CHUNK_SIZE = 1024 * 1024
+
+    HEADERS = [
+        "库位编码", "日期", "拣货频率", "周转率", "库存数量", "入库数量", "出库数量",
+        "热度值", "库区", "巷道", "货架"
+    ]
+
+    def __init__(
+        self,
+        zone_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+    ):
+        self.zone_id = zone_id
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def filename(self, extension: str) -> str:
+        """导出文件名，如 heat_data_20260101_20260131.csv"""
+        parts = ["heat_data"]
+        if self.zone_id:
+            parts.append(f"zone{self.zone_id}")
+        if self.start_date or self.end_date:
+            parts.append(self.start_date.strftime("%Y%m%d") if self.start_date else "begin")
+            parts.append(self.end_date.strftime("%Y%m%d") if self.end_date else "now")
+        return "_".join(parts) + "." + extension
+
+    def _build_query(self):
+        """按日期、库位排序的导出查询（日期范围包含结束日期当天）"""
+        query = (
+            select(
+                Location.full_code,
+                LocationHeatData.date,
+                LocationHeatData.pick_frequency,
+                LocationHeatData.turnover_rate,
+                LocationHeatData.inventory_qty,
+                LocationHeatData.inbound_qty,
+                LocationHeatData.outbound_qty,
+                LocationHeatData.heat_value,
+                Zone.code,
+                Aisle.code,
+                Shelf.code,
+            )
+            .join(Location, LocationHeatData.location_id == Location.id)
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .join(Zone, Aisle.zone_id == Zone.id)
+            .order_by(LocationHeatData.date, LocationHeatData.location_id)
+        )
+        conditions = []
+        if self.zone_id:
+            conditions.append(Aisle.zone_id == self.zone_id)
+        if self.start_date:
+            conditions.append(LocationHeatData.date >= datetime.combine(self.start_date, time.min))
+        if self.end_date:
+            conditions.append(LocationHeatData.date < datetime.combine(self.end_date + timedelta(days=1), time.min))
+        if conditions:
+            query = query.where(and_(*conditions))
+        return query.execution_options(yield_per=self.BATCH_SIZE)
+
+    async def iter_batches(self) -> AsyncIterator[Sequence]:
+        """按批返回导出行（服务端游标，不把结果整体载入内存）"""
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(self._build_query())
+            try:
+                async for rows in result.partitions():
+                    yield rows
+            finally:
+                await result.close()
+
+    # ==================== CSV ====================
+
+    async def stream_csv(self) -> AsyncIterator[bytes]:
+        """CSV 内容（UTF-8 带 BOM，Excel 可直接打开），每批输出一块"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.HEADERS)
+        yield codecs.BOM_UTF8 + buffer.getvalue().encode("utf-8")
+
+        async for rows in self.iter_batches():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(self._format_row(row, date_format="%Y-%m-%d") for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+
+    # ==================== XLSX ====================
+
+    async def stream_xlsx(self) -> AsyncIterator[bytes]:
+        """XLSX 内容：只写模式写入临时文件后分块输出，写入和压缩在线程中执行"""
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("openpyxl 未安装，无法导出 XLSX")
+
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            workbook = Workbook(write_only=True)
+            sheet = self._add_sheet(workbook)
+            sheet_rows = 1
+
+            async for rows in self.iter_batches():
+                batches = []
+                rows = [self._format_row(row) for row in rows]
+                while rows:
+                    if sheet_rows >= self.XLSX_MAX_ROWS:
+                        sheet = self._add_sheet(workbook)
+                        sheet_rows = 1
+                    take = self.XLSX_MAX_ROWS - sheet_rows
+                    part, rows = rows[:take], rows[take:]
+                    batches.append((sheet, part))
+                    sheet_rows += len(part)
+                await asyncio.to_thread(self._append_rows, batches)
+
+            await asyncio.to_thread(workbook.save, path)
+
+            with open(path, "rb") as source:
+                while True:
+                    chunk = await asyncio.to_thread(source.read, self.FILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _add_sheet(self, workbook):
+        index = len(workbook.worksheets)
+        sheet = workbook.create_sheet("热度数据" if index == 0 else f"热度数据{index + 1}")
+        sheet.append(self.HEADERS)
+        return sheet
+
+    @staticmethod
+    def _append_rows(batches: List) -> None:
+        for sheet, rows in batches:
+            for row in rows:
+                sheet.append(row)
+
+    @staticmethod
+    def _format_row(row: Sequence, date_format: Optional[str] = None) -> list:
+        """日期列只保留日期部分（CSV 为字符串，XLSX 为日期）"""
+        values = list(row)
+        if isinstance(values[1], datetime):
+            values[1] = values[1].strftime(date_format) if date_format else values[1].date()
+        return values
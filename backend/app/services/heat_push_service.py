@@ -0,0 +1,176 @@
+"""热度实时推送服务"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.schemas.warehouse import HeatmapFilterParams
+from app.services.data_version import DataChanges, DataVersion
+from app.services.heatmap_service import HeatmapService
+
+logger = logging.getLogger(__name__)
+
+
+class HeatSubscriber:
+    """一个推送连接（订阅一个库区，按自己的筛选条件接收增量）"""
+
+    def __init__(self, zone_id: int, params: HeatmapFilterParams):
+        self.zone_id = zone_id
+        self.params = params
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.HEAT_PUSH_QUEUE_SIZE)
+
+    @property
+    def filter_key(self) -> Tuple[Any, ...]:
+        # 货架类型不影响库位的热度值，客户端忽略不在当前视图中的库位即可
+        return (self.params.time_range, self.params.start_date, self.params.end_date)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """放入待发送队列；客户端消费过慢导致积压时丢弃积压，改为通知重新拉取"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "reload", "zone_id": self.zone_id, "reason": "overflow"})
+
+
+class HeatPushHub:
+    """
+    热度实时推送
+
+    通过 DataVersion 的提交监听收集热度数据变化的库位，按库区合并
+    HEAT_PUSH_INTERVAL_SECONDS 内的所有提交后统一推送，
+    大批量导入分块提交时只产生少量消息。
+
+    消息类型:
+    - delta: 变化库位的热度，locations 为 HEAT_DELTA_COLUMNS 各列的平行数组
+    - reload: 布局变化、全量变化或变化库位过多，客户端应重新拉取热力图
+    - close: 服务关闭
+
+    每个订阅者只占用一个内存队列，等待期间不占用数据库连接；
+    合并窗口结束时每个 (库区, 时间范围) 只查询一次。
+    只推送本进程内提交的变更，多进程部署时订阅者应连接到执行写入的进程
+    """
+
+    _subscribers: Dict[int, Set[HeatSubscriber]] = {}
+    _pending_locations: Dict[int, Set[int]] = {}
+    _pending_reload: Set[int] = set()
+    _pending_all = False
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _flush_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def start(cls) -> None:
+        """开始监听数据变更（应用启动时调用）"""
+        cls._loop = asyncio.get_running_loop()
+        DataVersion.add_listener(cls.publish)
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止监听并通知所有订阅者关闭（应用关闭时调用）"""
+        DataVersion.remove_listener(cls.publish)
+        if cls._flush_task:
+            cls._flush_task.cancel()
+            cls._flush_task = None
+        for subscribers in cls._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.send({"type": "close"})
+
+    @classmethod
+    def subscribe(cls, zone_id: int, params: HeatmapFilterParams) -> HeatSubscriber:
+        subscriber = HeatSubscriber(zone_id, params)
+        cls._subscribers.setdefault(zone_id, set()).add(subscriber)
+        return subscriber
+
+    @classmethod
+    def unsubscribe(cls, subscriber: HeatSubscriber) -> None:
+        subscribers = cls._subscribers.get(subscriber.zone_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del cls._subscribers[subscriber.zone_id]
+
+    @classmethod
+    def subscriber_count(cls) -> int:
+        return sum(len(subscribers) for subscribers in cls._subscribers.values())
+
+    # ==================== 收集与合并 ====================
+
+    @classmethod
+    def publish(cls, changes: DataChanges) -> None:
+        """
+        DataVersion 的提交监听函数：登记变更并安排合并推送
+
+        只记录有订阅者的库区，没有订阅者时不做任何处理
+        """
+        if not cls._subscribers or cls._loop is None:
+            return
+
+        if changes.changed_all:
+            cls._pending_all = True
+        for zone_id in changes.zone_ids:
+            if zone_id in cls._subscribers:
+                cls._pending_reload.add(zone_id)
+        for zone_id, location_ids in changes.locations.items():
+            if zone_id in cls._subscribers:
+                cls._pending_locations.setdefault(zone_id, set()).update(location_ids)
+
+        if cls._pending_all or cls._pending_reload or cls._pending_locations:
+            # 提交可能发生在其他线程中，统一回到事件循环中安排推送
+            cls._loop.call_soon_threadsafe(cls._schedule_flush)
+
+    @classmethod
+    def _schedule_flush(cls) -> None:
+        if cls._flush_task is None or cls._flush_task.done():
+            cls._flush_task = asyncio.ensure_future(cls._flush_later())
+
+    @classmethod
+    async def _flush_later(cls) -> None:
+        await asyncio.sleep(settings.HEAT_PUSH_INTERVAL_SECONDS)
+        try:
+            await cls.flush()
+        except Exception:
+            logger.exception("热度推送失败")
+
+        # 推送期间又有新的提交时，开始下一个合并窗口
+        if cls._pending_all or cls._pending_reload or cls._pending_locations:
+            cls._flush_task = asyncio.ensure_future(cls._flush_later())
+
+    @classmethod
+    async def flush(cls) -> None:
+        """推送合并窗口内登记的变更"""
+        pending_locations, cls._pending_locations = cls._pending_locations, {}
+        pending_reload, cls._pending_reload = cls._pending_reload, set()
+        pending_all, cls._pending_all = cls._pending_all, False
+
+        if pending_all:
+            pending_reload = set(cls._subscribers)
+        for zone_id, location_ids in pending_locations.items():
+            if len(location_ids) > settings.HEAT_PUSH_MAX_DELTA:
+                pending_reload.add(zone_id)
+
+        for zone_id in pending_reload:
+            for subscriber in cls._subscribers.get(zone_id, ()):
+                subscriber.send({"type": "reload", "zone_id": zone_id})
+
+        deltas = {
+            zone_id: location_ids
+            for zone_id, location_ids in pending_locations.items()
+            if zone_id not in pending_reload and zone_id in cls._subscribers
+        }
+        if not deltas:
+            return
+
+        async with AsyncSessionLocal() as db:
+            service = HeatmapService(db)
+            for zone_id, location_ids in deltas.items():
+                groups: Dict[Tuple[Any, ...], list] = {}
+                for subscriber in cls._subscribers.get(zone_id, ()):
+                    groups.setdefault(subscriber.filter_key, []).append(subscriber)
+
+                for subscribers in groups.values():
+                    columns = await service.get_location_heat_columns(location_ids, subscribers[0].params)
+                    message = {"type": "delta", "zone_id": zone_id, "locations": columns}
+                    for subscriber in subscribers:
+                        subscriber.send(message)
@@ -0,0 +1,357 @@
+"""热度汇总服务"""
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_, func, delete, literal, literal_column, cast, Date
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from app.database import AsyncSessionLocal
+from app.models.warehouse import LocationHeatData, LocationHeatRollup
+from app.services.data_version import DataVersion
+from app.utils.bulk import chunked, upsert_rows
+
+logger = logging.getLogger(__name__)
+
+
+class HeatRollupService:
+    """
+    热度汇总服务类
+
+    维护 location_heat_rollups 中按日、按月和全部历史的库位汇总，
+    热力图和报告按时间窗口读取汇总行，而不是扫描原始热度数据。
+    写入原始热度数据时记录增量（新值减旧值），调用 flush() 一次性写入。
+    """
+
+    GRANULARITY_DAY = "day"
+    GRANULARITY_MONTH = "month"
+    GRANULARITY_ALL = "all"
+
+    # 全部历史汇总使用的固定 bucket
+    ALL_BUCKET = date(2000, 1, 1)
+    # 覆盖到该日期即视为查询全部历史
+    ALL_END = date(2100, 12, 31)
+
+    # 可累加的汇总字段
+    MEASURES = (
+        "record_count",
+        "pick_frequency",
+        "turnover_rate_sum",
+        "heat_value",
+        "inventory_qty",
+        "inbound_qty",
+        "outbound_qty",
+    )
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        # 待写入的增量: {(location_id, granularity, bucket): {字段: 增量}}
+        self._pending: Dict[Tuple[int, str, date], Dict[str, float]] = {}
+
+    # ==================== 增量维护 ====================
+
+    @staticmethod
+    def measures_of(heat_data) -> Dict[str, float]:
+        """从一条原始热度数据（ORM 对象或字典）提取汇总字段"""
+        if heat_data is None:
+            return {measure: 0 for measure in HeatRollupService.MEASURES}
+
+        def value(field: str):
+            if isinstance(heat_data, dict):
+                return heat_data.get(field) or 0
+            return getattr(heat_data, field) or 0
+
+        return {
+            "record_count": 1,
+            "pick_frequency": value("pick_frequency"),
+            "turnover_rate_sum": value("turnover_rate"),
+            "heat_value": value("heat_value"),
+            "inventory_qty": value("inventory_qty"),
+            "inbound_qty": value("inbound_qty"),
+            "outbound_qty": value("outbound_qty"),
+        }
+
+    @staticmethod
+    def _month_start(day: date) -> date:
+        return day.replace(day=1)
+
+    @staticmethod
+    def _next_month(day: date) -> date:
+        if day.month == 12:
+            return date(day.year + 1, 1, 1)
+        return date(day.year, day.month + 1, 1)
+
+    def record_change(
+        self,
+        location_id: int,
+        record_date: datetime,
+        old: Optional[Dict[str, float]],
+        new: Optional[Dict[str, float]]
+    ) -> None:
+        """
+        记录一条原始热度数据的变化
+
+        old 为变更前的汇总字段（新建时为 None），new 为变更后的汇总字段（删除时为 None）
+        """
+        old = old or self.measures_of(None)
+        new = new or self.measures_of(None)
+        delta = {measure: new[measure] - old[measure] for measure in self.MEASURES}
+        if not any(delta.values()):
+            return
+
+        day = record_date.date() if isinstance(record_date, datetime) else record_date
+        for key in (
+            (location_id, self.GRANULARITY_DAY, day),
+            (location_id, self.GRANULARITY_MONTH, self._month_start(day)),
+            (location_id, self.GRANULARITY_ALL, self.ALL_BUCKET),
+        ):
+            self._add_pending(key, delta)
+
+    def _add_pending(self, key: Tuple[int, str, date], delta: Dict[str, float]) -> None:
+        pending = self._pending.setdefault(key, {measure: 0 for measure in self.MEASURES})
+        for measure, value in delta.items():
+            pending[measure] += value
+
+    async def flush(self) -> int:
+        """将累积的增量写入汇总表，返回写入的汇总行数"""
+        if not self._pending:
+            return 0
+
+        rows = [
+            {
+                "location_id": location_id,
+                "granularity": granularity,
+                "bucket": bucket,
+                **measures
+            }
+            for (location_id, granularity, bucket), measures in self._pending.items()
+        ]
+        self._pending = {}
+
+        return await upsert_rows(
+            self.db,
+            LocationHeatRollup.__table__,
+            rows,
+            key_columns=("location_id", "granularity", "bucket"),
+            update_columns=self.MEASURES,
+            additive=True
+        )
+
+    async def clear(self, location_ids: Optional[List[int]] = None) -> None:
+        """清空汇总数据（可限定库位）"""
+        self._pending = {}
+        if location_ids is None:
+            await self.db.execute(delete(LocationHeatRollup))
+            return
+
+        for batch in chunked(list(location_ids), 500):
+            await self.db.execute(
+                delete(LocationHeatRollup).where(LocationHeatRollup.location_id.in_(batch))
+            )
+
+    async def remove_days(self, days: Iterable[date]) -> None:
+        """
+        移除若干天的汇总（在删除这些天的原始热度数据时调用）
+
+        从月汇总和全部历史汇总中减去对应的日汇总，删除日汇总行，
+        并清理记录数归零的汇总行，使其与没有数据的库位一致
+        """
+        R = LocationHeatRollup
+        affected_locations = set()
+
+        for batch in chunked(sorted(set(days)), 500):
+            day_condition = and_(R.granularity == self.GRANULARITY_DAY, R.bucket.in_(batch))
+            result = await self.db.execute(
+                select(R.location_id, R.bucket, *[getattr(R, measure) for measure in self.MEASURES])
+                .where(day_condition)
+            )
+            for row in result.all():
+                affected_locations.add(row.location_id)
+                delta = {measure: -(getattr(row, measure) or 0) for measure in self.MEASURES}
+                self._add_pending((row.location_id, self.GRANULARITY_MONTH, self._month_start(row.bucket)), delta)
+                self._add_pending((row.location_id, self.GRANULARITY_ALL, self.ALL_BUCKET), delta)
+            await self.db.execute(delete(R).where(day_condition))
+
+        await self.flush()
+
+        for batch in chunked(sorted(affected_locations), 500):
+            await self.db.execute(
+                delete(R).where(R.location_id.in_(batch), R.record_count <= 0)
+            )
+
+    def _bucket_expressions(self):
+        """按数据库方言返回 (日 bucket, 月 bucket) 表达式"""
+        column = LocationHeatData.date
+        dialect_name = self.db.get_bind().dialect.name
+
+        if dialect_name == "postgresql":
+            return (
+                cast(func.date_trunc(literal_column("'day'"), column), Date),
+                cast(func.date_trunc(literal_column("'month'"), column), Date),
+            )
+        if dialect_name == "mysql":
+            return (
+                func.date(column),
+                func.str_to_date(
+                    func.date_format(column, literal_column("'%Y-%m-01'")),
+                    literal_column("'%Y-%m-%d'")
+                ),
+            )
+        # SQLite
+        return (
+            func.date(column),
+            func.date(column, literal_column("'start of month'")),
+        )
+
+    async def rebuild(self) -> None:
+        """根据原始热度数据全量重建汇总表（用于迁移和热度重算）"""
+        await self.clear()
+
+        day_bucket, month_bucket = self._bucket_expressions()
+        columns = ["location_id", "granularity", "bucket", *self.MEASURES]
+
+        def aggregates():
+            return [
+                func.count(LocationHeatData.id),
+                func.coalesce(func.sum(LocationHeatData.pick_frequency), 0),
+                func.coalesce(func.sum(LocationHeatData.turnover_rate), 0),
+                func.coalesce(func.sum(LocationHeatData.heat_value), 0),
+                func.coalesce(func.sum(LocationHeatData.inventory_qty), 0),
+                func.coalesce(func.sum(LocationHeatData.inbound_qty), 0),
+                func.coalesce(func.sum(LocationHeatData.outbound_qty), 0),
+            ]
+
+        for granularity, bucket in (
+            (self.GRANULARITY_DAY, day_bucket),
+            (self.GRANULARITY_MONTH, month_bucket),
+        ):
+            source = (
+                select(
+                    LocationHeatData.location_id,
+                    literal(granularity),
+                    bucket,
+                    *aggregates()
+                )
+                .group_by(LocationHeatData.location_id, bucket)
+            )
+            await self.db.execute(
+                LocationHeatRollup.__table__.insert().from_select(columns, source)
+            )
+
+        source = (
+            select(
+                LocationHeatData.location_id,
+                literal(self.GRANULARITY_ALL),
+                literal(self.ALL_BUCKET, Date),
+                *aggregates()
+            )
+            .group_by(LocationHeatData.location_id)
+        )
+        await self.db.execute(
+            LocationHeatRollup.__table__.insert().from_select(columns, source)
+        )
+
+    async def is_consistent(self) -> bool:
+        """
+        全部历史汇总与原始热度数据的记录数、拣货频率合计、出库数量合计是否一致
+
+        旧版本升级后汇总表为空、或在空汇总表上写入过增量时不一致
+        """
+        R = LocationHeatRollup
+        detail = (await self.db.execute(
+            select(
+                func.count(LocationHeatData.id),
+                func.coalesce(func.sum(LocationHeatData.pick_frequency), 0),
+                func.coalesce(func.sum(LocationHeatData.outbound_qty), 0),
+            )
+        )).one()
+        rollup = (await self.db.execute(
+            select(
+                func.coalesce(func.sum(R.record_count), 0),
+                func.coalesce(func.sum(R.pick_frequency), 0),
+                func.coalesce(func.sum(R.outbound_qty), 0),
+            )
+            .where(R.granularity == self.GRANULARITY_ALL)
+        )).one()
+        return tuple(int(value) for value in detail) == tuple(int(value) for value in rollup)
+
+    @classmethod
+    async def rebuild_if_inconsistent(cls) -> bool:
+        """
+        汇总与原始数据不一致时全量重建并提交，返回是否重建（应用启动时、接受写入之前调用）
+
+        热力图和报告只读取汇总表，增量写入也以汇总表为基础，不一致时需要先重建
+        """
+        async with AsyncSessionLocal() as db:
+            service = cls(db)
+            if await service.is_consistent():
+                return False
+            logger.warning("热度汇总与原始热度数据不一致，开始重建")
+            await service.rebuild()
+            DataVersion.mark_all(db)
+            await db.commit()
+            logger.warning("热度汇总重建完成")
+            return True
+
+    # ==================== 查询 ====================
+
+    def window_condition(self, start_date: datetime, end_date: datetime):
+        """
+        将 [start_date, end_date] 时间窗口拆分为汇总行筛选条件
+
+        - 覆盖全部历史时直接使用 all 汇总
+        - 窗口内完整的自然月使用 month 汇总
+        - 首尾不足一个月的部分使用 day 汇总
+        """
+        R = LocationHeatRollup
+        first_day = start_date.date() if isinstance(start_date, datetime) else start_date
+        last_day = end_date.date() if isinstance(end_date, datetime) else end_date
+
+        if first_day <= self.ALL_BUCKET and last_day >= self.ALL_END:
+            return R.granularity == self.GRANULARITY_ALL
+
+        # 第一个完整月的 1 日
+        months_start = first_day if first_day.day == 1 else self._next_month(first_day)
+        # 最后一个完整月之后的下一个月 1 日
+        if (last_day + timedelta(days=1)).day == 1:
+            months_end = self._next_month(last_day)
+        else:
+            months_end = self._month_start(last_day)
+
+        if months_start >= months_end:
+            return and_(
+                R.granularity == self.GRANULARITY_DAY,
+                R.bucket >= first_day,
+                R.bucket <= last_day
+            )
+
+        conditions = [
+            and_(
+                R.granularity == self.GRANULARITY_MONTH,
+                R.bucket >= months_start,
+                R.bucket < months_end
+            )
+        ]
+        if first_day < months_start:
+            conditions.append(and_(
+                R.granularity == self.GRANULARITY_DAY,
+                R.bucket >= first_day,
+                R.bucket < months_start
+            ))
+        if months_end <= last_day:
+            conditions.append(and_(
+                R.granularity == self.GRANULARITY_DAY,
+                R.bucket >= months_end,
+                R.bucket <= last_day
+            ))
+        return or_(*conditions)
+
+    @staticmethod
+    def aggregate_columns() -> list:
+        """汇总行按库位聚合时使用的列（与原始数据聚合的列名一致）"""
+        R = LocationHeatRollup
+        return [
+            func.sum(R.pick_frequency).label("total_pick_frequency"),
+            func.sum(R.turnover_rate_sum).label("total_turnover_rate"),
+            func.sum(R.record_count).label("total_record_count"),
+            func.sum(R.inventory_qty).label("total_inventory_qty"),
+            func.sum(R.heat_value).label("total_heat_value"),
+        ]
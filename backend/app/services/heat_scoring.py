@@ -0,0 +1,448 @@
+"""热度计算公式与热度重算服务"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, func, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.warehouse import (
+    Aisle, Shelf, Location, LocationHeatData, ZoneHeatNorm, HeatFormulaState
+)
+from app.services.data_version import DataVersion
+from app.services.heat_rollup_service import HeatRollupService
+from app.utils.bulk import chunked
+
+logger = logging.getLogger(__name__)
+
+# 参与热度计算的指标（顺序与 ZoneHeatNorm 的 max_* 列一致）
+SCORE_COLUMNS = ("pick_frequency", "turnover_rate", "outbound_qty")
+
+NormTuple = Tuple[float, float, float]
+EMPTY_NORMS: NormTuple = (0.0, 0.0, 0.0)
+
+
+class HeatScorer:
+    """
+    热度公式基类
+
+    score 对一批单日记录向量化计算热度值:
+    - values: (n, 3) 数组，各列依次为 SCORE_COLUMNS
+    - norms: 每行所在库区的归一化基准（同形状）；uses_norms 为 False 时为 None
+    """
+
+    name = ""
+    uses_norms = False
+
+    def signature(self) -> str:
+        """公式及参数的签名，签名变化后需要重算已存储的热度值"""
+        return self.name
+
+    def score(self, values: np.ndarray, norms: Optional[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class FrequencyScorer(HeatScorer):
+    """热度值 = 拣货频率"""
+
+    name = "frequency"
+
+    def score(self, values: np.ndarray, norms: Optional[np.ndarray]) -> np.ndarray:
+        return values[:, 0].astype(np.float64)
+
+
+class WeightedScorer(HeatScorer):
+    """
+    按库区归一化的加权热度
+
+    H = S * (w_f * F / F_max + w_t * T / T_max + w_o * O / O_max) / (w_f + w_t + w_o)
+
+    F_max 等为库区内单日记录的最大值（ZoneHeatNorm），比值截断到 [0, 1]，
+    重算之后写入的记录超过基准时按 1 计；库区尚无基准（或基准为 0）时指标大于 0 即按 1 计。
+    单日热度值在 [0, S] 之间。
+    """
+
+    name = "weighted"
+    uses_norms = True
+
+    def __init__(self, weights: Iterable[float], scale: float):
+        self.weights = np.asarray(list(weights), dtype=np.float64)
+        if self.weights.shape != (len(SCORE_COLUMNS),):
+            raise ValueError(f"热度权重数量应为 {len(SCORE_COLUMNS)} 个")
+        if (self.weights < 0).any() or self.weights.sum() <= 0:
+            raise ValueError("热度权重不能为负数，且至少有一个大于 0")
+        if scale <= 0:
+            raise ValueError("HEAT_SCORE_SCALE 必须大于 0")
+        self.scale = float(scale)
+
+    @classmethod
+    def from_settings(cls) -> "WeightedScorer":
+        return cls(
+            (settings.HEAT_WEIGHT_FREQUENCY, settings.HEAT_WEIGHT_TURNOVER, settings.HEAT_WEIGHT_OUTBOUND),
+            settings.HEAT_SCORE_SCALE
+        )
+
+    def signature(self) -> str:
+        w_f, w_t, w_o = self.weights.tolist()
+        return f"{self.name}:f={w_f:g},t={w_t:g},o={w_o:g},scale={self.scale:g}"
+
+    def score(self, values: np.ndarray, norms: Optional[np.ndarray]) -> np.ndarray:
+        values = values.astype(np.float64)
+        if norms is None:
+            norms = np.zeros_like(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(norms > 0, values / norms, (values > 0).astype(np.float64))
+        ratios = np.clip(ratios, 0.0, 1.0)
+        return self.scale * (ratios @ self.weights) / self.weights.sum()
+
+
+# 可选的热度公式: 名称 -> 按当前配置创建公式的工厂函数
+HEAT_SCORERS: Dict[str, Callable[[], HeatScorer]] = {
+    FrequencyScorer.name: FrequencyScorer,
+    WeightedScorer.name: WeightedScorer.from_settings,
+}
+
+
+def register_heat_scorer(name: str, factory: Callable[[], HeatScorer]) -> None:
+    """注册自定义热度公式，之后可通过 HEAT_SCORER 配置选用"""
+    HEAT_SCORERS[name] = factory
+
+
+def get_heat_scorer() -> HeatScorer:
+    """按 HEAT_SCORER 配置获取当前的热度公式（留空时见 settings.heat_scorer_name）"""
+    name = settings.heat_scorer_name
+    factory = HEAT_SCORERS.get(name)
+    if factory is None:
+        raise ValueError(
+            f"未知的热度公式: {name}（可选: {', '.join(sorted(HEAT_SCORERS))}）"
+        )
+    return factory()
+
+
+class HeatScoringService:
+    """
+    热度计算服务
+
+    - score_rows: 写入热度数据时按当前公式计算 heat_value
+    - recompute: 公式或权重变化后，向量化重算全部已存储的热度值并重建汇总，无需重新导入
+
+    已存储热度值所用公式的签名保存在 heat_formula_state 中；
+    应用启动时尚无签名（旧版本数据）则在接受请求前重算（recompute_if_unscored），
+    签名与当前配置不一致则在后台自动重算（start / stop）。
+    """
+
+    STATE_ID = 1
+
+    # 重算时每批读取的记录数
+    RECOMPUTE_BATCH_SIZE = 50000
+
+    # 查询库位所在库区时每批的库位数量
+    LOOKUP_BATCH_SIZE = 500
+
+    # 进程内缓存的库区归一化基准，全局数据版本变化（重算会使其递增）后重新加载
+    _norms: Optional[Dict[int, NormTuple]] = None
+    _norms_version: Optional[int] = None
+
+    _lock: Optional[asyncio.Lock] = None
+    _task: Optional[asyncio.Task] = None
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._scorer: Optional[HeatScorer] = None
+
+    @property
+    def scorer(self) -> HeatScorer:
+        """当前配置的热度公式（首次使用时创建，配置无效时抛出 ValueError）"""
+        if self._scorer is None:
+            self._scorer = get_heat_scorer()
+        return self._scorer
+
+    # ==================== 写入时计算 ====================
+
+    async def score_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """为一批热度记录（含 location_id 和 SCORE_COLUMNS）计算并填入 heat_value"""
+        if not rows:
+            return
+
+        values = np.array(
+            [[row.get(column) or 0 for column in SCORE_COLUMNS] for row in rows],
+            dtype=np.float64
+        )
+        norms = None
+        if self.scorer.uses_norms:
+            zone_of = await self._location_zones({row["location_id"] for row in rows})
+            zone_norms = await self.zone_norms()
+            norms = np.array(
+                [zone_norms.get(zone_of.get(row["location_id"]), EMPTY_NORMS) for row in rows],
+                dtype=np.float64
+            )
+
+        for row, heat_value in zip(rows, self.scorer.score(values, norms).tolist()):
+            row["heat_value"] = heat_value
+
+    async def _location_zones(self, location_ids: Iterable[int]) -> Dict[int, int]:
+        zone_of: Dict[int, int] = {}
+        for batch in chunked(sorted(location_ids), self.LOOKUP_BATCH_SIZE):
+            result = await self.db.execute(
+                select(Location.id, Aisle.zone_id)
+                .join(Shelf, Location.shelf_id == Shelf.id)
+                .join(Aisle, Shelf.aisle_id == Aisle.id)
+                .where(Location.id.in_(batch))
+            )
+            zone_of.update(result.all())
+        return zone_of
+
+    async def zone_norms(self) -> Dict[int, NormTuple]:
+        """各库区已保存的归一化基准"""
+        cls = type(self)
+        version = DataVersion.global_version()
+        if cls._norms is None or cls._norms_version != version:
+            result = await self.db.execute(
+                select(
+                    ZoneHeatNorm.zone_id,
+                    ZoneHeatNorm.max_pick_frequency,
+                    ZoneHeatNorm.max_turnover_rate,
+                    ZoneHeatNorm.max_outbound_qty
+                )
+            )
+            cls._norms = {
+                zone_id: (f or 0.0, t or 0.0, o or 0.0)
+                for zone_id, f, t, o in result.all()
+            }
+            cls._norms_version = version
+        return cls._norms
+
+    # ==================== 重算 ====================
+
+    @classmethod
+    def _get_lock(cls) -> asyncio.Lock:
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        return cls._lock
+
+    async def get_state(self) -> Dict[str, Any]:
+        """当前公式、已存储热度值使用的公式签名，以及各库区的归一化基准"""
+        state = await self.db.get(HeatFormulaState, self.STATE_ID)
+        signature = self.scorer.signature()
+        norms = await self.db.execute(select(ZoneHeatNorm).order_by(ZoneHeatNorm.zone_id))
+        return {
+            "scorer": self.scorer.name,
+            "signature": signature,
+            "stored_signature": state.signature if state else None,
+            "needs_recompute": state is None or state.signature != signature,
+            "recomputed_rows": state.recomputed_rows if state else None,
+            "recomputed_at": state.recomputed_at.isoformat() if state and state.recomputed_at else None,
+            "available_scorers": sorted(HEAT_SCORERS),
+            "zone_norms": [
+                {
+                    "zone_id": norm.zone_id,
+                    "max_pick_frequency": norm.max_pick_frequency,
+                    "max_turnover_rate": norm.max_turnover_rate,
+                    "max_outbound_qty": norm.max_outbound_qty,
+                }
+                for norm in norms.scalars().all()
+            ],
+        }
+
+    async def recompute(self, commit_batches: bool = False) -> Dict[str, Any]:
+        """
+        按当前公式重算全部已存储的热度值
+
+        1. 一条 GROUP BY 查询得到各库区的归一化基准并保存
+        2. 按主键分批读取各指标，向量化计算热度值，只更新有变化的记录
+        3. 有记录变化（或上次重算未完成）时全量重建汇总表；所有热力图缓存随全局数据版本失效
+
+        commit_batches=True 时保存基准后和每批更新后立即提交，不在整个重算期间持有写锁
+        （SQLite 同一时间只允许一个写事务），重算期间其他请求可以正常写入。
+        公式签名在最后保存，中途中断时下次启动会重新执行。
+        汇总重建和公式签名由调用方提交
+        """
+        async with self._get_lock():
+            started = time.perf_counter()
+            signature = self.scorer.signature()
+            state = await self.db.get(HeatFormulaState, self.STATE_ID)
+            # 上次以其他公式（或中途中断）写入的热度值可能已部分提交，汇总需要重建
+            rollups_stale = state is None or state.signature != signature
+
+            zone_norms = await self._compute_zone_norms()
+            await self._save_zone_norms(zone_norms)
+            if commit_batches:
+                # 新的基准立即生效，重算期间写入的记录按新基准计算
+                DataVersion.mark_all(self.db)
+                await self.db.commit()
+
+            # 库区 id -> 基准 的查找表，按行的库区 id 直接索引
+            lookup = np.zeros((max(zone_norms, default=0) + 1, len(SCORE_COLUMNS)), dtype=np.float64)
+            for zone_id, norms in zone_norms.items():
+                lookup[zone_id] = norms
+
+            scanned_rows = updated_rows = 0
+            last_id = 0
+            while True:
+                result = await self.db.execute(
+                    select(
+                        LocationHeatData.id,
+                        Aisle.zone_id,
+                        *[getattr(LocationHeatData, column) for column in SCORE_COLUMNS],
+                        LocationHeatData.heat_value
+                    )
+                    .join(Location, LocationHeatData.location_id == Location.id)
+                    .join(Shelf, Location.shelf_id == Shelf.id)
+                    .join(Aisle, Shelf.aisle_id == Aisle.id)
+                    .where(LocationHeatData.id > last_id)
+                    .order_by(LocationHeatData.id)
+                    .limit(self.RECOMPUTE_BATCH_SIZE)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                data = np.nan_to_num(np.array(rows, dtype=np.float64))
+                ids = data[:, 0].astype(np.int64)
+                values = data[:, 2:2 + len(SCORE_COLUMNS)]
+                old_heat = data[:, -1]
+                norms = lookup[data[:, 1].astype(np.int64)] if self.scorer.uses_norms else None
+
+                heat = self.scorer.score(values, norms)
+                changed = ~np.isclose(heat, old_heat, rtol=1e-9, atol=1e-9)
+                if changed.any():
+                    await self.db.execute(
+                        update(LocationHeatData),
+                        [
+                            {"id": row_id, "heat_value": heat_value}
+                            for row_id, heat_value in zip(ids[changed].tolist(), heat[changed].tolist())
+                        ]
+                    )
+                    updated_rows += int(changed.sum())
+                    if commit_batches:
+                        await self.db.commit()
+
+                scanned_rows += len(rows)
+                last_id = int(ids[-1])
+
+            if updated_rows or rollups_stale:
+                await HeatRollupService(self.db).rebuild()
+            DataVersion.mark_all(self.db)
+
+            await self.db.merge(HeatFormulaState(
+                id=self.STATE_ID,
+                signature=signature,
+                recomputed_rows=updated_rows,
+                recomputed_at=datetime.now()
+            ))
+            await self.db.flush()
+
+            return {
+                "scorer": self.scorer.name,
+                "signature": signature,
+                "zones": len(zone_norms),
+                "scanned_rows": scanned_rows,
+                "updated_rows": updated_rows,
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+            }
+
+    async def _compute_zone_norms(self) -> Dict[int, NormTuple]:
+        """各库区单日记录中各指标的最大值"""
+        result = await self.db.execute(
+            select(
+                Aisle.zone_id,
+                *[func.max(getattr(LocationHeatData, column)) for column in SCORE_COLUMNS]
+            )
+            .join(Shelf, Shelf.aisle_id == Aisle.id)
+            .join(Location, Location.shelf_id == Shelf.id)
+            .join(LocationHeatData, LocationHeatData.location_id == Location.id)
+            .group_by(Aisle.zone_id)
+        )
+        return {
+            zone_id: (float(f or 0), float(t or 0), float(o or 0))
+            for zone_id, f, t, o in result.all()
+        }
+
+    async def _save_zone_norms(self, zone_norms: Dict[int, NormTuple]) -> None:
+        await self.db.execute(delete(ZoneHeatNorm))
+        if not zone_norms:
+            return
+        now = datetime.now()
+        await self.db.execute(
+            ZoneHeatNorm.__table__.insert(),
+            [
+                {
+                    "zone_id": zone_id,
+                    "max_pick_frequency": f,
+                    "max_turnover_rate": t,
+                    "max_outbound_qty": o,
+                    "updated_at": now,
+                }
+                for zone_id, (f, t, o) in zone_norms.items()
+            ]
+        )
+
+    # ==================== 启动时检查 ====================
+
+    @classmethod
+    def check_settings(cls) -> None:
+        """检查热度公式配置：公式名称无效时抛出 ValueError，配置了权重但所选公式不使用权重时记录警告"""
+        scorer = get_heat_scorer()
+        if settings.heat_weights_configured and scorer.name != WeightedScorer.name:
+            logger.warning(
+                "已配置 HEAT_WEIGHT_* / HEAT_SCORE_SCALE，但 HEAT_SCORER=%s 不使用这些参数；"
+                "使用加权公式请设置 HEAT_SCORER=weighted 或将其留空",
+                scorer.name
+            )
+
+    @classmethod
+    async def recompute_if_unscored(cls) -> bool:
+        """
+        已存储的热度值从未按公式计算过（heat_formula_state 没有记录）时立即重算，返回是否重算
+
+        旧版本写入的记录 heat_value 为 0，展示时不再回退为拣货频率，
+        因此在应用接受请求之前完成首次重算；之后的公式变化由 start() 在后台重算
+        """
+        async with AsyncSessionLocal() as db:
+            if await db.get(HeatFormulaState, cls.STATE_ID) is not None:
+                return False
+            logger.warning("已存储的热度值尚未按公式计算，开始重算")
+            result = await cls(db).recompute(commit_batches=True)
+            await db.commit()
+            logger.warning("热度重算完成: %s", result)
+            return True
+
+    @classmethod
+    def start(cls) -> None:
+        """在后台检查公式签名，不一致时重算（应用启动时调用）"""
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._recompute_if_changed())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """取消未完成的重算（已提交的批次保留，未提交的修改随之回滚），下次启动时重新执行"""
+        if cls._task is not None:
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+            cls._task = None
+
+    @classmethod
+    async def _recompute_if_changed(cls) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                service = cls(db)
+                state = await db.get(HeatFormulaState, cls.STATE_ID)
+                if state is not None and state.signature == service.scorer.signature():
+                    return
+                logger.info(
+                    "热度公式已变化（%s -> %s），开始重算热度",
+                    state.signature if state else None, service.scorer.signature()
+                )
+                result = await service.recompute(commit_batches=True)
+                await db.commit()
+                logger.info("热度重算完成: %s", result)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("热度重算失败")
@@ -0,0 +1,108 @@
+"""热力图响应缓存"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel
+from app.config import settings
+from app.schemas.warehouse import HeatmapDataResponse
+from app.services.data_version import DataVersion
+from app.utils.cache import get_cache_backend
+
+
+class HeatmapCache:
+    """
+    热力图响应缓存
+
+    缓存键由 库区、时间范围、货架类型、解析后的起止日期、响应格式 和库区数据版本组成。
+    缓存值为 HeatmapDataResponse 或可 JSON 序列化的字典（列式格式），调用方不应修改。
+    写入热度数据或修改布局时通过 DataVersion 登记受影响的库区，提交后版本递增，
+    旧版本的缓存项不再命中，由后端的 LRU 淘汰或过期清理
+    """
+
+    NAMESPACE = "cache:zone"
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def key(
+        cls,
+        zone_id: int,
+        time_range: str,
+        shelf_type: Optional[str],
+        start_date: datetime,
+        end_date: datetime,
+        variant: str = "json"
+    ) -> str:
+        """
+        生成缓存键（包含当前数据版本）
+
+        应在读取数据库之前生成，并用同一个键写入缓存，
+        避免读取期间提交的变更被写入新版本的缓存项
+        """
+        return ":".join(str(part) for part in (
+            cls.NAMESPACE, zone_id, time_range, shelf_type or "",
+            start_date.isoformat(), end_date.isoformat(), variant, DataVersion.zone_version(zone_id)
+        ))
+
+    @classmethod
+    def warehouse_key(
+        cls,
+        warehouse_id: int,
+        zone_ids: List[int],
+        time_range: str,
+        shelf_type: Optional[str],
+        start_date: datetime,
+        end_date: datetime,
+        variant: str = "json"
+    ) -> str:
+        """生成仓库热力图的缓存键（包含布局版本和各库区的数据版本）"""
+        return ":".join(str(part) for part in (
+            "cache:warehouse", warehouse_id, time_range, shelf_type or "",
+            start_date.isoformat(), end_date.isoformat(), variant,
+            DataVersion.warehouse_version(warehouse_id, zone_ids)
+        ))
+
+    @classmethod
+    def get(cls, key: str, model: Optional[Type[BaseModel]] = HeatmapDataResponse) -> Any:
+        """
+        查找缓存的热力图响应，未命中时返回 None
+
+        model 为缓存值的模型类型，缓存的是字典时传入 None
+        """
+        value = get_cache_backend().get(key)
+        if value is None:
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        if not isinstance(value, (str, bytes)):
+            return value
+        return model.model_validate_json(value) if model else json.loads(value)
+
+    @classmethod
+    def set(cls, key: str, response: Any) -> None:
+        """缓存热力图响应（模型或字典）"""
+        backend = get_cache_backend()
+        if backend.stores_objects:
+            value = response
+        elif isinstance(response, BaseModel):
+            value = response.model_dump_json()
+        else:
+            value = json.dumps(response, ensure_ascii=False)
+        backend.set(key, value, ttl=settings.CACHE_TTL_SECONDS)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """缓存统计（命中/未命中为本进程的计数）"""
+        backend = get_cache_backend()
+        lookups = cls.hits + cls.misses
+        return {
+            "backend": backend.name,
+            "entries": backend.size(),
+            "max_entries": backend.max_entries,
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": round(cls.hits / lookups, 4) if lookups else None,
+            "global_version": DataVersion.global_version(),
+        }
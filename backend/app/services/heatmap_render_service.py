@@ -0,0 +1,361 @@
+"""热力图图片渲染服务"""
+import asyncio
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.schemas.warehouse import HeatmapFilterParams, HeatmapFormatEnum
+from app.services.heatmap_service import HeatmapService
+from app.utils.etag import make_etag
+from app.utils.png import encode_png
+
+# 配色与前端 stores/heatmap.ts 的 getHeatColor 一致：热度按固定上限归一化后在色标间线性插值
+HEAT_COLOR_CAP = 1000.0
+HEAT_COLOR_STOPS = (
+    (0.0, (255, 255, 204)),    # #ffffcc
+    (0.25, (254, 217, 118)),   # #fed976
+    (0.5, (253, 141, 60)),     # #fd8d3c
+    (0.75, (227, 26, 28)),     # #e31a1c
+    (1.0, (128, 0, 38)),       # #800026
+)
+
+# 没有库位的区域（货架间隔、空坐标）的颜色
+BACKGROUND_COLOR = (245, 247, 250)
+
+
+class HeatmapRenderService:
+    """
+    热力图图片渲染服务
+
+    以库位为最小单元把热力图栅格化：货架按 (x_coordinate, 通道 y_coordinate) 放入网格，
+    每个格子的大小为 最大列数 x 最大行数 个库位，格子之间留 SLOT_GAP 个库位的间隔，
+    库位按 (row_index, column_index) 放入所在货架的格子中。
+    缩放级别 zoom 下每个库位为 2^zoom 像素见方；仓库图中各库区自上而下排列。
+
+    渲染结果按 数据版本 + 渲染参数 缓存在磁盘上（settings.HEATMAP_TILE_DIR），
+    数据未变化时重复请求只读取文件
+    """
+
+    TILE_SIZE = 256
+    MAX_ZOOM = 5
+    # 货架格子之间、库区之间的间隔（库位数）
+    SLOT_GAP = 1
+    ZONE_GAP = 3
+    # 每个库位不小于该像素数时，在库位之间画分隔线
+    GRID_LINE_MIN_CELL = 4
+    # 渲染方式变化时递增，使旧的缓存文件不再命中
+    RENDER_VERSION = 1
+    # 每写入多少个文件检查一次磁盘缓存的文件数
+    PRUNE_INTERVAL = 100
+
+    hits = 0
+    misses = 0
+    _writes = 0
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.heatmap_service = HeatmapService(db)
+
+    # ==================== 库区 / 仓库 ====================
+
+    def get_zone_image_etag(
+        self,
+        zone_id: int,
+        params: HeatmapFilterParams,
+        zoom: Optional[int] = None,
+        tile: Optional[Tuple[int, int]] = None
+    ) -> str:
+        """库区图片的 ETag（同时用作磁盘缓存的文件名），不查询数据库"""
+        data_etag = self.heatmap_service.get_heatmap_etag(zone_id, params, HeatmapFormatEnum.COLUMNAR)
+        return self._image_etag("zone", data_etag, zoom, tile)
+
+    async def get_warehouse_image_etag(
+        self,
+        warehouse_id: int,
+        params: HeatmapFilterParams,
+        zoom: Optional[int] = None,
+        tile: Optional[Tuple[int, int]] = None
+    ) -> str:
+        """仓库图片的 ETag（同时用作磁盘缓存的文件名），只查询库区列表"""
+        data_etag = await self.heatmap_service.get_warehouse_heatmap_etag(warehouse_id, params)
+        return self._image_etag("warehouse", data_etag, zoom, tile)
+
+    async def render_zone_image(
+        self,
+        zone_id: int,
+        params: HeatmapFilterParams,
+        zoom: Optional[int] = None,
+        tile: Optional[Tuple[int, int]] = None
+    ) -> Optional[str]:
+        """
+        渲染库区热力图 PNG，返回文件路径，库区不存在时返回 None
+
+        - zoom 为空时渲染整图并自动选取不超过 HEATMAP_IMAGE_MAX_SIZE 的最大缩放级别
+        - tile 为 (x, y) 时渲染该缩放级别下 TILE_SIZE 见方的瓦片
+        """
+        path = self._cache_path(self.get_zone_image_etag(zone_id, params, zoom, tile))
+        if self._cache_hit(path):
+            return path
+
+        columns = await self.heatmap_service.get_heatmap_columns(zone_id, params)
+        if not columns:
+            return None
+        return await self._render_to_file(path, [columns], zoom, tile)
+
+    async def render_warehouse_image(
+        self,
+        warehouse_id: int,
+        params: HeatmapFilterParams,
+        zoom: Optional[int] = None,
+        tile: Optional[Tuple[int, int]] = None
+    ) -> Optional[str]:
+        """渲染仓库（所有启用库区）热力图 PNG，返回文件路径，仓库不存在时返回 None"""
+        path = self._cache_path(await self.get_warehouse_image_etag(warehouse_id, params, zoom, tile))
+        if self._cache_hit(path):
+            return path
+
+        columns = await self.heatmap_service.get_warehouse_columns(warehouse_id, params)
+        if not columns:
+            return None
+        return await self._render_to_file(path, columns["zones"], zoom, tile)
+
+    def _image_etag(self, scope: str, data_etag: str, zoom: Optional[int], tile: Optional[Tuple[int, int]]) -> str:
+        if zoom is None:
+            # 自动缩放级别取决于最大尺寸配置
+            size = f"fit{settings.HEATMAP_IMAGE_MAX_SIZE}"
+        else:
+            size = f"z{zoom}"
+        position = "{}_{}".format(*tile) if tile else "full"
+        return make_etag("png", scope, data_etag, size, position, self.RENDER_VERSION)
+
+    async def _render_to_file(
+        self,
+        path: str,
+        zones_columns: List[Dict[str, Any]],
+        zoom: Optional[int],
+        tile: Optional[Tuple[int, int]]
+    ) -> str:
+        grid = self.rasterize(zones_columns)
+        if zoom is None:
+            zoom = self.fit_zoom(grid.shape, settings.HEATMAP_IMAGE_MAX_SIZE)
+        elif tile is None:
+            self._check_image_size(grid.shape, zoom)
+
+        # 超出图像范围的瓦片都是空白的，共用同一个文件
+        if tile and not self.tile_in_range(grid.shape, zoom, tile):
+            path = self._cache_path(make_etag("png", "blank", self.TILE_SIZE, self.RENDER_VERSION))
+            if self._cache_hit(path):
+                return path
+            grid = np.full((1, 1), np.nan)
+            zoom, tile = 0, (0, 0)
+
+        type(self).misses += 1
+        # 着色、缩放和压缩都是 CPU 计算，放到线程中执行，避免阻塞事件循环
+        await asyncio.to_thread(self._write_png, path, grid, zoom, tile)
+        return path
+
+    def _write_png(self, path: str, grid: np.ndarray, zoom: int, tile: Optional[Tuple[int, int]]) -> None:
+        self._store(path, encode_png(self.render(grid, zoom, tile)))
+
+    # ==================== 栅格化与着色 ====================
+
+    def rasterize(self, zones_columns: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        将列式热力图数据栅格化为 (行, 列) 的热度数组，每个元素为一个库位，没有库位处为 NaN
+
+        zones_columns 为 get_heatmap_columns 结构的列表（仓库图为各库区），
+        所有库区使用相同的货架格子大小，自上而下排列
+        """
+        zones = [columns for columns in zones_columns if columns["shelves"]]
+        if not zones:
+            return np.full((1, 1), np.nan)
+
+        slot_rows = max(shelf["rows"] for columns in zones for shelf in columns["shelves"])
+        slot_columns = max(shelf["columns"] for columns in zones for shelf in columns["shelves"])
+        slot_height = slot_rows + self.SLOT_GAP
+        slot_width = slot_columns + self.SLOT_GAP
+
+        grids = [self._rasterize_zone(columns, slot_height, slot_width) for columns in zones]
+        width = max(grid.shape[1] for grid in grids)
+        height = sum(grid.shape[0] for grid in grids) + self.ZONE_GAP * (len(grids) - 1)
+
+        result = np.full((height, width), np.nan)
+        top = 0
+        for grid in grids:
+            result[top:top + grid.shape[0], :grid.shape[1]] = grid
+            top += grid.shape[0] + self.ZONE_GAP
+        return result
+
+    def _rasterize_zone(self, columns: Dict[str, Any], slot_height: int, slot_width: int) -> np.ndarray:
+        shelves = columns["shelves"]
+        aisle_y = np.array([aisle["y_coordinate"] for aisle in columns["aisles"]], dtype=np.int64)
+        shelf_x = np.array([shelf["x_coordinate"] for shelf in shelves], dtype=np.int64)
+        shelf_y = aisle_y[[shelf["aisle_index"] for shelf in shelves]]
+        shelf_rows = np.array([shelf["rows"] for shelf in shelves], dtype=np.int64)
+        shelf_columns = np.array([shelf["columns"] for shelf in shelves], dtype=np.int64)
+        counts = np.array([shelf["location_count"] for shelf in shelves], dtype=np.int64)
+
+        slot_x = shelf_x - shelf_x.min()
+        slot_y = shelf_y - shelf_y.min()
+        grid = np.full((
+            (slot_y.max() + 1) * slot_height + self.SLOT_GAP,
+            (slot_x.max() + 1) * slot_width + self.SLOT_GAP
+        ), np.nan)
+
+        # 各货架的库位在 locations 中连续存放，按数量展开得到每个库位所属的货架
+        owner = np.repeat(np.arange(len(shelves)), counts)
+        locations = columns["locations"]
+        row = np.asarray(locations["row_index"], dtype=np.int64)
+        column = np.asarray(locations["column_index"], dtype=np.int64)
+        heat = np.asarray(locations["heat_value"], dtype=np.float64)
+
+        # 超出货架行列数的库位（导入时创建的非规则库位）不绘制
+        valid = (row >= 0) & (row < shelf_rows[owner]) & (column >= 0) & (column < shelf_columns[owner])
+        y = self.SLOT_GAP + slot_y[owner] * slot_height + row
+        x = self.SLOT_GAP + slot_x[owner] * slot_width + column
+        grid[y[valid], x[valid]] = heat[valid]
+        return grid
+
+    @staticmethod
+    def colorize(grid: np.ndarray) -> np.ndarray:
+        """热度数组转为 (行, 列, 3) 的 uint8 颜色数组"""
+        positions = np.array([position for position, _ in HEAT_COLOR_STOPS])
+        colors = np.array([color for _, color in HEAT_COLOR_STOPS], dtype=np.float64)
+        empty = np.isnan(grid)
+        ratio = np.clip(np.where(empty, 0, grid) / HEAT_COLOR_CAP, 0, 1)
+
+        rgb = np.empty(grid.shape + (3,), dtype=np.uint8)
+        for channel in range(3):
+            rgb[..., channel] = np.rint(np.interp(ratio, positions, colors[:, channel]))
+        rgb[empty] = BACKGROUND_COLOR
+        return rgb
+
+    def render(self, grid: np.ndarray, zoom: int, tile: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        渲染整图或瓦片，返回 (高, 宽, 3) 的 uint8 数组
+
+        只对覆盖目标区域的库位着色和放大，瓦片的渲染成本与整图大小无关
+        """
+        cell = 2 ** zoom
+        height, width = grid.shape
+        if tile:
+            left, top = tile[0] * self.TILE_SIZE, tile[1] * self.TILE_SIZE
+            right, bottom = left + self.TILE_SIZE, top + self.TILE_SIZE
+        else:
+            left, top, right, bottom = 0, 0, width * cell, height * cell
+
+        first_column, last_column = left // cell, min(width, -(-right // cell))
+        first_row, last_row = top // cell, min(height, -(-bottom // cell))
+        rgb = self.colorize(grid[first_row:last_row, first_column:last_column])
+        rgb = np.repeat(np.repeat(rgb, cell, axis=0), cell, axis=1)
+        rgb = rgb[top - first_row * cell:bottom - first_row * cell, left - first_column * cell:right - first_column * cell]
+
+        if cell >= self.GRID_LINE_MIN_CELL:
+            rgb[(np.arange(top, top + rgb.shape[0]) % cell) == cell - 1, :] = BACKGROUND_COLOR
+            rgb[:, (np.arange(left, left + rgb.shape[1]) % cell) == cell - 1] = BACKGROUND_COLOR
+
+        if tile and rgb.shape[:2] != (self.TILE_SIZE, self.TILE_SIZE):
+            # 图像边缘的瓦片补齐为完整尺寸
+            canvas = np.empty((self.TILE_SIZE, self.TILE_SIZE, 3), dtype=np.uint8)
+            canvas[:] = BACKGROUND_COLOR
+            canvas[:rgb.shape[0], :rgb.shape[1]] = rgb
+            rgb = canvas
+        return rgb
+
+    def fit_zoom(self, shape: Tuple[int, int], max_size: int) -> int:
+        """整图边长不超过 max_size 的最大缩放级别（至少为 0）"""
+        zoom = 0
+        while zoom < self.MAX_ZOOM and max(shape) * 2 ** (zoom + 1) <= max_size:
+            zoom += 1
+        return zoom
+
+    def tile_in_range(self, shape: Tuple[int, int], zoom: int, tile: Tuple[int, int]) -> bool:
+        height, width = shape
+        cell = 2 ** zoom
+        return (
+            0 <= tile[0] * self.TILE_SIZE < width * cell
+            and 0 <= tile[1] * self.TILE_SIZE < height * cell
+        )
+
+    def _check_image_size(self, shape: Tuple[int, int], zoom: int) -> None:
+        size = max(shape) * 2 ** zoom
+        if size > settings.HEATMAP_IMAGE_MAX_SIZE:
+            raise ValueError(
+                f"图片边长 {size} 像素超过上限 {settings.HEATMAP_IMAGE_MAX_SIZE}，请降低缩放级别或使用瓦片接口"
+            )
+
+    # ==================== 磁盘缓存 ====================
+
+    @staticmethod
+    def _cache_path(etag: str) -> str:
+        digest = etag.strip('"')
+        return os.path.join(settings.HEATMAP_TILE_DIR, digest[:2], f"{digest}.png")
+
+    @classmethod
+    def _cache_hit(cls, path: str) -> bool:
+        try:
+            # 更新访问时间，清理时按最久未使用淘汰
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        cls.hits += 1
+        return True
+
+    @classmethod
+    def _store(cls, path: str, content: bytes) -> None:
+        """先写临时文件再重命名，并发请求不会读到写了一半的文件"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        cls._writes += 1
+        if cls._writes % cls.PRUNE_INTERVAL == 0:
+            cls.prune()
+
+    @classmethod
+    def prune(cls, max_files: Optional[int] = None) -> int:
+        """磁盘缓存超过最大文件数时删除最久未使用的文件，返回删除的数量"""
+        max_files = settings.HEATMAP_TILE_CACHE_MAX_FILES if max_files is None else max_files
+        files = []
+        for root, _, names in os.walk(settings.HEATMAP_TILE_DIR):
+            for name in names:
+                if name.endswith(".png"):
+                    path = os.path.join(root, name)
+                    try:
+                        files.append((os.stat(path).st_mtime, path))
+                    except FileNotFoundError:
+                        continue
+        if len(files) <= max_files:
+            return 0
+
+        files.sort()
+        removed = 0
+        for _, path in files[:len(files) - max_files]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """图片缓存统计（命中/未命中为本进程的计数）"""
+        lookups = cls.hits + cls.misses
+        return {
+            "directory": settings.HEATMAP_TILE_DIR,
+            "max_files": settings.HEATMAP_TILE_CACHE_MAX_FILES,
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": round(cls.hits / lookups, 4) if lookups else None,
+        }
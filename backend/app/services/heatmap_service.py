@@ -1,25 +1,95 @@
 """热力图服务"""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, or_, func, tuple_, delete
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime, time, timedelta
+import numpy as np
 from app.models.warehouse import (
-    Zone, Aisle, Shelf, Location, LocationHeatData, ShelfType
+    Warehouse, Zone, Aisle, Shelf, Location, LocationHeatData, LocationHeatRollup, ShelfType
 )
 from app.schemas.warehouse import (
     HeatmapFilterParams, HeatmapDataResponse,
-    AisleHeatData, ShelfHeatData, LocationHeatItem,
-    ShelfTypeEnum
+    WarehouseHeatmapResponse, ZoneHeatData, AisleHeatData, ShelfHeatData, LocationHeatItem,
+    ShelfTypeEnum, HeatmapFormatEnum, HeatScaleMethodEnum, HeatScale
+)
+from app.services.heat_rollup_service import HeatRollupService
+from app.services.heatmap_cache import HeatmapCache
+from app.services.heat_scoring import HeatScoringService
+from app.services.data_version import DataVersion
+from app.services.location_index import LocationIndex
+from app.utils.bulk import chunked, upsert_rows
+from app.utils.etag import make_etag
+from app.utils.packed import pack_columns
+from app.utils.quantiles import (
+    QuantileSketch, assign_buckets, exact_or_sketch_quantiles, jenks_breaks
 )
 from app.config import settings
 
+# 热度数据中随 upsert 覆盖的字段
+HEAT_VALUE_COLUMNS = (
+    "pick_frequency",
+    "turnover_rate",
+    "heat_value",
+    "inventory_qty",
+    "inbound_qty",
+    "outbound_qty",
+)
+
+# 批量写入热度数据时每批的记录数
+BULK_BATCH_SIZE = 5000
+
+# 拣货事件累加写入的字段（热度值按累加后的指标重新计算，直接覆盖）
+HEAT_INCREMENT_COLUMNS = ("pick_frequency", "outbound_qty")
+
+# 推送库位热度增量时的各列（与列式格式的同名列一致）
+HEAT_DELTA_COLUMNS = ("location_id", "heat_value", "pick_frequency", "turnover_rate", "inventory_qty")
+
+# 列式格式中库位的各列及其二进制打包类型
+# code / full_code_prefix / full_code_suffix / row_label 为 strings 字符串表中的下标
+COLUMNAR_LOCATION_COLUMNS = (
+    ("location_id", "int32"),
+    ("code", "uint32"),
+    ("full_code_prefix", "uint32"),
+    ("full_code_suffix", "uint32"),
+    ("row_label", "uint32"),
+    ("column_number", "int32"),
+    ("row_index", "int32"),
+    ("column_index", "int32"),
+    ("heat_value", "float64"),
+    ("pick_frequency", "int32"),
+    ("turnover_rate", "float64"),
+    ("inventory_qty", "int32"),
+)
+
+# 热度分级附带的百分位
+HEAT_SCALE_PERCENTILES = (50, 90, 99)
+
+# 计算 Jenks 断点的最多不同热度值数量，超出时先按对数分桶合并
+JENKS_MAX_VALUES = 512
+
+# 合并 Jenks 输入时放宽草图精度的最多次数，仍超出 JENKS_MAX_VALUES 时改用分位数断点
+JENKS_COARSEN_MAX_STEPS = 8
+
+# 热度分级的默认档数
+DEFAULT_HEAT_BUCKETS = 5
+
 
 class HeatmapService:
     """热力图服务类"""
     
+    # 无热度数据时的默认值
+    EMPTY_HEAT_DATA = {
+        "pick_frequency": 0,
+        "turnover_rate": 0,
+        "inventory_qty": 0,
+        "heat_value": 0
+    }
+    
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.rollup_service = HeatRollupService(db)
+        self.scoring = HeatScoringService(db)
     
     def _get_date_range(self, params: HeatmapFilterParams) -> Tuple[datetime, datetime]:
         """根据筛选参数获取日期范围"""
@@ -58,9 +128,21 @@ class HeatmapService:
     async def get_heatmap_data(
         self, 
         zone_id: int,
-        params: HeatmapFilterParams
+        params: HeatmapFilterParams,
+        scale: Optional[HeatScaleMethodEnum] = None,
+        buckets: int = DEFAULT_HEAT_BUCKETS
     ) -> Optional[HeatmapDataResponse]:
-        """获取热力图数据"""
+        """
+        获取热力图数据
+        
+        整个库区只需固定数量的查询：库区、通道、货架、库位各一次，
+        热度数据按库位分组聚合一次，然后在内存中组装响应，
+        查询次数不随库位数量增长。
+        
+        指定 scale 时附带服务端计算的热度分级（heat_scale）和每个库位的档位（heat_bucket）。
+        
+        响应按 (库区, 时间范围, 货架类型, 起止日期, 分级方式) 缓存，热度数据或布局变化后失效
+        """
         # 获取库区信息
         zone_result = await self.db.execute(
             select(Zone).where(Zone.id == zone_id)
@@ -70,45 +152,569 @@ class HeatmapService:
             return None
         
         start_date, end_date = self._get_date_range(params)
+        cache_key = self._cache_key(
+            zone_id, params, start_date, end_date, self._scale_variant("json", scale, buckets)
+        )
+        cached = HeatmapCache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        tree = await self._load_zone_tree([zone_id], params.shelf_type)
+        heat_by_location = await self._load_heat_aggregates([zone_id], start_date, end_date)
         
-        # 构建查询
-        aisle_query = select(Aisle).where(
-            and_(Aisle.zone_id == zone_id, Aisle.is_active == True)
-        ).order_by(Aisle.sort_order)
+        aisles_data, all_heat_values = self._build_aisles_data(
+            tree["aisles"].get(zone_id, []), tree, heat_by_location
+        )
         
-        aisle_result = await self.db.execute(aisle_query)
-        aisles = aisle_result.scalars().all()
+        min_heat = min(all_heat_values) if all_heat_values else 0
+        max_heat = max(all_heat_values) if all_heat_values else 0
+        
+        heat_scale = None
+        if scale:
+            heat_scale, breaks = self.compute_heat_scale(all_heat_values, scale, buckets)
+            self._assign_location_buckets(aisles_data, all_heat_values, breaks)
+        
+        response = HeatmapDataResponse(
+            zone_id=zone.id,
+            zone_code=zone.code,
+            zone_name=zone.name,
+            aisles=aisles_data,
+            min_heat=min_heat,
+            max_heat=max_heat,
+            time_range=params.time_range,
+            start_date=start_date,
+            end_date=end_date,
+            heat_scale=heat_scale
+        )
+        HeatmapCache.set(cache_key, response)
+        return response
+    
+    @staticmethod
+    def _scale_variant(variant: str, scale: Optional[HeatScaleMethodEnum], buckets: int) -> str:
+        """缓存键 / ETag 的变体：请求热度分级时附带分级方式和档数"""
+        return f"{variant}:{scale.value}:{buckets}" if scale else variant
+    
+    @staticmethod
+    def compute_heat_scale(
+        heat_values: Iterable[float],
+        method: HeatScaleMethodEnum,
+        buckets: int
+    ) -> Tuple[HeatScale, np.ndarray]:
+        """
+        计算热度分级，返回 (分级信息, 内部断点)
+        
+        只统计热度大于 0 的库位。数量超过 HEAT_SCALE_EXACT_MAX_VALUES 时分位数来自
+        对数分桶草图（一次线性扫描）；Jenks 断点在不同值过多时基于草图的直方图计算
+        """
+        values = np.asarray(list(heat_values), dtype=np.float64)
+        positive = values[values > 0]
+        exact_max = settings.HEAT_SCALE_EXACT_MAX_VALUES
+        
+        sketch = None
+        if len(positive) > exact_max:
+            sketch = QuantileSketch()
+            sketch.add(positive)
+        
+        percentiles, approximate = exact_or_sketch_quantiles(
+            positive, [p / 100 for p in HEAT_SCALE_PERCENTILES], exact_max, sketch
+        )
+        
+        if method == HeatScaleMethodEnum.QUANTILE:
+            breaks, _ = exact_or_sketch_quantiles(
+                positive, [i / buckets for i in range(1, buckets)], exact_max, sketch
+            )
+        else:
+            if sketch is None:
+                distinct, counts = np.unique(positive, return_counts=True)
+            if sketch is not None or len(distinct) > JENKS_MAX_VALUES:
+                # 逐步放宽草图精度，直到桶数不超过 JENKS_MAX_VALUES；
+                # 精度达到上限后桶数仍然过多（值域跨度极大）时不再尝试，改用分位数断点
+                accuracy = 0.01
+                distinct = None
+                for _ in range(JENKS_COARSEN_MAX_STEPS):
+                    coarse = QuantileSketch(accuracy)
+                    coarse.add(positive)
+                    histogram = coarse.histogram()
+                    if len(histogram[0]) <= JENKS_MAX_VALUES:
+                        distinct, counts = histogram
+                        break
+                    if accuracy >= 0.5:
+                        break
+                    accuracy = min(accuracy * 2, 0.5)
+                approximate = True
+            if distinct is not None:
+                breaks = jenks_breaks(distinct, counts, buckets)
+            else:
+                method = HeatScaleMethodEnum.QUANTILE
+                breaks, _ = exact_or_sketch_quantiles(
+                    positive, [i / buckets for i in range(1, buckets)], exact_max, sketch
+                )
+        
+        # 大量相同热度值时断点可能重复，合并后档数相应减少
+        breaks = np.unique(breaks)
+        heat_scale = HeatScale(
+            method=method,
+            bucket_count=len(breaks) + 1,
+            breaks=breaks.tolist(),
+            percentiles={
+                f"p{p}": value for p, value in zip(HEAT_SCALE_PERCENTILES, percentiles.tolist())
+            },
+            sample_count=len(positive),
+            approximate=approximate
+        )
+        return heat_scale, breaks
+    
+    @staticmethod
+    def _assign_location_buckets(
+        aisles_data: List[AisleHeatData],
+        heat_values: List[float],
+        breaks: np.ndarray
+    ) -> None:
+        """按断点设置各库位的 heat_bucket（heat_values 与库位的遍历顺序一致）"""
+        bucket_iter = iter(assign_buckets(heat_values, breaks).tolist())
+        for aisle in aisles_data:
+            for shelf in aisle.shelves:
+                for location in shelf.locations:
+                    location.heat_bucket = next(bucket_iter)
+    
+    def _cache_key(
+        self,
+        zone_id: int,
+        params: HeatmapFilterParams,
+        start_date: datetime,
+        end_date: datetime,
+        variant: str = "json"
+    ) -> str:
+        shelf_type = params.shelf_type.value if params.shelf_type else None
+        return HeatmapCache.key(zone_id, params.time_range, shelf_type, start_date, end_date, variant)
+    
+    def get_heatmap_etag(
+        self,
+        zone_id: int,
+        params: HeatmapFilterParams,
+        response_format: HeatmapFormatEnum = HeatmapFormatEnum.JSON,
+        scale: Optional[HeatScaleMethodEnum] = None,
+        buckets: int = DEFAULT_HEAT_BUCKETS
+    ) -> str:
+        """
+        热力图响应的 ETag
+        
+        由筛选条件、解析后的日期范围、响应格式、分级方式和库区数据版本生成，不查询数据库
+        """
+        start_date, end_date = self._get_date_range(params)
+        return make_etag(
+            self._cache_key(zone_id, params, start_date, end_date),
+            self._scale_variant(response_format.value, scale, buckets)
+        )
+    
+    async def get_heatmap_columns(
+        self,
+        zone_id: int,
+        params: HeatmapFilterParams,
+        scale: Optional[HeatScaleMethodEnum] = None,
+        buckets: int = DEFAULT_HEAT_BUCKETS
+    ) -> Optional[dict]:
+        """
+        获取列式格式的热力图数据
+        
+        与 get_heatmap_data 的内容相同，但不为每个库位构造对象：
+        - aisles / shelves 为对象列表（数量较少），货架通过 aisle_index 指向通道，
+          通过 location_start / location_count 指向 locations 中的连续区间
+        - locations 为 COLUMNAR_LOCATION_COLUMNS 各列的平行数组
+        - 编码类字段字典编码到 strings 中，完整编码为
+          strings[full_code_prefix] + strings[full_code_suffix]
+        - 指定 scale 时附带 heat_scale，locations 增加 heat_bucket 列
+        """
+        zone_result = await self.db.execute(
+            select(Zone).where(Zone.id == zone_id)
+        )
+        zone = zone_result.scalar_one_or_none()
+        if not zone:
+            return None
+        
+        start_date, end_date = self._get_date_range(params)
+        cache_key = self._cache_key(
+            zone_id, params, start_date, end_date,
+            self._scale_variant(HeatmapFormatEnum.COLUMNAR.value, scale, buckets)
+        )
+        cached = HeatmapCache.get(cache_key, model=None)
+        if cached is not None:
+            return cached
+        
+        tree = await self._load_zone_tree([zone_id], params.shelf_type)
+        heat_by_location = await self._load_heat_aggregates([zone_id], start_date, end_date)
+        
+        columns = self._build_columns(tree["aisles"].get(zone_id, []), tree, heat_by_location)
+        heat_values = columns["locations"]["heat_value"]
+        
+        result = {
+            "zone_id": zone.id,
+            "zone_code": zone.code,
+            "zone_name": zone.name,
+            "min_heat": min(heat_values) if heat_values else 0,
+            "max_heat": max(heat_values) if heat_values else 0,
+            "time_range": params.time_range,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            **columns
+        }
+        if scale:
+            heat_scale, breaks = self.compute_heat_scale(heat_values, scale, buckets)
+            result["heat_scale"] = heat_scale.model_dump(mode="json")
+            result["locations"]["heat_bucket"] = assign_buckets(heat_values, breaks).tolist()
+        HeatmapCache.set(cache_key, result)
+        return result
+    
+    @staticmethod
+    def pack_heatmap_columns(columns: dict) -> bytes:
+        """将列式热力图数据打包为二进制（库位各列为类型数组，其余字段在 JSON 头部）"""
+        header = {key: value for key, value in columns.items() if key != "locations"}
+        header["location_count"] = len(columns["locations"]["location_id"])
+        location_columns = list(COLUMNAR_LOCATION_COLUMNS)
+        if "heat_bucket" in columns["locations"]:
+            location_columns.append(("heat_bucket", "int32"))
+        return pack_columns(header, [
+            (name, dtype, columns["locations"][name])
+            for name, dtype in location_columns
+        ])
+    
+    async def _get_active_zones(self, warehouse_id: int) -> List[Zone]:
+        """仓库中启用的库区（与布局数据的顺序一致）"""
+        result = await self.db.execute(
+            select(Zone)
+            .where(and_(Zone.warehouse_id == warehouse_id, Zone.is_active == True))
+            .order_by(Zone.sort_order, Zone.id)
+        )
+        return list(result.scalars().all())
+    
+    def _warehouse_cache_key(
+        self,
+        warehouse_id: int,
+        zone_ids: List[int],
+        params: HeatmapFilterParams,
+        start_date: datetime,
+        end_date: datetime,
+        variant: str = "json"
+    ) -> str:
+        shelf_type = params.shelf_type.value if params.shelf_type else None
+        return HeatmapCache.warehouse_key(
+            warehouse_id, zone_ids, params.time_range, shelf_type, start_date, end_date, variant
+        )
+    
+    async def get_warehouse_heatmap_etag(
+        self,
+        warehouse_id: int,
+        params: HeatmapFilterParams,
+        scale: Optional[HeatScaleMethodEnum] = None,
+        buckets: int = DEFAULT_HEAT_BUCKETS
+    ) -> str:
+        """
+        仓库热力图响应的 ETag
+        
+        由筛选条件、解析后的日期范围、分级方式、布局版本和各库区数据版本生成，只查询库区列表
+        """
+        zones = await self._get_active_zones(warehouse_id)
+        start_date, end_date = self._get_date_range(params)
+        return make_etag(self._warehouse_cache_key(
+            warehouse_id, [zone.id for zone in zones], params, start_date, end_date,
+            self._scale_variant("json", scale, buckets)
+        ))
+    
+    async def get_warehouse_heatmap(
+        self,
+        warehouse_id: int,
+        params: HeatmapFilterParams,
+        scale: Optional[HeatScaleMethodEnum] = None,
+        buckets: int = DEFAULT_HEAT_BUCKETS
+    ) -> Optional[WarehouseHeatmapResponse]:
+        """
+        获取整个仓库（所有启用库区）的热力图数据
+        
+        所有库区的 通道-货架-库位 树和热度聚合各只查询一次，
+        min_heat / max_heat 为所有库区共用的范围，各库区另附自身的范围；
+        指定 scale 时按所有库区的热度值统一分级
+        """
+        warehouse = await self.db.get(Warehouse, warehouse_id)
+        if not warehouse:
+            return None
+        
+        zones = await self._get_active_zones(warehouse_id)
+        zone_ids = [zone.id for zone in zones]
+        start_date, end_date = self._get_date_range(params)
+        
+        cache_key = self._warehouse_cache_key(
+            warehouse_id, zone_ids, params, start_date, end_date, self._scale_variant("json", scale, buckets)
+        )
+        cached = HeatmapCache.get(cache_key, model=WarehouseHeatmapResponse)
+        if cached is not None:
+            return cached
+        
+        tree, heat_by_location = await self._load_zones_data(zone_ids, params, start_date, end_date)
+        
+        zones_data = []
+        all_heat_values = []
+        for zone in zones:
+            aisles_data, heat_values = self._build_aisles_data(
+                tree["aisles"].get(zone.id, []), tree, heat_by_location
+            )
+            all_heat_values.extend(heat_values)
+            zones_data.append(ZoneHeatData(
+                zone_id=zone.id,
+                zone_code=zone.code,
+                zone_name=zone.name,
+                aisles=aisles_data,
+                min_heat=min(heat_values) if heat_values else 0,
+                max_heat=max(heat_values) if heat_values else 0
+            ))
+        
+        heat_scale = None
+        if scale:
+            heat_scale, breaks = self.compute_heat_scale(all_heat_values, scale, buckets)
+            # 各库区按顺序遍历库位，与 all_heat_values 的顺序一致
+            self._assign_location_buckets(
+                [aisle for zone_data in zones_data for aisle in zone_data.aisles], all_heat_values, breaks
+            )
+        
+        response = WarehouseHeatmapResponse(
+            warehouse_id=warehouse.id,
+            warehouse_code=warehouse.code,
+            warehouse_name=warehouse.name,
+            zones=zones_data,
+            min_heat=min(all_heat_values) if all_heat_values else 0,
+            max_heat=max(all_heat_values) if all_heat_values else 0,
+            time_range=params.time_range,
+            start_date=start_date,
+            end_date=end_date,
+            heat_scale=heat_scale
+        )
+        HeatmapCache.set(cache_key, response)
+        return response
+    
+    async def get_warehouse_columns(
+        self,
+        warehouse_id: int,
+        params: HeatmapFilterParams
+    ) -> Optional[dict]:
+        """
+        获取列式格式的仓库热力图数据
+        
+        zones 中每个库区的结构与 get_heatmap_columns 相同（各自带 strings / aisles / shelves / locations），
+        顶层 min_heat / max_heat 为所有库区共用的范围
+        """
+        warehouse = await self.db.get(Warehouse, warehouse_id)
+        if not warehouse:
+            return None
+        
+        zones = await self._get_active_zones(warehouse_id)
+        zone_ids = [zone.id for zone in zones]
+        start_date, end_date = self._get_date_range(params)
+        
+        cache_key = self._warehouse_cache_key(
+            warehouse_id, zone_ids, params, start_date, end_date, HeatmapFormatEnum.COLUMNAR.value
+        )
+        cached = HeatmapCache.get(cache_key, model=None)
+        if cached is not None:
+            return cached
+        
+        tree, heat_by_location = await self._load_zones_data(zone_ids, params, start_date, end_date)
+        
+        zones_data = []
+        all_heat_values = []
+        for zone in zones:
+            columns = self._build_columns(tree["aisles"].get(zone.id, []), tree, heat_by_location)
+            heat_values = columns["locations"]["heat_value"]
+            all_heat_values.extend(heat_values)
+            zones_data.append({
+                "zone_id": zone.id,
+                "zone_code": zone.code,
+                "zone_name": zone.name,
+                "min_heat": min(heat_values) if heat_values else 0,
+                "max_heat": max(heat_values) if heat_values else 0,
+                **columns
+            })
+        
+        result = {
+            "warehouse_id": warehouse.id,
+            "warehouse_code": warehouse.code,
+            "warehouse_name": warehouse.name,
+            "zones": zones_data,
+            "min_heat": min(all_heat_values) if all_heat_values else 0,
+            "max_heat": max(all_heat_values) if all_heat_values else 0,
+            "time_range": params.time_range,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat()
+        }
+        HeatmapCache.set(cache_key, result)
+        return result
+    
+    async def _load_zones_data(
+        self,
+        zone_ids: List[int],
+        params: HeatmapFilterParams,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Tuple[Dict[str, Dict[int, list]], Dict[int, dict]]:
+        """一次加载多个库区的 通道-货架-库位 树和热度聚合，返回 (树, 热度数据)"""
+        if not zone_ids:
+            return {"aisles": {}, "shelves": {}, "locations": {}}, {}
+        tree = await self._load_zone_tree(zone_ids, params.shelf_type)
+        heat_by_location = await self._load_heat_aggregates(zone_ids, start_date, end_date)
+        return tree, heat_by_location
+    
+    async def _load_zone_tree(
+        self,
+        zone_ids: List[int],
+        shelf_type: Optional[ShelfTypeEnum] = None
+    ) -> Dict[str, Dict[int, list]]:
+        """
+        一次性加载库区的 通道-货架-库位 树
+        
+        返回:
+        {
+            "aisles": {zone_id: [Aisle, ...]},
+            "shelves": {aisle_id: [Shelf, ...]},
+            "locations": {shelf_id: [库位行, ...]}
+        }
+        各层排序与逐层查询时保持一致
+        """
+        aisle_result = await self.db.execute(
+            select(Aisle)
+            .where(and_(Aisle.zone_id.in_(zone_ids), Aisle.is_active == True))
+            .order_by(Aisle.sort_order, Aisle.id)
+        )
+        aisles_by_zone: Dict[int, list] = {}
+        for aisle in aisle_result.scalars().all():
+            aisles_by_zone.setdefault(aisle.zone_id, []).append(aisle)
+        
+        shelf_conditions = [
+            Aisle.zone_id.in_(zone_ids),
+            Aisle.is_active == True,
+            Shelf.is_active == True
+        ]
+        if shelf_type:
+            shelf_conditions.append(Shelf.shelf_type == ShelfType(shelf_type.value))
+        
+        shelf_result = await self.db.execute(
+            select(Shelf)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .where(and_(*shelf_conditions))
+            .order_by(Shelf.sort_order, Shelf.id)
+        )
+        shelves_by_aisle: Dict[int, list] = {}
+        for shelf in shelf_result.scalars().all():
+            shelves_by_aisle.setdefault(shelf.aisle_id, []).append(shelf)
+        
+        # 库位数量最多，只取需要的列，避免构造 ORM 对象
+        location_result = await self.db.execute(
+            select(
+                Location.id,
+                Location.shelf_id,
+                Location.code,
+                Location.full_code,
+                Location.row_label,
+                Location.column_number,
+                Location.row_index,
+                Location.column_index
+            )
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .where(and_(*shelf_conditions, Location.is_active == True))
+            .order_by(Location.row_index, Location.column_index, Location.id)
+        )
+        locations_by_shelf: Dict[int, list] = {}
+        for row in location_result.all():
+            locations_by_shelf.setdefault(row.shelf_id, []).append(row)
         
+        return {
+            "aisles": aisles_by_zone,
+            "shelves": shelves_by_aisle,
+            "locations": locations_by_shelf
+        }
+    
+    async def _load_heat_aggregates(
+        self,
+        zone_ids: List[int],
+        start_date: datetime,
+        end_date: datetime
+    ) -> Dict[int, dict]:
+        """
+        按库位聚合时间范围内的热度数据，返回 {location_id: 聚合数据}
+        
+        读取预聚合的汇总表，查询成本与历史数据量无关
+        """
+        query = (
+            select(
+                LocationHeatRollup.location_id,
+                *HeatRollupService.aggregate_columns()
+            )
+            .join(Location, LocationHeatRollup.location_id == Location.id)
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .where(
+                and_(
+                    Aisle.zone_id.in_(zone_ids),
+                    self.rollup_service.window_condition(start_date, end_date)
+                )
+            )
+            .group_by(LocationHeatRollup.location_id)
+        )
+        
+        result = await self.db.execute(query)
+        return {row.location_id: self._heat_row_to_dict(row) for row in result.all()}
+    
+    async def get_location_heat_columns(
+        self,
+        location_ids: Iterable[int],
+        params: HeatmapFilterParams
+    ) -> Dict[str, list]:
+        """
+        按筛选条件的时间范围获取指定库位的聚合热度，返回 HEAT_DELTA_COLUMNS 各列的平行数组
+        
+        用于推送增量，没有热度数据的库位返回默认值（例如该库位的数据已被删除）
+        """
+        start_date, end_date = self._get_date_range(params)
+        location_ids = sorted(set(location_ids))
+        heat_by_location = {}
+        for batch in chunked(location_ids, BULK_BATCH_SIZE):
+            result = await self.db.execute(
+                select(
+                    LocationHeatRollup.location_id,
+                    *HeatRollupService.aggregate_columns()
+                )
+                .where(
+                    and_(
+                        LocationHeatRollup.location_id.in_(batch),
+                        self.rollup_service.window_condition(start_date, end_date)
+                    )
+                )
+                .group_by(LocationHeatRollup.location_id)
+            )
+            heat_by_location.update({row.location_id: self._heat_row_to_dict(row) for row in result.all()})
+        
+        columns = {name: [] for name in HEAT_DELTA_COLUMNS}
+        for location_id in location_ids:
+            heat_data = heat_by_location.get(location_id, self.EMPTY_HEAT_DATA)
+            columns["location_id"].append(location_id)
+            for name in HEAT_DELTA_COLUMNS[1:]:
+                columns[name].append(heat_data.get(name, 0))
+        return columns
+    
+    def _build_aisles_data(
+        self,
+        aisles: list,
+        tree: Dict[str, Dict[int, list]],
+        heat_by_location: Dict[int, dict]
+    ) -> Tuple[List[AisleHeatData], List[float]]:
+        """在内存中组装通道/货架/库位热度数据，返回 (通道数据, 所有热度值)"""
         aisles_data = []
         all_heat_values = []
         
         for aisle in aisles:
-            # 获取货架
-            shelf_conditions = [Shelf.aisle_id == aisle.id, Shelf.is_active == True]
-            if params.shelf_type:
-                shelf_conditions.append(Shelf.shelf_type == ShelfType(params.shelf_type.value))
-            
-            shelf_query = select(Shelf).where(and_(*shelf_conditions)).order_by(Shelf.sort_order)
-            shelf_result = await self.db.execute(shelf_query)
-            shelves = shelf_result.scalars().all()
-            
             shelves_data = []
-            for shelf in shelves:
-                # 获取库位及其热度数据
-                location_query = (
-                    select(Location)
-                    .where(and_(Location.shelf_id == shelf.id, Location.is_active == True))
-                    .order_by(Location.row_index, Location.column_index)
-                )
-                location_result = await self.db.execute(location_query)
-                locations = location_result.scalars().all()
-                
+            for shelf in tree["shelves"].get(aisle.id, []):
                 locations_data = []
-                for location in locations:
-                    # 获取该库位在时间范围内的聚合热度数据
-                    heat_data = await self._get_aggregated_heat_data(
-                        location.id, start_date, end_date
-                    )
+                for location in tree["locations"].get(shelf.id, []):
+                    heat_data = heat_by_location.get(location.id, self.EMPTY_HEAT_DATA)
                     
                     heat_value = heat_data.get("heat_value", 0)
                     all_heat_values.append(heat_value)
@@ -149,20 +755,117 @@ class HeatmapService:
                     shelves=shelves_data
                 ))
         
-        min_heat = min(all_heat_values) if all_heat_values else 0
-        max_heat = max(all_heat_values) if all_heat_values else 0
+        return aisles_data, all_heat_values
+    
+    def _build_columns(
+        self,
+        aisles: list,
+        tree: Dict[str, Dict[int, list]],
+        heat_by_location: Dict[int, dict]
+    ) -> dict:
+        """在内存中组装列式热力图数据（内容与 _build_aisles_data 一致）"""
+        strings: Dict[str, int] = {}
         
-        return HeatmapDataResponse(
-            zone_id=zone.id,
-            zone_code=zone.code,
-            zone_name=zone.name,
-            aisles=aisles_data,
-            min_heat=min_heat,
-            max_heat=max_heat,
-            time_range=params.time_range,
-            start_date=start_date,
-            end_date=end_date
+        def intern(value: str) -> int:
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            return index
+        
+        empty_index = intern("")
+        locations = {name: [] for name, _ in COLUMNAR_LOCATION_COLUMNS}
+        aisles_data = []
+        shelves_data = []
+        
+        for aisle in aisles:
+            shelves = tree["shelves"].get(aisle.id, [])
+            if not shelves:
+                continue
+            
+            aisle_index = len(aisles_data)
+            aisles_data.append({
+                "aisle_id": aisle.id,
+                "aisle_code": aisle.code,
+                "aisle_name": aisle.name,
+                "y_coordinate": aisle.y_coordinate
+            })
+            
+            for shelf in shelves:
+                shelf_locations = tree["locations"].get(shelf.id, [])
+                shelves_data.append({
+                    "shelf_id": shelf.id,
+                    "aisle_index": aisle_index,
+                    "shelf_code": shelf.code,
+                    "shelf_name": shelf.name,
+                    "display_label": shelf.display_label,
+                    "shelf_type": shelf.shelf_type.value,
+                    "x_coordinate": shelf.x_coordinate,
+                    "rows": shelf.rows,
+                    "columns": shelf.columns,
+                    "layers": shelf.layers if hasattr(shelf, 'layers') else 1,
+                    "location_start": len(locations["location_id"]),
+                    "location_count": len(shelf_locations)
+                })
+                
+                for location in shelf_locations:
+                    heat_data = heat_by_location.get(location.id, self.EMPTY_HEAT_DATA)
+                    code_index = intern(location.code)
+                    # 完整编码拆为 前缀 + 库位编码，前缀在同一货架内相同
+                    if location.code and location.full_code.endswith(location.code):
+                        prefix_index = intern(location.full_code[:-len(location.code)])
+                        suffix_index = code_index
+                    else:
+                        prefix_index = intern(location.full_code)
+                        suffix_index = empty_index
+                    
+                    locations["location_id"].append(location.id)
+                    locations["code"].append(code_index)
+                    locations["full_code_prefix"].append(prefix_index)
+                    locations["full_code_suffix"].append(suffix_index)
+                    locations["row_label"].append(intern(location.row_label))
+                    locations["column_number"].append(location.column_number)
+                    locations["row_index"].append(location.row_index)
+                    locations["column_index"].append(location.column_index)
+                    locations["heat_value"].append(heat_data.get("heat_value", 0))
+                    locations["pick_frequency"].append(heat_data.get("pick_frequency", 0))
+                    locations["turnover_rate"].append(heat_data.get("turnover_rate", 0))
+                    locations["inventory_qty"].append(heat_data.get("inventory_qty", 0))
+        
+        return {
+            "strings": list(strings),
+            "aisles": aisles_data,
+            "shelves": shelves_data,
+            "locations": locations
+        }
+    
+    def _heat_row_to_dict(self, row) -> dict:
+        """将聚合查询结果行转换为热度数据字典"""
+        # 检查是否有匹配的数据（任何一个聚合值不为 NULL 即表示有数据）
+        has_data = row and (
+            row.total_pick_frequency is not None or 
+            row.total_heat_value is not None or
+            row.total_inventory_qty is not None
         )
+        
+        if not has_data:
+            return self.EMPTY_HEAT_DATA
+        
+        pick_frequency = int(row.total_pick_frequency or 0)
+        if hasattr(row, "avg_turnover_rate"):
+            turnover_rate = float(row.avg_turnover_rate or 0)
+        else:
+            # 汇总表只保存周转率合计，按记录数还原平均值
+            record_count = row.total_record_count or 0
+            turnover_rate = float(row.total_turnover_rate or 0) / record_count if record_count else 0.0
+        inventory_qty = int(row.total_inventory_qty or 0)
+        heat_value = float(row.total_heat_value or 0)
+        
+        return {
+            "pick_frequency": pick_frequency,
+            "turnover_rate": turnover_rate,
+            "inventory_qty": inventory_qty,
+            "heat_value": heat_value
+        }
     
     async def _get_aggregated_heat_data(
         self, 
@@ -170,54 +873,18 @@ class HeatmapService:
         start_date: datetime, 
         end_date: datetime
     ) -> dict:
-        """获取聚合的热度数据"""
-        # 直接使用 datetime 比较，更可靠且兼容性更好
+        """获取单个库位的聚合热度数据"""
         query = select(
-            func.sum(LocationHeatData.pick_frequency).label("total_pick_frequency"),
-            func.avg(LocationHeatData.turnover_rate).label("avg_turnover_rate"),
-            func.sum(LocationHeatData.inventory_qty).label("total_inventory_qty"),
-            func.sum(LocationHeatData.heat_value).label("total_heat_value")
+            *HeatRollupService.aggregate_columns()
         ).where(
             and_(
-                LocationHeatData.location_id == location_id,
-                LocationHeatData.date >= start_date,
-                LocationHeatData.date <= end_date
+                LocationHeatRollup.location_id == location_id,
+                self.rollup_service.window_condition(start_date, end_date)
             )
         )
         
         result = await self.db.execute(query)
-        row = result.one_or_none()
-        
-        # 检查是否有匹配的数据（任何一个聚合值不为 NULL 即表示有数据）
-        has_data = row and (
-            row.total_pick_frequency is not None or 
-            row.total_heat_value is not None or
-            row.total_inventory_qty is not None
-        )
-        
-        if has_data:
-            pick_frequency = int(row.total_pick_frequency or 0)
-            turnover_rate = float(row.avg_turnover_rate or 0)
-            inventory_qty = int(row.total_inventory_qty or 0)
-            heat_value = float(row.total_heat_value or 0)
-            
-            # 如果数据库中存储的 heat_value 为 0，使用 pick_frequency 作为热度值
-            if heat_value == 0 and pick_frequency > 0:
-                heat_value = float(pick_frequency)
-            
-            return {
-                "pick_frequency": pick_frequency,
-                "turnover_rate": turnover_rate,
-                "inventory_qty": inventory_qty,
-                "heat_value": heat_value
-            }
-        
-        return {
-            "pick_frequency": 0,
-            "turnover_rate": 0,
-            "inventory_qty": 0,
-            "heat_value": 0
-        }
+        return dict(self._heat_row_to_dict(result.one_or_none()))
     
     async def update_heat_data(
         self,
@@ -227,9 +894,15 @@ class HeatmapService:
         turnover_rate: float,
         inventory_qty: int = 0,
         inbound_qty: int = 0,
-        outbound_qty: int = 0
+        outbound_qty: int = 0,
+        sync_rollups: bool = True
     ) -> LocationHeatData:
-        """更新或创建库位热度数据"""
+        """
+        更新或创建库位热度数据
+        
+        同时记录热度汇总的增量；sync_rollups=False 时由调用方在批量写入结束后
+        统一调用 self.rollup_service.flush()
+        """
         # 查找是否已存在该日期的数据
         # 将日期归一化为当天的 00:00:00 到 23:59:59
         date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -245,8 +918,17 @@ class HeatmapService:
         result = await self.db.execute(query)
         heat_data = result.scalar_one_or_none()
         
-        # 计算热度值: 暂时仅使用拣货频次作为热度指标
-        heat_value = float(pick_frequency)
+        # 按当前热度公式计算热度值
+        scored = {
+            "location_id": location_id,
+            "pick_frequency": pick_frequency,
+            "turnover_rate": turnover_rate,
+            "outbound_qty": outbound_qty,
+        }
+        await self.scoring.score_rows([scored])
+        heat_value = scored["heat_value"]
+        
+        old_measures = HeatRollupService.measures_of(heat_data) if heat_data else None
         
         if heat_data:
             # 更新现有数据
@@ -260,7 +942,7 @@ class HeatmapService:
             # 创建新数据
             heat_data = LocationHeatData(
                 location_id=location_id,
-                date=date,
+                date=date_start,
                 pick_frequency=pick_frequency,
                 turnover_rate=turnover_rate,
                 heat_value=heat_value,
@@ -270,10 +952,201 @@ class HeatmapService:
             )
             self.db.add(heat_data)
         
+        self.rollup_service.record_change(
+            location_id, heat_data.date, old_measures, HeatRollupService.measures_of(heat_data)
+        )
+        if sync_rollups:
+            await self.rollup_service.flush()
+        await DataVersion.mark_locations(self.db, [location_id])
+        
         await self.db.flush()
         await self.db.refresh(heat_data)
         return heat_data
     
+    async def bulk_upsert_heat_data(
+        self,
+        records: List[dict],
+        batch_size: int = BULK_BATCH_SIZE
+    ) -> int:
+        """
+        批量写入热度数据（多行 INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE）
+        
+        records 中每项包含 location_id, date, pick_frequency, turnover_rate,
+        inventory_qty, inbound_qty, outbound_qty。
+        日期归一化为当天 00:00:00，同一库位同一天的多条记录以最后一条为准，
+        与逐条调用 update_heat_data 的结果一致。
+        
+        返回实际写入的记录数（去重后）
+        """
+        rows_by_key: Dict[Tuple[int, datetime], dict] = {}
+        for record in records:
+            day = record["date"].replace(hour=0, minute=0, second=0, microsecond=0)
+            pick_frequency = record.get("pick_frequency", 0)
+            rows_by_key[(record["location_id"], day)] = {
+                "location_id": record["location_id"],
+                "date": day,
+                "pick_frequency": pick_frequency,
+                "turnover_rate": record.get("turnover_rate", 0),
+                "heat_value": 0.0,
+                "inventory_qty": record.get("inventory_qty", 0),
+                "inbound_qty": record.get("inbound_qty", 0),
+                "outbound_qty": record.get("outbound_qty", 0),
+            }
+        
+        rows = list(rows_by_key.values())
+        for batch in chunked(rows, batch_size):
+            await self.scoring.score_rows(batch)
+            
+            # 查询本批已存在的记录，用于计算汇总增量
+            keys = [(row["location_id"], row["date"]) for row in batch]
+            # 只取列而不加载 ORM 对象，避免会话中缓存被 upsert 覆盖前的旧值
+            existing_result = await self.db.execute(
+                select(
+                    LocationHeatData.location_id,
+                    LocationHeatData.date,
+                    *[getattr(LocationHeatData, column) for column in HEAT_VALUE_COLUMNS]
+                ).where(
+                    tuple_(LocationHeatData.location_id, LocationHeatData.date).in_(keys)
+                )
+            )
+            existing = {
+                (item.location_id, item.date): HeatRollupService.measures_of(item)
+                for item in existing_result.all()
+            }
+            
+            for row in batch:
+                key = (row["location_id"], row["date"])
+                self.rollup_service.record_change(
+                    row["location_id"], row["date"], existing.get(key), HeatRollupService.measures_of(row)
+                )
+            
+            await upsert_rows(
+                self.db,
+                LocationHeatData.__table__,
+                batch,
+                key_columns=("location_id", "date"),
+                update_columns=HEAT_VALUE_COLUMNS
+            )
+            await self.rollup_service.flush()
+        
+        await DataVersion.mark_locations(self.db, {row["location_id"] for row in rows})
+        return len(rows)
+    
+    async def bulk_increment_heat_data(
+        self,
+        increments: List[dict],
+        batch_size: int = BULK_BATCH_SIZE
+    ) -> int:
+        """
+        批量累加热度数据（拣货事件的聚合增量）
+        
+        increments 中每项包含 location_id, date, pick_frequency, outbound_qty，
+        日期归一化为当天 00:00:00，同一库位同一天的增量先合并。
+        已有记录在原值上累加 HEAT_INCREMENT_COLUMNS（INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x），
+        heat_value 按累加后的指标重新计算后覆盖，其余字段保持不变；不存在的记录以增量新建，其余字段为 0。
+        
+        返回写入的记录数（合并后）
+        """
+        merged: Dict[Tuple[int, datetime], dict] = {}
+        for increment in increments:
+            day = increment["date"].replace(hour=0, minute=0, second=0, microsecond=0)
+            key = (increment["location_id"], day)
+            row = merged.get(key)
+            if row is None:
+                row = merged[key] = {
+                    "location_id": increment["location_id"],
+                    "date": day,
+                    "pick_frequency": 0,
+                    "turnover_rate": 0,
+                    "heat_value": 0.0,
+                    "inventory_qty": 0,
+                    "inbound_qty": 0,
+                    "outbound_qty": 0,
+                }
+            row["pick_frequency"] += increment.get("pick_frequency", 0)
+            row["outbound_qty"] += increment.get("outbound_qty", 0)
+        
+        rows = list(merged.values())
+        for batch in chunked(rows, batch_size):
+            # 查询本批已存在的记录，用于计算汇总增量
+            keys = [(row["location_id"], row["date"]) for row in batch]
+            existing_result = await self.db.execute(
+                select(
+                    LocationHeatData.location_id,
+                    LocationHeatData.date,
+                    *[getattr(LocationHeatData, column) for column in HEAT_VALUE_COLUMNS]
+                ).where(
+                    tuple_(LocationHeatData.location_id, LocationHeatData.date).in_(keys)
+                )
+            )
+            existing = {(item.location_id, item.date): item._asdict() for item in existing_result.all()}
+            
+            # 累加后的记录，按其指标计算新的热度值
+            olds = [existing.get((row["location_id"], row["date"])) for row in batch]
+            news = []
+            for row, old in zip(batch, olds):
+                new = dict(old) if old else dict(row)
+                new["location_id"] = row["location_id"]
+                if old:
+                    for column in HEAT_INCREMENT_COLUMNS:
+                        new[column] = (new[column] or 0) + row[column]
+                news.append(new)
+            await self.scoring.score_rows(news)
+            
+            for row, old, new in zip(batch, olds, news):
+                row["heat_value"] = new["heat_value"]
+                self.rollup_service.record_change(
+                    row["location_id"], row["date"],
+                    HeatRollupService.measures_of(old) if old else None,
+                    HeatRollupService.measures_of(new)
+                )
+            
+            await upsert_rows(
+                self.db,
+                LocationHeatData.__table__,
+                batch,
+                key_columns=("location_id", "date"),
+                update_columns=HEAT_INCREMENT_COLUMNS,
+                additive=True,
+                replace_columns=("heat_value",)
+            )
+            await self.rollup_service.flush()
+        
+        await DataVersion.mark_locations(self.db, {row["location_id"] for row in rows})
+        return len(rows)
+    
+    async def delete_heat_data_days(self, days: Iterable[date]) -> None:
+        """
+        删除若干天（所有库位）的热度数据，并同步扣减汇总
+        
+        连续的日期合并为一个时间段删除
+        """
+        days = sorted(set(days))
+        if not days:
+            return
+        
+        await self.rollup_service.remove_days(days)
+        DataVersion.mark_all(self.db)
+        
+        # 合并连续日期: [(起始日, 结束日)]
+        ranges: List[Tuple[date, date]] = []
+        for day in days:
+            if ranges and day == ranges[-1][1] + timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], day)
+            else:
+                ranges.append((day, day))
+        
+        for batch in chunked(ranges, 100):
+            await self.db.execute(
+                delete(LocationHeatData).where(or_(*[
+                    and_(
+                        LocationHeatData.date >= datetime.combine(first_day, time.min),
+                        LocationHeatData.date < datetime.combine(last_day + timedelta(days=1), time.min)
+                    )
+                    for first_day, last_day in batch
+                ]))
+            )
+    
     async def batch_update_heat_data(self, data_list: List[dict]) -> int:
         """
         批量更新热度数据
@@ -290,31 +1163,33 @@ class HeatmapService:
                 "outbound_qty": 20
             }
         ]
+        
+        库位编码通过 LocationIndex 一次性批量解析（也接受导入支持的其他编码格式），
+        找不到库位的记录跳过；同一库位同一天的多条记录以最后一条为准
         """
-        updated_count = 0
+        locations = await LocationIndex.resolve(
+            self.db, [item["location_code"] for item in data_list]
+        )
         
+        records = []
         for item in data_list:
-            # 根据库位编码查找库位
-            location_query = select(Location).where(
-                Location.full_code == item["location_code"]
-            )
-            location_result = await self.db.execute(location_query)
-            location = location_result.scalar_one_or_none()
+            location = locations.get(item["location_code"])
+            if not location:
+                continue
             
-            if location:
-                date = item["date"]
-                if isinstance(date, str):
-                    date = datetime.fromisoformat(date)
-                
-                await self.update_heat_data(
-                    location_id=location.id,
-                    date=date,
-                    pick_frequency=item.get("pick_frequency", 0),
-                    turnover_rate=item.get("turnover_rate", 0),
-                    inventory_qty=item.get("inventory_qty", 0),
-                    inbound_qty=item.get("inbound_qty", 0),
-                    outbound_qty=item.get("outbound_qty", 0)
-                )
-                updated_count += 1
+            date = item["date"]
+            if isinstance(date, str):
+                date = datetime.fromisoformat(date)
+            
+            records.append({
+                "location_id": location.id,
+                "date": date,
+                "pick_frequency": item.get("pick_frequency", 0),
+                "turnover_rate": item.get("turnover_rate", 0),
+                "inventory_qty": item.get("inventory_qty", 0),
+                "inbound_qty": item.get("inbound_qty", 0),
+                "outbound_qty": item.get("outbound_qty", 0),
+            })
         
-        return updated_count
+        await self.bulk_upsert_heat_data(records)
+        return len(records)
@@ -0,0 +1,263 @@
+"""异步导入任务服务"""
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import select, desc, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
+from app.models.warehouse import ImportJob
+from app.schemas.warehouse import ImportModeEnum
+from app.services.import_service import ImportService, ImportProgress
+
+
+class ImportJobService:
+    """
+    异步导入任务服务类
+
+    上传文件落盘后创建任务并立即返回任务 ID，导入在后台协程中使用独立的数据库会话执行，
+    每块处理完成后把进度写回 import_jobs。replace 模式整个导入在一个事务中，
+    其间写其他表可能被锁住（SQLite），进度只保存在进程内，查询任务时合并到结果中。
+    导入会删除或覆盖热度数据，因此同一进程内的任务串行执行，排队中的任务保持 pending 状态。
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_FAILED = "failed"
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    # 任务中保存的错误信息条数上限
+    ERROR_LIMIT = 100
+
+    # 串行执行导入任务的锁（首次使用时创建）
+    _lock: Optional[asyncio.Lock] = None
+    # 后台任务引用，避免任务在完成前被垃圾回收
+    _tasks: Set[asyncio.Task] = set()
+    # 未写回 import_jobs 的执行中任务进度: {job_id: 任务字段}
+    _live_progress: Dict[int, Dict[str, Any]] = {}
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # ==================== 提交与执行 ====================
+
+    async def submit(
+        self,
+        path: str,
+        filename: str,
+        file_type: str,
+        mode: ImportModeEnum = ImportModeEnum.REPLACE
+    ) -> ImportJob:
+        """
+        创建导入任务并在后台开始执行
+
+        path: 已落盘的上传文件路径，任务结束后删除
+        任务记录先提交，保证后台会话能立即看到
+        """
+        job = ImportJob(
+            filename=filename,
+            file_type=file_type,
+            status=self.STATUS_PENDING,
+            created_at=datetime.now()
+        )
+        self.db.add(job)
+        await self.db.commit()
+
+        task = asyncio.create_task(self._run(job.id, path, filename, file_type, mode))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    @classmethod
+    def _get_lock(cls) -> asyncio.Lock:
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        return cls._lock
+
+    @classmethod
+    async def _run(
+        cls,
+        job_id: int,
+        path: str,
+        filename: str,
+        file_type: str,
+        mode: ImportModeEnum
+    ) -> None:
+        """后台执行导入任务"""
+        try:
+            async with cls._get_lock():
+                now = datetime.now()
+                await cls._update(job_id, status=cls.STATUS_RUNNING, started_at=now, updated_at=now)
+
+                async def on_progress(progress: ImportProgress) -> None:
+                    if mode == ImportModeEnum.REPLACE:
+                        cls._live_progress[job_id] = cls._progress_values(progress)
+                    else:
+                        await cls._update(job_id, **cls._progress_values(progress))
+
+                progress = ImportProgress()
+                async with AsyncSessionLocal() as db:
+                    service = ImportService(db)
+                    with open(path, "rb") as source:
+                        if file_type == "csv":
+                            result = await service.import_csv_file(source, filename, mode, progress, on_progress)
+                        else:
+                            result = await service.import_excel_file(source, filename, mode, progress, on_progress)
+
+                now = datetime.now()
+                await cls._update(
+                    job_id,
+                    status=result["status"],
+                    processed_rows=result["total_rows"],
+                    imported_rows=result["imported_rows"],
+                    skipped_rows=result.get("skipped_rows", 0),
+                    failed_rows=result["failed_rows"],
+                    estimated_total_rows=result["total_rows"],
+                    errors=cls._dump_errors(result.get("errors")),
+                    result=json.dumps(result, ensure_ascii=False),
+                    finished_at=now,
+                    updated_at=now
+                )
+        except Exception as e:
+            now = datetime.now()
+            await cls._update(
+                job_id,
+                status=cls.STATUS_FAILED,
+                errors=cls._dump_errors([f"导入任务执行失败: {str(e)}"]),
+                finished_at=now,
+                updated_at=now
+            )
+        finally:
+            cls._live_progress.pop(job_id, None)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def _progress_values(cls, progress: ImportProgress) -> Dict[str, Any]:
+        """将分块导入的进度转换为任务字段"""
+        row_errors = sorted(progress.row_errors, key=lambda item: item[0])
+        return {
+            "processed_rows": progress.total_rows,
+            "imported_rows": progress.imported_rows,
+            "skipped_rows": progress.skipped_rows,
+            "failed_rows": len(row_errors),
+            "estimated_total_rows": progress.estimated_total_rows,
+            "errors": cls._dump_errors([message for _, message in row_errors]),
+            "updated_at": datetime.now()
+        }
+
+    @classmethod
+    def _dump_errors(cls, errors: Optional[List[str]]) -> Optional[str]:
+        if not errors:
+            return None
+        return json.dumps(errors[:cls.ERROR_LIMIT], ensure_ascii=False)
+
+    @staticmethod
+    async def _update(job_id: int, **values) -> None:
+        """在独立会话中更新任务状态"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+            await db.commit()
+
+    @classmethod
+    async def fail_interrupted_jobs(cls) -> int:
+        """将服务重启前未完成的任务标记为失败，返回任务数"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ImportJob)
+                .where(ImportJob.status.in_(cls.ACTIVE_STATUSES))
+                .values(
+                    status=cls.STATUS_FAILED,
+                    errors=cls._dump_errors(["服务重启，导入任务已中断"]),
+                    finished_at=datetime.now()
+                )
+            )
+            await db.commit()
+            return result.rowcount
+
+    # ==================== 查询 ====================
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务状态"""
+        job = await self.db.get(ImportJob, job_id)
+        if not job:
+            return None
+        return self.job_to_dict(job)
+
+    async def get_active_history(self) -> List[Dict[str, Any]]:
+        """
+        获取排队中和执行中的任务，格式与导入历史记录一致
+
+        任务尚未生成导入记录，id 为空，另附 job_id 和进度字段
+        """
+        result = await self.db.execute(
+            select(ImportJob)
+            .where(ImportJob.status.in_(self.ACTIVE_STATUSES))
+            .order_by(desc(ImportJob.created_at))
+        )
+        items = []
+        for job in result.scalars().all():
+            item = self.job_to_dict(job)
+            items.append({
+                **item,
+                "id": None,
+                "total_rows": item["estimated_total_rows"] or item["processed_rows"],
+                "success_rows": item["imported_rows"],
+                "import_time": item["created_at"]
+            })
+        return items
+
+    @classmethod
+    def job_to_dict(cls, job: ImportJob) -> Dict[str, Any]:
+        """
+        任务状态字典
+
+        rows_per_second 为开始处理以来的平均吞吐量，
+        eta_seconds 按该吞吐量和预估总行数估算剩余时间（仅执行中的任务）。
+        进程内有未写回的进度时以其为准
+        """
+        live = cls._live_progress.get(job.id, {})
+
+        def field(name: str) -> Any:
+            return live[name] if name in live else getattr(job, name)
+
+        processed_rows = field("processed_rows") or 0
+        estimated_total_rows = field("estimated_total_rows")
+        errors = field("errors")
+
+        rows_per_second = None
+        eta_seconds = None
+        if job.started_at:
+            end_time = job.finished_at or field("updated_at") or job.started_at
+            elapsed = (end_time - job.started_at).total_seconds()
+            if elapsed > 0 and processed_rows:
+                rows_per_second = round(processed_rows / elapsed, 1)
+
+        if job.status == cls.STATUS_RUNNING and rows_per_second and estimated_total_rows:
+            remaining = max(estimated_total_rows - processed_rows, 0)
+            eta_seconds = round(remaining / rows_per_second, 1)
+
+        def format_time(value: Optional[datetime]) -> Optional[str]:
+            return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+        return {
+            "job_id": job.id,
+            "filename": job.filename,
+            "file_type": job.file_type,
+            "status": job.status,
+            "processed_rows": processed_rows,
+            "estimated_total_rows": estimated_total_rows,
+            "imported_rows": field("imported_rows") or 0,
+            "skipped_rows": field("skipped_rows") or 0,
+            "failed_rows": field("failed_rows") or 0,
+            "rows_per_second": rows_per_second,
+            "eta_seconds": eta_seconds,
+            "errors": json.loads(errors) if errors else None,
+            "result": json.loads(job.result) if job.result else None,
+            "created_at": format_time(job.created_at),
+            "started_at": format_time(job.started_at),
+            "finished_at": format_time(job.finished_at)
+        }
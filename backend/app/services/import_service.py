@@ -1,14 +1,52 @@
 """数据导入服务"""
+import asyncio
+import numpy as np
 import pandas as pd
 import re
 import json
+import codecs
 from io import BytesIO
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, BinaryIO, Callable, Awaitable
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
+from openpyxl import load_workbook
+from app.config import settings
 from app.models.warehouse import Warehouse, Zone, Aisle, Shelf, Location, ShelfType, ImportRecord
+from app.schemas.warehouse import ImportModeEnum
 from app.services.heatmap_service import HeatmapService
+from app.services.data_version import DataVersion
+from app.services.location_index import LocationIndex, LocationRef
+from app.utils.bulk import chunked
+
+
+class ImportProgress:
+    """分块导入时跨块累计的统计信息"""
+    
+    def __init__(self):
+        self.total_rows = 0
+        self.imported_rows = 0
+        self.skipped_rows = 0
+        self.skipped_locations: set = set()
+        # (行号, 错误信息)
+        self.row_errors: List[Tuple[int, str]] = []
+        self.start_date: Optional[str] = None
+        self.end_date: Optional[str] = None
+        # 读取文件时预估的总行数（无法预估时为 None）
+        self.estimated_total_rows: Optional[int] = None
+        # replace_range 模式下已清空的日期
+        self.cleared_days: set = set()
+    
+    def add_dates(self, start_date: str, end_date: str) -> None:
+        """合并一块数据的日期范围（YYYY-MM-DD）"""
+        if self.start_date is None or start_date < self.start_date:
+            self.start_date = start_date
+        if self.end_date is None or end_date > self.end_date:
+            self.end_date = end_date
+
+
+# 分块导入的进度回调
+ProgressCallback = Callable[[ImportProgress], Awaitable[None]]
 
 
 class ImportService:
@@ -33,6 +71,36 @@ class ImportService:
     DEFAULT_WAREHOUSE_CODE = "WH001"
     DEFAULT_WAREHOUSE_NAME = "默认仓库"
     
+    # 批量查询库位/货架时每批的编码数量
+    LOOKUP_BATCH_SIZE = 500
+    
+    # 支持的日期格式（向量化解析与 _parse_date 共用）
+    DATE_FORMATS = [
+        "%Y-%m-%d",      # 2026-01-31
+        "%Y/%m/%d",      # 2026/01/31
+        "%Y-%m-%d %H:%M:%S",  # 带时间
+        "%Y/%m/%d %H:%M:%S",
+    ]
+    
+    # 库位编码中库位部分的格式: 库区代码 + 顺序号 (如 C1, LP2)
+    LOCATION_SEQ_PATTERN = r'([A-Z]+)(\d+)'
+    # 完整库位编码: 库区-巷道-货架-库位[-...]
+    LOCATION_CODE_PATTERN = r'^([^-]*)-([^-]*)-([^-]*)-' + LOCATION_SEQ_PATTERN + r'(?:-|$)'
+    
+    # CSV 尝试的编码（按顺序）
+    CSV_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+    # 判断 CSV 编码时读取的文件开头字节数
+    ENCODING_SNIFF_BYTES = 1024 * 1024
+    
+    # 数值字段及其类型
+    NUMERIC_FIELDS = {
+        "pick_frequency": int,
+        "turnover_rate": float,
+        "inventory_qty": int,
+        "inbound_qty": int,
+        "outbound_qty": int,
+    }
+    
     def __init__(self, db: AsyncSession):
         self.db = db
         self.heatmap_service = HeatmapService(db)
@@ -64,14 +132,7 @@ class ImportService:
         if isinstance(date_value, str):
             date_str = date_value.strip()
             # 尝试多种日期格式
-            date_formats = [
-                "%Y-%m-%d",      # 2026-01-31
-                "%Y/%m/%d",      # 2026/01/31
-                "%Y-%m-%d %H:%M:%S",  # 带时间
-                "%Y/%m/%d %H:%M:%S",
-            ]
-            
-            for fmt in date_formats:
+            for fmt in self.DATE_FORMATS:
                 try:
                     return datetime.strptime(date_str, fmt)
                 except ValueError:
@@ -131,7 +192,7 @@ class ImportService:
         
         # 解析库位编码，格式为: 库区代码 + 顺序号 (如 C1, C2, B1, LP1, LP2)
         # 支持单字符(C, B)和多字符(LP)库区代码
-        match = re.match(r'^([A-Z]+)(\d+)$', location_code)
+        match = re.match(rf'^{self.LOCATION_SEQ_PATTERN}$', location_code)
         if not match:
             return None
         
@@ -175,6 +236,7 @@ class ImportService:
             )
             self.db.add(warehouse)
             await self.db.flush()
+            DataVersion.mark_layout(self.db, warehouse.id)
         
         self._warehouse_cache["_active_warehouse"] = warehouse
         return warehouse
@@ -201,6 +263,7 @@ class ImportService:
             )
             self.db.add(zone)
             await self.db.flush()
+            DataVersion.mark_layout(self.db, warehouse_id)
         
         self._zone_cache[cache_key] = zone
         return zone
@@ -235,6 +298,8 @@ class ImportService:
             )
             self.db.add(aisle)
             await self.db.flush()
+            zone = await self.db.get(Zone, zone_id)
+            DataVersion.mark_layout(self.db, zone.warehouse_id)
         
         self._aisle_cache[cache_key] = aisle
         return aisle
@@ -278,6 +343,9 @@ class ImportService:
             )
             self.db.add(shelf)
             await self.db.flush()
+            aisle = await self.db.get(Aisle, aisle_id)
+            zone = await self.db.get(Zone, aisle.zone_id)
+            DataVersion.mark_layout(self.db, zone.warehouse_id)
         else:
             # 如果提供了 display_label 且与现有值不同，则更新
             if display_label and shelf.display_label != display_label:
@@ -287,51 +355,38 @@ class ImportService:
         self._shelf_cache[cache_key] = shelf
         return shelf
     
-    async def _get_location_by_full_code(self, full_code: str) -> Optional[Location]:
+    async def _resolve_location_codes(self, codes: List[str]) -> Dict[str, LocationRef]:
         """
-        直接通过完整库位编码查找库位
+        批量解析库位编码
         
-        这是首选方法，避免解析和重建库位编码可能导致的格式不匹配问题
+        通过 LocationIndex 按完整编码查找，其次按 _parse_location_code 规则得到的标准编码查找，
+        返回 {编码: LocationRef(id, shelf_id)}，不存在的编码不在结果中
         """
-        # 先检查缓存
-        if full_code in self._location_cache:
-            return self._location_cache[full_code]
-        
-        # 查询数据库
-        result = await self.db.execute(
-            select(Location).where(Location.full_code == full_code)
-        )
-        location = result.scalar_one_or_none()
-        
-        if location:
-            self._location_cache[full_code] = location
-        
-        return location
+        return await LocationIndex.resolve(self.db, codes)
     
-    async def _update_shelf_display_label(self, shelf_id: int, display_label: str) -> None:
+    async def _update_shelf_display_labels(self, labels: Dict[int, str]) -> None:
         """
-        更新货架的显示标识
+        批量更新货架的显示标识
         
-        使用缓存避免重复更新同一货架
+        labels: {shelf_id: display_label}，只更新与现有值不同的货架
         """
-        cache_key = f"shelf_label_{shelf_id}"
+        if not labels:
+            return
         
-        # 如果已经更新过且值相同，跳过
-        if cache_key in self._shelf_cache:
-            cached_label = getattr(self._shelf_cache[cache_key], 'display_label', None)
-            if cached_label == display_label:
-                return
-        
-        # 查询货架
-        result = await self.db.execute(
-            select(Shelf).where(Shelf.id == shelf_id)
-        )
-        shelf = result.scalar_one_or_none()
+        zone_ids = set()
+        for batch in chunked(list(labels.keys()), self.LOOKUP_BATCH_SIZE):
+            result = await self.db.execute(
+                select(Shelf, Aisle.zone_id)
+                .join(Aisle, Shelf.aisle_id == Aisle.id)
+                .where(Shelf.id.in_(batch))
+            )
+            for shelf, zone_id in result.all():
+                if shelf.display_label != labels[shelf.id]:
+                    shelf.display_label = labels[shelf.id]
+                    zone_ids.add(zone_id)
         
-        if shelf and shelf.display_label != display_label:
-            shelf.display_label = display_label
-            await self.db.flush()
-            self._shelf_cache[cache_key] = shelf
+        DataVersion.mark_zones(self.db, zone_ids)
+        await self.db.flush()
     
     async def _get_or_create_location(self, parsed: Dict[str, Any], display_label: str = None) -> Optional[Location]:
         """
@@ -352,6 +407,7 @@ class ImportService:
                 zone = await self._get_or_create_zone(warehouse.id, parsed['zone_code'])
                 aisle = await self._get_or_create_aisle(zone.id, parsed['aisle_code'])
                 await self._get_or_create_shelf(aisle.id, parsed['shelf_code'], display_label=display_label)
+                DataVersion.mark_zones(self.db, [zone.id])
             return self._location_cache[full_code]
         
         # 查询数据库
@@ -368,6 +424,7 @@ class ImportService:
                 zone = await self._get_or_create_zone(warehouse.id, parsed['zone_code'])
                 aisle = await self._get_or_create_aisle(zone.id, parsed['aisle_code'])
                 await self._get_or_create_shelf(aisle.id, parsed['shelf_code'], display_label=display_label)
+                DataVersion.mark_zones(self.db, [zone.id])
             return location
         
         # 需要创建库位，先确保上级结构存在
@@ -405,9 +462,164 @@ class ImportService:
             self.db.add(location)
             await self.db.flush()
         
+        # 可能新建了库区、通道、货架、库位或更新了货架显示标识
+        DataVersion.mark_zones(self.db, [zone.id])
+        DataVersion.mark_layout(self.db, warehouse.id)
         self._location_cache[full_code] = location
         return location
     
+    def _normalize_dataframe(
+        self,
+        df: pd.DataFrame,
+        column_mapping: Dict[str, str]
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        按列向量化规范化导入数据
+        
+        返回 (typed, errors):
+        - typed: 与 df 同索引的规范化数据，列包括 row_number, location_code, display_label,
+          date, 各数值字段，以及按 _parse_location_code 规则拆出的 zone_code, aisle_code,
+          shelf_code, location_short_code, row_label, column_number（无法解析时为空）
+        - errors: 与 df 同索引的逐行错误信息，无错误时为 None。
+          date_error 为日期解析错误（在查找库位之前判定），
+          value_error 为数值转换错误或日期不可用（在库位存在时才判定）
+        
+        常见格式走向量化路径，其余少量单元格回退到 _parse_date 和 int()/float() 逐个处理，
+        以保证结果和错误信息与逐行处理一致
+        """
+        typed = pd.DataFrame(index=df.index)
+        errors = pd.DataFrame({"date_error": None, "value_error": None}, index=df.index, dtype=object)
+        typed["row_number"] = df.index + 2
+        
+        def column(field: str) -> Optional[pd.Series]:
+            col_name = column_mapping.get(field, "")
+            if col_name and col_name in df.columns:
+                return df[col_name]
+            return None
+        
+        # 日期
+        dates, date_errors, unusable_dates = self._normalize_dates(column("date"), df.index)
+        typed["date"] = dates
+        errors["date_error"] = date_errors
+        
+        # 库位编码
+        codes = column("location_code")
+        typed["location_code"] = codes.astype(str).str.strip() if codes is not None else "None"
+        
+        # 显示标识：空值、空字符串和 0 视为未提供
+        labels = column("display_label")
+        if labels is not None:
+            present = labels.notna() & labels.astype(bool)
+            typed["display_label"] = labels.astype(str).str.strip().astype(object).where(present, None)
+        else:
+            typed["display_label"] = None
+        
+        # 数值字段，空值填充为 0
+        value_errors = unusable_dates
+        for field, kind in self.NUMERIC_FIELDS.items():
+            values, field_errors = self._normalize_numbers(column(field), kind, df.index)
+            typed[field] = values
+            value_errors = value_errors.where(value_errors.notna(), field_errors)
+        errors["value_error"] = value_errors
+        
+        # 解析库位编码（与 _parse_location_code 规则一致）
+        parts = typed["location_code"].str.extract(self.LOCATION_CODE_PATTERN)
+        parts.columns = ["zone_code", "aisle_code", "shelf_code", "location_zone_code", "seq_number"]
+        parsed = parts["seq_number"].notna()
+        seq_number = pd.to_numeric(parts["seq_number"], errors="coerce").fillna(1).astype("int64")
+        # 根据顺序号推算行列（假设默认5列）
+        default_columns = 5
+        row_idx = (seq_number - 1) // default_columns
+        col_idx = (seq_number - 1) % default_columns
+        row_labels = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+        row_label = np.where(row_idx < len(row_labels), row_labels[row_idx % len(row_labels)], "A")
+        
+        typed["zone_code"] = parts["zone_code"].where(parsed, None)
+        typed["aisle_code"] = parts["aisle_code"].where(parsed, None)
+        typed["shelf_code"] = parts["shelf_code"].where(parsed, None)
+        typed["location_short_code"] = (parts["location_zone_code"] + parts["seq_number"]).where(parsed, None)
+        typed["row_label"] = pd.Series(row_label, index=df.index).where(parsed, None)
+        typed["column_number"] = (col_idx + 1).where(parsed, 0)
+        
+        return typed, errors
+    
+    def _normalize_dates(self, values: Optional[pd.Series], index: pd.Index) -> Tuple[pd.Series, pd.Series, pd.Series]:
+        """
+        向量化解析日期列
+        
+        返回 (日期, 解析错误, 不可用日期错误)；
+        空的时间值（NaT）能通过 _parse_date，但无法写入，单独返回
+        """
+        errors = pd.Series(None, index=index, dtype=object)
+        unusable = pd.Series(None, index=index, dtype=object)
+        if values is None:
+            return pd.Series(self._parse_date(None), index=index), errors, unusable
+        
+        if pd.api.types.is_datetime64_any_dtype(values):
+            dates = values.copy()
+        else:
+            dates = pd.Series(pd.NaT, index=index, dtype="datetime64[ns]")
+            is_str = values.map(lambda v: isinstance(v, str)).astype(bool)
+            is_datetime = values.map(lambda v: isinstance(v, datetime) and not pd.isna(v)).astype(bool)
+            
+            if is_datetime.any():
+                dates[is_datetime] = pd.to_datetime(values[is_datetime], errors="coerce")
+            
+            strings = values[is_str].astype(str).str.strip()
+            for fmt in self.DATE_FORMATS:
+                pending = dates[is_str].isna()
+                if not pending.any():
+                    break
+                pending_index = pending[pending].index
+                dates[pending_index] = pd.to_datetime(strings[pending_index], format=fmt, errors="coerce")
+        
+        # 其余单元格（单数字月日带时间、空值等）逐个回退到 _parse_date
+        fallback = dates.isna()
+        if fallback.any():
+            dates = dates.astype(object)
+            for idx in fallback[fallback].index:
+                try:
+                    date = self._parse_date(values[idx])
+                except Exception as e:
+                    dates[idx] = None
+                    errors[idx] = str(e)
+                    continue
+                try:
+                    date.strftime("%Y-%m-%d")
+                    dates[idx] = date
+                except Exception as e:
+                    dates[idx] = None
+                    unusable[idx] = str(e)
+        
+        return dates, errors, unusable
+    
+    def _normalize_numbers(self, values: Optional[pd.Series], kind: type, index: pd.Index) -> Tuple[pd.Series, pd.Series]:
+        """向量化转换数值列（空值填充为 0），返回 (数值, 错误信息)"""
+        errors = pd.Series(None, index=index, dtype=object)
+        if values is None:
+            return pd.Series(0, index=index, dtype="int64" if kind is int else "float64"), errors
+        
+        numbers = pd.to_numeric(values, errors="coerce")
+        invalid = numbers.isna() & values.notna()
+        if kind is int:
+            invalid |= np.isinf(numbers.astype("float64"))
+            if not pd.api.types.is_numeric_dtype(values):
+                # int() 不接受带小数点的字符串
+                is_str = values.map(lambda v: isinstance(v, str)).astype(bool)
+                invalid |= is_str & ~values.astype(str).str.strip().str.fullmatch(r"[+-]?\d+").fillna(False).astype(bool)
+        
+        # 无法转换的单元格按逐行方式转换以得到相同的错误信息
+        for idx in invalid[invalid].index:
+            try:
+                kind(values[idx] or 0)
+            except Exception as e:
+                errors[idx] = str(e)
+        
+        numbers = numbers.astype("float64").where(~invalid, 0).fillna(0)
+        if kind is int:
+            return np.trunc(numbers).astype("int64"), errors
+        return numbers, errors
+    
     def _validate_columns(self, df: pd.DataFrame) -> Tuple[bool, Dict[str, str], List[str]]:
         """
         验证 DataFrame 的列
@@ -432,9 +644,14 @@ class ImportService:
         
         return len(errors) == 0, column_mapping, errors
     
-    async def import_from_excel(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    async def import_from_excel(
+        self,
+        file_content: bytes,
+        filename: str,
+        mode: ImportModeEnum = ImportModeEnum.REPLACE
+    ) -> Dict[str, Any]:
         """
-        从 Excel 文件导入数据
+        从 Excel 文件内容导入数据
         
         返回:
         {
@@ -445,54 +662,199 @@ class ImportService:
             "errors": [错误列表]
         }
         """
+        return await self.import_excel_file(BytesIO(file_content), filename, mode)
+    
+    async def import_from_csv(
+        self,
+        file_content: bytes,
+        filename: str,
+        mode: ImportModeEnum = ImportModeEnum.REPLACE
+    ) -> Dict[str, Any]:
+        """
+        从 CSV 文件内容导入数据
+        """
+        return await self.import_csv_file(BytesIO(file_content), filename, mode)
+    
+    async def import_excel_file(
+        self,
+        source: BinaryIO,
+        filename: str,
+        mode: ImportModeEnum = ImportModeEnum.REPLACE,
+        progress: Optional[ImportProgress] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        从 Excel 文件流式导入数据
+        
+        source: 可 seek 的二进制文件对象（如上传落盘后的临时文件）。
+        .xlsx 使用 openpyxl 只读模式逐行读取，按 IMPORT_CHUNK_SIZE 行分块处理；
+        .xls 无法流式读取，整体读入后作为一块处理。
+        mode: 导入模式，见 _import_chunks
+        progress / on_progress: 可选的进度对象和每块处理完成后的回调（异步导入任务使用）
+        """
+        progress = progress or ImportProgress()
         try:
-            # 读取 Excel
-            df = pd.read_excel(BytesIO(file_content))
-            return await self._process_dataframe(df, filename, "excel")
+            chunks = self._read_excel_chunks(source, filename, settings.IMPORT_CHUNK_SIZE, progress)
+            return await self._import_chunks(chunks, filename, "excel", mode, progress, on_progress)
         except Exception as e:
             # 保存失败的导入记录
             await self._save_import_record(filename, "excel", 0, 0, 0, "failed", [f"读取 Excel 文件失败: {str(e)}"])
             return {
                 "success": False,
+                "status": "failed",
                 "total_rows": 0,
                 "imported_rows": 0,
                 "failed_rows": 0,
                 "errors": [f"读取 Excel 文件失败: {str(e)}"]
             }
     
-    async def import_from_csv(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    async def import_csv_file(
+        self,
+        source: BinaryIO,
+        filename: str,
+        mode: ImportModeEnum = ImportModeEnum.REPLACE,
+        progress: Optional[ImportProgress] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
-        从 CSV 文件导入数据
+        从 CSV 文件流式导入数据
+        
+        source: 可 seek 的二进制文件对象。只根据文件开头一段内容判断编码，
+        然后用 read_csv(chunksize=...) 分块读取
+        mode / progress / on_progress: 同 import_excel_file
         """
+        progress = progress or ImportProgress()
         try:
-            # 尝试不同编码
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']:
-                try:
-                    df = pd.read_csv(BytesIO(file_content), encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            else:
+            encoding = self._sniff_csv_encoding(source)
+            if encoding is None:
                 await self._save_import_record(filename, "csv", 0, 0, 0, "failed", ["无法解析 CSV 文件编码，请使用 UTF-8 或 GBK 编码"])
                 return {
                     "success": False,
+                    "status": "failed",
                     "total_rows": 0,
                     "imported_rows": 0,
                     "failed_rows": 0,
                     "errors": ["无法解析 CSV 文件编码，请使用 UTF-8 或 GBK 编码"]
                 }
             
-            return await self._process_dataframe(df, filename, "csv")
+            chunks = self._read_csv_chunks(source, encoding, settings.IMPORT_CHUNK_SIZE, progress)
+            return await self._import_chunks(chunks, filename, "csv", mode, progress, on_progress)
         except Exception as e:
             await self._save_import_record(filename, "csv", 0, 0, 0, "failed", [f"读取 CSV 文件失败: {str(e)}"])
             return {
                 "success": False,
+                "status": "failed",
                 "total_rows": 0,
                 "imported_rows": 0,
                 "failed_rows": 0,
                 "errors": [f"读取 CSV 文件失败: {str(e)}"]
             }
     
+    def _sniff_csv_encoding(self, source: BinaryIO) -> Optional[str]:
+        """根据文件开头的内容判断 CSV 编码，无法识别时返回 None"""
+        prefix = source.read(self.ENCODING_SNIFF_BYTES)
+        source.seek(0)
+        # 开头不足一段时即为整个文件，否则末尾可能截断多字节字符
+        final = len(prefix) < self.ENCODING_SNIFF_BYTES
+        
+        for encoding in self.CSV_ENCODINGS:
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(prefix, final=final)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return None
+    
+    def _read_csv_chunks(
+        self,
+        source: BinaryIO,
+        encoding: str,
+        chunk_size: int,
+        progress: ImportProgress
+    ) -> Iterator[pd.DataFrame]:
+        """
+        分块读取 CSV 文件
+        
+        每读出一块，按已读字节占文件大小的比例更新预估总行数
+        """
+        file_size = source.seek(0, 2)
+        source.seek(0)
+        
+        rows_read = 0
+        for chunk in pd.read_csv(source, encoding=encoding, chunksize=chunk_size):
+            rows_read += len(chunk)
+            position = source.tell()
+            if position:
+                progress.estimated_total_rows = max(rows_read, int(rows_read * file_size / position))
+            yield chunk
+    
+    def _read_excel_chunks(
+        self,
+        source: BinaryIO,
+        filename: str,
+        chunk_size: int,
+        progress: Optional[ImportProgress] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        分块读取 Excel 文件
+        
+        第一行为表头，单元格取值规则与 pd.read_excel 一致：
+        空单元格为 NaN，整数值的浮点数转为 int，末尾的空行忽略。
+        索引在各块之间连续，用于计算行号。
+        工作表记录了尺寸时，用其行数作为预估总行数
+        """
+        if filename.lower().endswith(".xls"):
+            yield pd.read_excel(source)
+            return
+        
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.worksheets[0]
+            if progress is not None and worksheet.max_row:
+                progress.estimated_total_rows = max(worksheet.max_row - 1, 0)
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [
+                f"Unnamed: {i}" if name is None else (str(name) if not isinstance(name, str) else name)
+                for i, name in enumerate(header)
+            ]
+            
+            def convert(value):
+                if isinstance(value, float) and value.is_integer():
+                    return int(value)
+                if value == "":
+                    return None
+                return value
+            
+            def make_chunk(records: List[tuple], start: int) -> pd.DataFrame:
+                chunk = pd.DataFrame.from_records(records, columns=columns)
+                chunk.index = pd.RangeIndex(start, start + len(records))
+                return chunk.where(chunk.notna(), np.nan)
+            
+            buffer: List[tuple] = []
+            pending_blank: List[tuple] = []
+            start = 0
+            width = len(columns)
+            for row in rows:
+                record = tuple(convert(value) for value in row[:width]) + (None,) * (width - len(row))
+                if all(value is None for value in record):
+                    # 空行只有在后面还有数据时才保留
+                    pending_blank.append(record)
+                    continue
+                buffer.extend(pending_blank)
+                pending_blank = []
+                buffer.append(record)
+                if len(buffer) >= chunk_size:
+                    yield make_chunk(buffer, start)
+                    start += len(buffer)
+                    buffer = []
+            if buffer or start == 0:
+                yield make_chunk(buffer, start)
+        finally:
+            workbook.close()
+    
     async def _save_import_record(
         self, 
         filename: str, 
@@ -542,17 +904,49 @@ class ImportService:
             for r in records
         ]
     
-    async def _process_dataframe(self, df: pd.DataFrame, filename: str = "", file_type: str = "excel") -> Dict[str, Any]:
-        """处理 DataFrame 并导入数据"""
-        total_rows = len(df)
+    async def _import_chunks(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        filename: str = "",
+        file_type: str = "excel",
+        mode: ImportModeEnum = ImportModeEnum.REPLACE,
+        progress: Optional[ImportProgress] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        分块导入数据
+        
+        读取和规范化各块在线程中执行，事件循环上只做数据库读写，导入期间其他请求不受影响。
+        第一块用于验证列，然后逐块处理，
+        跨块的统计、错误和日期范围累计在 ImportProgress 中，峰值内存只与块大小有关。
+        读取第一块时的异常交由调用方处理；之后的读取或写入失败会中止导入。
+        merge 和 replace_range 模式逐块提交，中止时已提交的块保留，
+        导入记录标记为 partial（没有成功行时为 failed）；
+        replace 模式的清空和全部块在同一个事务中，最后一次性提交，
+        中止时整体回滚，原有热度数据保持不变，导入记录标记为 failed。
+        每块处理完成后调用 on_progress(progress)
+        
+        导入模式:
+        - replace: 开始前清空全部热度数据（默认）
+        - merge: 不删除数据，只覆盖文件中出现的 (库位, 日期)
+        - replace_range: 只清空文件中出现的日期（所有库位）的数据，再写入文件内容
+        merge 和 replace_range 的开销只与文件大小有关，与历史数据量无关
+        """
+        first_chunk = await self._next_chunk(chunks)
+        if first_chunk is None:
+            first_chunk = pd.DataFrame()
         
         # 验证列
-        is_valid, column_mapping, validation_errors = self._validate_columns(df)
+        is_valid, column_mapping, validation_errors = self._validate_columns(first_chunk)
         if not is_valid:
+            total_rows = len(first_chunk) + await asyncio.to_thread(
+                lambda: sum(len(chunk) for chunk in chunks)
+            )
             await self._save_import_record(filename, file_type, total_rows, 0, total_rows, "failed", validation_errors)
             await self.db.commit()
             return {
                 "success": False,
+                "status": "failed",
                 "total_rows": total_rows,
                 "imported_rows": 0,
                 "failed_rows": total_rows,
@@ -566,143 +960,233 @@ class ImportService:
         self._shelf_cache = {}
         self._location_cache = {}
         
-        # 清空旧的热力数据（每次导入前自动清除）
-        from app.models.warehouse import LocationHeatData
-        await self.db.execute(
-            LocationHeatData.__table__.delete()
-        )
-        
-        # 准备数据并导入
-        row_errors = []
-        imported_count = 0
-        skipped_count = 0  # 跳过的行数（库位不存在）
-        skipped_locations = set()  # 记录跳过的库位编码（用于去重统计）
-        imported_dates = set()  # 记录导入数据的日期
+        # 替换模式：清空旧的热力数据
+        if mode == ImportModeEnum.REPLACE:
+            from app.models.warehouse import LocationHeatData
+            await self.db.execute(
+                LocationHeatData.__table__.delete()
+            )
+            await self.heatmap_service.rollup_service.clear()
+            DataVersion.mark_all(self.db)
         
-        for idx, row in df.iterrows():
+        # 替换模式整体作为一个事务，其他模式逐块提交
+        atomic = mode == ImportModeEnum.REPLACE
+        progress = progress or ImportProgress()
+        abort_error = None
+        chunk = first_chunk
+        while chunk is not None:
+            progress.total_rows += len(chunk)
             try:
-                # 解析日期
-                date_value = row[column_mapping["date"]]
-                date = self._parse_date(date_value)
-                
-                location_code = str(row[column_mapping["location_code"]]).strip()
-                
-                # 获取可选字段的值
-                def get_optional_value(field: str, default=0):
-                    col_name = column_mapping.get(field, "")
-                    if col_name and col_name in row.index:
-                        val = row[col_name]
-                        if pd.notna(val):
-                            return val
-                    return default
-                
-                # 获取显示标识（可选）
-                display_label_value = get_optional_value("display_label", None)
-                display_label = str(display_label_value).strip() if display_label_value and pd.notna(display_label_value) else None
-                
-                # 优先直接通过完整编码查找库位（避免解析可能导致的格式不匹配）
-                location = await self._get_location_by_full_code(location_code)
-                
-                if not location:
-                    # 如果直接查找失败，尝试解析并创建
-                    parsed = self._parse_location_code(location_code)
-                    if parsed:
-                        location = await self._get_or_create_location(parsed, display_label)
-                
-                if not location:
-                    # 库位不存在时跳过该行，不计入错误
-                    skipped_count += 1
-                    skipped_locations.add(location_code)
-                    continue
-                
-                # 如果提供了显示标识，更新对应货架的 display_label
-                if display_label and location.shelf_id:
-                    await self._update_shelf_display_label(location.shelf_id, display_label)
-                
-                # 获取可选字段的值（重新定义以便后续使用）
-                def get_optional_value(field: str, default=0):
-                    col_name = column_mapping.get(field, "")
-                    if col_name and col_name in row.index:
-                        val = row[col_name]
-                        if pd.notna(val):
-                            return val
-                    return default
-                
-                pick_frequency = int(get_optional_value("pick_frequency", 0) or 0)
-                turnover_rate = float(get_optional_value("turnover_rate", 0) or 0)
-                inventory_qty = int(get_optional_value("inventory_qty", 0) or 0)
-                inbound_qty = int(get_optional_value("inbound_qty", 0) or 0)
-                outbound_qty = int(get_optional_value("outbound_qty", 0) or 0)
-                
-                # 更新热度数据
-                await self.heatmap_service.update_heat_data(
-                    location_id=location.id,
-                    date=date,
-                    pick_frequency=pick_frequency,
-                    turnover_rate=turnover_rate,
-                    inventory_qty=inventory_qty,
-                    inbound_qty=inbound_qty,
-                    outbound_qty=outbound_qty
-                )
-                imported_count += 1
-                imported_dates.add(date.strftime("%Y-%m-%d"))
-                
+                await self._import_chunk(chunk, column_mapping, progress, mode)
+                if not atomic:
+                    await self.db.commit()
             except Exception as e:
-                row_errors.append(f"第 {idx + 2} 行处理失败: {str(e)}")
-        
-        # 确定状态（跳过的行不计入失败）
-        actual_failed = len(row_errors)
-        if imported_count == 0 and actual_failed > 0:
-            status = "failed"
-        elif actual_failed > 0:
-            status = "partial"
-        else:
-            status = "success"
+                await self.db.rollback()
+                abort_error = f"批量写入热度数据失败: {str(e)}"
+                break
+            
+            if on_progress:
+                await on_progress(progress)
+            
+            try:
+                chunk = await self._next_chunk(chunks)
+            except Exception as e:
+                label = "CSV" if file_type == "csv" else "Excel"
+                abort_error = f"读取 {label} 文件失败: {str(e)}"
+                break
+        
+        if atomic and abort_error:
+            # 撤销清空和已处理的块，保留原有热度数据
+            await self.db.rollback()
+            progress.imported_rows = 0
+            abort_error += "；替换导入已全部撤销，原有热度数据保持不变"
+        
+        # 按行号排列错误信息
+        row_errors = [message for _, message in sorted(progress.row_errors, key=lambda item: item[0])]
         
         # 生成跳过库位的提示信息
         skip_info = None
-        if skipped_count > 0:
-            skip_info = f"跳过 {skipped_count} 行（{len(skipped_locations)} 个库位不存在）"
+        if progress.skipped_rows > 0:
+            skip_info = f"跳过 {progress.skipped_rows} 行（{len(progress.skipped_locations)} 个库位不存在）"
         
-        # 保存导入记录
-        save_errors = row_errors.copy() if row_errors else []
+        # 构建错误/提示信息
+        messages = []
         if skip_info:
-            save_errors.insert(0, skip_info)
+            messages.append(skip_info)
+        messages.extend(row_errors)
+        
+        imported_count = progress.imported_rows
+        if abort_error:
+            # 未提交的块全部计为失败
+            messages.append(abort_error)
+            actual_failed = progress.total_rows - imported_count - progress.skipped_rows
+            status = "partial" if imported_count > 0 else "failed"
+        else:
+            # 确定状态（跳过的行不计入失败）
+            actual_failed = len(row_errors)
+            if imported_count == 0 and actual_failed > 0:
+                status = "failed"
+            elif actual_failed > 0:
+                status = "partial"
+            else:
+                status = "success"
         
+        # 保存导入记录
         await self._save_import_record(
-            filename, file_type, total_rows, imported_count, 
-            actual_failed, status, save_errors if save_errors else None
+            filename, file_type, progress.total_rows, imported_count,
+            actual_failed, status, messages if messages else None
         )
-        
-        # 提交所有更改
         await self.db.commit()
         
         # 计算导入数据的日期范围
         date_range = None
-        if imported_dates:
-            sorted_dates = sorted(imported_dates)
+        if progress.start_date:
             date_range = {
-                "start_date": sorted_dates[0],
-                "end_date": sorted_dates[-1]
+                "start_date": progress.start_date,
+                "end_date": progress.end_date
             }
         
-        # 构建返回的错误/提示信息
-        return_messages = []
-        if skip_info:
-            return_messages.append(skip_info)
-        if row_errors:
-            return_messages.extend(row_errors)
-        
         return {
-            "success": imported_count > 0,
-            "total_rows": total_rows,
+            "success": imported_count > 0 and not abort_error,
+            "status": status,
+            "total_rows": progress.total_rows,
             "imported_rows": imported_count,
-            "skipped_rows": skipped_count,
+            "skipped_rows": progress.skipped_rows,
             "failed_rows": actual_failed,
-            "errors": return_messages if return_messages else None,
+            "errors": messages if messages else None,
             "date_range": date_range
         }
     
+    @staticmethod
+    async def _next_chunk(chunks: Iterator[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """在线程中读取下一块（CSV 解析、openpyxl 逐行读取不阻塞事件循环），读完时返回 None"""
+        return await asyncio.to_thread(next, chunks, None)
+    
+    async def _import_chunk(
+        self,
+        df: pd.DataFrame,
+        column_mapping: Dict[str, str],
+        progress: "ImportProgress",
+        mode: ImportModeEnum = ImportModeEnum.REPLACE
+    ) -> None:
+        """
+        处理一块数据并写入（不提交）
+        
+        处理流程:
+        1. 按列向量化规范化日期、库位编码、显示标识和数值字段（不访问数据库）
+        2. 一次性批量查找本块的库位编码，不存在的尝试解析并创建
+        3. 汇总跳过/失败的行，批量更新货架显示标识
+        4. replace_range 模式下先清空本块中首次出现的日期，再以多行 upsert 分批写入热度数据及其汇总
+        
+        写入成功后才把本块的统计累计到 progress，写入失败时异常向上抛出
+        """
+        row_errors = []
+        
+        # 第一步：按列规范化日期、库位编码、显示标识和数值字段（不访问数据库，在线程中执行）
+        typed, errors = await asyncio.to_thread(self._normalize_dataframe, df, column_mapping)
+        
+        def add_errors(rows: pd.Index, messages: pd.Series) -> None:
+            for row_number, message in zip(typed.loc[rows, "row_number"], messages[rows]):
+                row_errors.append((int(row_number), f"第 {row_number} 行处理失败: {message}"))
+        
+        date_failed = errors["date_error"].notna()
+        add_errors(typed.index[date_failed], errors["date_error"])
+        candidates = typed[~date_failed]
+        
+        # 第二步：批量查找库位，不存在的尝试解析并创建
+        unique_codes = candidates["location_code"].unique().tolist()
+        locations = await self._resolve_location_codes(unique_codes)
+        
+        failed_codes: Dict[str, str] = {}
+        unresolved = candidates[
+            ~candidates["location_code"].isin(list(locations.keys())) & candidates["zone_code"].notna()
+        ].drop_duplicates("location_code")
+        for row in unresolved.itertuples():
+            parsed = {
+                "zone_code": row.zone_code,
+                "aisle_code": row.aisle_code,
+                "shelf_code": row.shelf_code,
+                "location_code": row.location_short_code,
+                "row_label": row.row_label,
+                "column_number": int(row.column_number)
+            }
+            try:
+                location = await self._get_or_create_location(parsed, row.display_label)
+            except Exception as e:
+                failed_codes[row.location_code] = str(e)
+                continue
+            if location:
+                locations[row.location_code] = location
+        
+        # 第三步：汇总显示标识与热度记录
+        code_failed = candidates["location_code"].isin(list(failed_codes.keys()))
+        add_errors(candidates.index[code_failed], candidates["location_code"].map(failed_codes))
+        
+        location_ids = candidates["location_code"].map({code: loc.id for code, loc in locations.items()})
+        resolved = location_ids.notna() & ~code_failed
+        
+        # 库位不存在时跳过该行，不计入错误
+        skipped = candidates[~resolved & ~code_failed]
+        
+        resolved_rows = candidates[resolved]
+        shelf_ids = resolved_rows["location_code"].map({code: loc.shelf_id for code, loc in locations.items()})
+        
+        # 如果提供了显示标识，更新对应货架的 display_label（以最后一次出现为准）
+        labelled = resolved_rows["display_label"].notna() & (resolved_rows["display_label"] != "") & shelf_ids.notna()
+        shelf_labels: Dict[int, str] = dict(zip(
+            shelf_ids[labelled].astype("int64").tolist(),
+            resolved_rows.loc[labelled, "display_label"].tolist()
+        ))
+        
+        value_failed = errors.loc[resolved_rows.index, "value_error"].notna()
+        add_errors(resolved_rows.index[value_failed], errors["value_error"])
+        
+        valid = resolved_rows[~value_failed]
+        valid_dates = pd.to_datetime(valid["date"]) if len(valid) else valid["date"]
+        heat_records = [
+            {
+                "location_id": int(location_id),
+                "date": date.to_pydatetime() if isinstance(date, pd.Timestamp) else date,
+                "pick_frequency": int(pick_frequency),
+                "turnover_rate": float(turnover_rate),
+                "inventory_qty": int(inventory_qty),
+                "inbound_qty": int(inbound_qty),
+                "outbound_qty": int(outbound_qty),
+            }
+            for location_id, date, pick_frequency, turnover_rate, inventory_qty, inbound_qty, outbound_qty in zip(
+                location_ids[valid.index].tolist(),
+                list(valid_dates),
+                valid["pick_frequency"].tolist(),
+                valid["turnover_rate"].tolist(),
+                valid["inventory_qty"].tolist(),
+                valid["inbound_qty"].tolist(),
+                valid["outbound_qty"].tolist(),
+            )
+        ]
+        
+        # 第四步：批量写入
+        new_days = set()
+        if mode == ImportModeEnum.REPLACE_RANGE:
+            # 文件中出现的日期（日期可解析的行，不论库位是否存在）
+            chunk_days = pd.to_datetime(candidates["date"]).dropna().dt.date
+            new_days = set(chunk_days.unique()) - progress.cleared_days
+            await self.heatmap_service.delete_heat_data_days(new_days)
+        
+        await self._update_shelf_display_labels(shelf_labels)
+        await self.heatmap_service.bulk_upsert_heat_data(heat_records)
+        
+        progress.cleared_days.update(new_days)
+        
+        progress.imported_rows += len(heat_records)
+        progress.skipped_rows += len(skipped)
+        progress.skipped_locations.update(skipped["location_code"])
+        progress.row_errors.extend(row_errors)
+        if len(valid):
+            progress.add_dates(
+                valid_dates.min().strftime("%Y-%m-%d"),
+                valid_dates.max().strftime("%Y-%m-%d")
+            )
+    
     async def get_import_template_with_locations(self) -> pd.DataFrame:
         """
         获取导入模板（使用数据库中实际的库位编码）
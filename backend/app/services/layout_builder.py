@@ -0,0 +1,382 @@
+"""仓库布局批量生成"""
+from typing import Any, Dict, List, Sequence, Set, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine.default import InsertmanyvaluesSentinelOpts
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.warehouse import (
+    Warehouse, Zone, Aisle, Shelf, Location, LocationHeatData, LocationHeatRollup, ZoneHeatNorm, ShelfType
+)
+from app.utils.bulk import chunked
+
+# 库位行标签（第 1 行为 A）
+ROW_LABELS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def shelf_code_prefix(warehouse_code: str, zone_code: str, aisle_code: str, shelf_code: str) -> str:
+    """货架下库位完整编码的前缀（加入仓库编码确保全局唯一）"""
+    return f"{warehouse_code}-{zone_code}-{aisle_code}-{shelf_code}"
+
+
+def build_location_rows(
+    shelf_id: int,
+    rows: int,
+    columns: int,
+    zone_code: str,
+    code_prefix: str
+) -> List[dict]:
+    """
+    生成货架下全部库位的插入数据
+
+    库位编码格式: 库区代码 + 顺序号（如 C1, C2, B1, B2），顺序号 = 行索引 * 列数 + 列索引 + 1；
+    完整编码为 code_prefix + "-" + 库位编码
+    """
+    locations = []
+    for row_idx in range(rows):
+        row_label = ROW_LABELS[row_idx]
+        for col_idx in range(columns):
+            code = f"{zone_code}{row_idx * columns + col_idx + 1}"
+            locations.append({
+                "shelf_id": shelf_id,
+                "code": code,
+                "full_code": f"{code_prefix}-{code}",
+                "row_label": row_label,
+                "column_number": col_idx + 1,
+                "row_index": row_idx,
+                "column_index": col_idx,
+            })
+    return locations
+
+
+class LayoutBuilder:
+    """
+    仓库布局批量生成器
+
+    先在内存中生成全部 库区 / 巷道 / 货架 / 库位 的数据，每一层用多行 INSERT 写入：
+    能以多行 INSERT ... RETURNING 按参数顺序取回新 ID 的数据库（PostgreSQL）直接取回；
+    其他数据库（SQLite 按参数顺序返回时会退化为逐行插入，MySQL 不支持 RETURNING）
+    插入后按 (上级ID, sort_order) 查回 ID（同一上级下的 sort_order 由生成器按顺序分配，互不相同）。
+    库位不需要取回 ID，分批插入；完整编码由内存中的上级编码拼接，不再逐个货架查询上级。
+    使用 Core INSERT，新建的对象不会加入会话。
+
+    reconcile 按编码对比提交的布局和已存储的布局，只批量插入新增的、更新变化的、停用移除的对象，
+    保留的库位 ID 不变，热度历史数据随之保留
+    """
+
+    LEVELS = ("zones", "aisles", "shelves", "locations")
+
+    # 每批插入的库位数
+    LOCATION_BATCH_SIZE = 5000
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def build(self, warehouse: Warehouse, zones_config: List[dict]) -> Dict[str, int]:
+        """在仓库下生成布局（zones_config 格式见 WarehouseService.setup_warehouse_layout），返回各层数量"""
+        zone_rows = [
+            {
+                "warehouse_id": warehouse.id,
+                "code": zone_config["code"],
+                "name": zone_config["name"],
+                "sort_order": zone_idx,
+            }
+            for zone_idx, zone_config in enumerate(zones_config)
+        ]
+        zone_ids = await self.insert_level(Zone, Zone.warehouse_id, zone_rows)
+
+        aisle_rows = []
+        aisle_parents = []
+        for zone_config, zone_id in zip(zones_config, zone_ids):
+            for aisle_idx, aisle_config in enumerate(zone_config.get("aisles", [])):
+                aisle_rows.append({
+                    "zone_id": zone_id,
+                    "code": aisle_config["code"],
+                    "name": aisle_config["name"],
+                    "y_coordinate": aisle_config.get("y_coordinate", aisle_idx),
+                    "sort_order": aisle_idx,
+                })
+                aisle_parents.append((zone_config, aisle_config))
+        aisle_ids = await self.insert_level(Aisle, Aisle.zone_id, aisle_rows)
+
+        shelf_rows = []
+        shelf_prefixes = []
+        for (zone_config, aisle_config), aisle_id in zip(aisle_parents, aisle_ids):
+            for shelf_idx, shelf_config in enumerate(aisle_config.get("shelves", [])):
+                shelf_rows.append({
+                    "aisle_id": aisle_id,
+                    "code": shelf_config["code"],
+                    "name": shelf_config["name"],
+                    "shelf_type": ShelfType(shelf_config.get("shelf_type", "normal")),
+                    "rows": shelf_config.get("rows", 4),
+                    "columns": shelf_config.get("columns", 5),
+                    "layers": shelf_config.get("layers", 1),
+                    "x_coordinate": shelf_config.get("x_coordinate", shelf_idx),
+                    "sort_order": shelf_idx,
+                })
+                shelf_prefixes.append((
+                    zone_config["code"],
+                    shelf_code_prefix(warehouse.code, zone_config["code"], aisle_config["code"], shelf_config["code"])
+                ))
+        shelf_ids = await self.insert_level(Shelf, Shelf.aisle_id, shelf_rows)
+
+        location_rows = []
+        for shelf_row, (zone_code, code_prefix), shelf_id in zip(shelf_rows, shelf_prefixes, shelf_ids):
+            location_rows.extend(build_location_rows(
+                shelf_id, shelf_row["rows"], shelf_row["columns"], zone_code, code_prefix
+            ))
+        await self.insert_locations(location_rows)
+
+        return {
+            "zones": len(zone_ids),
+            "aisles": len(aisle_ids),
+            "shelves": len(shelf_ids),
+            "locations": len(location_rows),
+        }
+
+    async def clear(self, warehouse_id: int) -> None:
+        """
+        删除仓库下的全部布局（含库位的热度数据、汇总和库区归一化基准）
+
+        自下而上按层各执行一条 DELETE（以上级 ID 子查询筛选），不把对象逐个加载到会话；
+        不依赖数据库的外键级联（SQLite 默认不启用外键约束）
+        """
+        zone_ids = select(Zone.id).where(Zone.warehouse_id == warehouse_id)
+        aisle_ids = select(Aisle.id).where(Aisle.zone_id.in_(zone_ids))
+        shelf_ids = select(Shelf.id).where(Shelf.aisle_id.in_(aisle_ids))
+        location_ids = select(Location.id).where(Location.shelf_id.in_(shelf_ids))
+
+        for statement in (
+            delete(LocationHeatData).where(LocationHeatData.location_id.in_(location_ids)),
+            delete(LocationHeatRollup).where(LocationHeatRollup.location_id.in_(location_ids)),
+            delete(Location).where(Location.shelf_id.in_(shelf_ids)),
+            delete(Shelf).where(Shelf.aisle_id.in_(aisle_ids)),
+            delete(Aisle).where(Aisle.zone_id.in_(zone_ids)),
+            delete(ZoneHeatNorm).where(ZoneHeatNorm.zone_id.in_(zone_ids)),
+            delete(Zone).where(Zone.warehouse_id == warehouse_id),
+        ):
+            await self.db.execute(statement.execution_options(synchronize_session=False))
+
+    async def insert_level(
+        self,
+        model,
+        parent_column,
+        rows: Sequence[dict],
+        key_field: str = "sort_order"
+    ) -> List[int]:
+        """
+        插入一层布局对象，按 rows 的顺序返回新 ID
+
+        不能按参数顺序取回 ID 时，按 (上级ID, key_field) 查回，key_field 在同一上级下须唯一
+        """
+        if not rows:
+            return []
+
+        dialect = self.db.get_bind().dialect
+        if (
+            dialect.insert_executemany_returning_sort_by_parameter_order
+            and dialect.insertmanyvalues_implicit_sentinel != InsertmanyvaluesSentinelOpts.NOT_SUPPORTED
+        ):
+            result = await self.db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                list(rows)
+            )
+            return list(result.scalars().all())
+
+        await self.db.execute(insert(model), list(rows))
+        parent_ids = {row[parent_column.key] for row in rows}
+        ids = {}
+        for batch in chunked(sorted(parent_ids), self.LOCATION_BATCH_SIZE):
+            result = await self.db.execute(
+                select(model.id, parent_column, getattr(model, key_field)).where(parent_column.in_(batch))
+            )
+            for new_id, parent_id, key in result.all():
+                ids[(parent_id, key)] = new_id
+        return [ids[(row[parent_column.key], row[key_field])] for row in rows]
+
+    async def insert_locations(self, rows: Sequence[dict]) -> None:
+        """分批插入库位"""
+        for batch in chunked(rows, self.LOCATION_BATCH_SIZE):
+            await self.db.execute(insert(Location), batch)
+
+    # ==================== 按编码对比更新 ====================
+
+    async def reconcile(self, warehouse: Warehouse, zones_config: List[dict]) -> Dict[str, Any]:
+        """
+        按编码对比更新仓库布局
+
+        库区按编码、巷道 / 货架 / 库位按 (上级, 编码) 与已存储的对象对应（包括已停用的）：
+        - 提交中新增的对象批量插入
+        - 已存在的对象属性变化或已停用时批量更新（并重新启用），ID 不变
+        - 提交中不存在的对象停用（is_active=False），不删除，热度数据保留
+        返回 {层级: {"inserted", "updated", "deactivated"}} 和发生变化的库区 ID（zone_ids）
+        """
+        changes = {level: {"inserted": 0, "updated": 0, "deactivated": 0} for level in self.LEVELS}
+        touched_zones: Set[int] = set()
+
+        # ---------- 库区 ----------
+        stored = await self._stored_rows(
+            select(Zone.id, Zone.warehouse_id, Zone.code, Zone.name, Zone.sort_order, Zone.is_active)
+            .where(Zone.warehouse_id == warehouse.id)
+        )
+        desired = [
+            (zone_config["code"], {
+                "warehouse_id": warehouse.id,
+                "code": zone_config["code"],
+                "name": zone_config["name"],
+                "sort_order": zone_idx,
+            })
+            for zone_idx, zone_config in enumerate(zones_config)
+        ]
+        zone_ids, changed = await self._sync_level(Zone, Zone.warehouse_id, stored, desired, changes["zones"])
+        touched_zones.update(changed)
+
+        # ---------- 巷道 ----------
+        stored = await self._stored_rows(
+            select(Aisle.id, Aisle.zone_id, Aisle.code, Aisle.name, Aisle.y_coordinate, Aisle.sort_order, Aisle.is_active)
+            .join(Zone, Aisle.zone_id == Zone.id)
+            .where(Zone.warehouse_id == warehouse.id),
+            parent_field="zone_id"
+        )
+        desired = []
+        aisle_parents = []
+        for zone_config, zone_id in zip(zones_config, zone_ids):
+            for aisle_idx, aisle_config in enumerate(zone_config.get("aisles", [])):
+                desired.append(((zone_id, aisle_config["code"]), {
+                    "zone_id": zone_id,
+                    "code": aisle_config["code"],
+                    "name": aisle_config["name"],
+                    "y_coordinate": aisle_config.get("y_coordinate", aisle_idx),
+                    "sort_order": aisle_idx,
+                }))
+                aisle_parents.append((zone_config, aisle_config, zone_id))
+        aisle_ids, changed = await self._sync_level(Aisle, Aisle.zone_id, stored, desired, changes["aisles"])
+        aisle_zones = {row["id"]: row["zone_id"] for row in stored.values()}
+        aisle_zones.update((aisle_id, zone_id) for aisle_id, (_, _, zone_id) in zip(aisle_ids, aisle_parents))
+        touched_zones.update(aisle_zones[aisle_id] for aisle_id in changed)
+
+        # ---------- 货架 ----------
+        stored = await self._stored_rows(
+            select(
+                Shelf.id, Shelf.aisle_id, Shelf.code, Shelf.name, Shelf.shelf_type, Shelf.rows, Shelf.columns,
+                Shelf.layers, Shelf.x_coordinate, Shelf.sort_order, Shelf.is_active
+            )
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .join(Zone, Aisle.zone_id == Zone.id)
+            .where(Zone.warehouse_id == warehouse.id),
+            parent_field="aisle_id"
+        )
+        desired = []
+        shelf_prefixes = []
+        for (zone_config, aisle_config, _), aisle_id in zip(aisle_parents, aisle_ids):
+            for shelf_idx, shelf_config in enumerate(aisle_config.get("shelves", [])):
+                desired.append(((aisle_id, shelf_config["code"]), {
+                    "aisle_id": aisle_id,
+                    "code": shelf_config["code"],
+                    "name": shelf_config["name"],
+                    "shelf_type": ShelfType(shelf_config.get("shelf_type", "normal")),
+                    "rows": shelf_config.get("rows", 4),
+                    "columns": shelf_config.get("columns", 5),
+                    "layers": shelf_config.get("layers", 1),
+                    "x_coordinate": shelf_config.get("x_coordinate", shelf_idx),
+                    "sort_order": shelf_idx,
+                }))
+                shelf_prefixes.append((
+                    zone_config["code"],
+                    shelf_code_prefix(warehouse.code, zone_config["code"], aisle_config["code"], shelf_config["code"])
+                ))
+        shelf_rows = [values for _, values in desired]
+        shelf_ids, changed = await self._sync_level(Shelf, Shelf.aisle_id, stored, desired, changes["shelves"])
+        shelf_zones = {row["id"]: aisle_zones[row["aisle_id"]] for row in stored.values()}
+        shelf_zones.update((shelf_id, aisle_zones[row["aisle_id"]]) for shelf_id, row in zip(shelf_ids, shelf_rows))
+        touched_zones.update(shelf_zones[shelf_id] for shelf_id in changed)
+
+        # ---------- 库位 ----------
+        stored = await self._stored_rows(
+            select(
+                Location.id, Location.shelf_id, Location.code, Location.full_code, Location.row_label,
+                Location.column_number, Location.row_index, Location.column_index, Location.is_active
+            )
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .join(Zone, Aisle.zone_id == Zone.id)
+            .where(Zone.warehouse_id == warehouse.id),
+            parent_field="shelf_id"
+        )
+        desired = []
+        for shelf_row, (zone_code, code_prefix), shelf_id in zip(shelf_rows, shelf_prefixes, shelf_ids):
+            desired.extend(
+                ((shelf_id, row["code"]), row)
+                for row in build_location_rows(shelf_id, shelf_row["rows"], shelf_row["columns"], zone_code, code_prefix)
+            )
+        location_shelves = {row["id"]: row["shelf_id"] for row in stored.values()}
+        new_shelves = {values["shelf_id"] for key, values in desired if key not in stored}
+        _, changed = await self._sync_level(
+            Location, Location.shelf_id, stored, desired, changes["locations"], return_ids=False
+        )
+        touched_zones.update(shelf_zones[location_shelves[location_id]] for location_id in changed)
+        touched_zones.update(shelf_zones[shelf_id] for shelf_id in new_shelves)
+
+        return {**changes, "zone_ids": touched_zones}
+
+    async def _stored_rows(self, query, parent_field: str = None) -> Dict[Any, dict]:
+        """已存储的一层对象，按编码（有上级时为 (上级ID, 编码)）索引"""
+        rows = {}
+        for row in (await self.db.execute(query)).mappings().all():
+            key = (row[parent_field], row["code"]) if parent_field else row["code"]
+            rows[key] = dict(row)
+        return rows
+
+    async def _sync_level(
+        self,
+        model,
+        parent_column,
+        stored: Dict[Any, dict],
+        desired: List[Tuple[Any, dict]],
+        counts: Dict[str, int],
+        return_ids: bool = True
+    ) -> Tuple[List[int], Set[int]]:
+        """
+        同步一层对象，返回 (按 desired 顺序的 ID, 更新或停用的已有对象 ID)
+
+        return_ids=False 时（库位）新插入的对象不取回 ID，返回的 ID 列表为空
+        """
+        inserts = []
+        updates = []
+        ids: List[Any] = []
+        for key, values in desired:
+            row = stored.get(key)
+            if row is None:
+                inserts.append(values)
+                ids.append(None)
+                continue
+            ids.append(row["id"])
+            if not row["is_active"] or any(row[field] != value for field, value in values.items()):
+                updates.append({**values, "id": row["id"], "is_active": True})
+
+        desired_keys = {key for key, _ in desired}
+        deactivate = [
+            row["id"] for key, row in stored.items()
+            if key not in desired_keys and row["is_active"]
+        ]
+
+        if return_ids:
+            new_ids = iter(await self.insert_level(model, parent_column, inserts, key_field="code"))
+            ids = [next(new_ids) if object_id is None else object_id for object_id in ids]
+        else:
+            await self.insert_locations(inserts)
+            ids = []
+
+        for batch in chunked(updates, self.LOCATION_BATCH_SIZE):
+            # 按主键批量更新（executemany）
+            await self.db.execute(update(model), batch)
+        for batch in chunked(deactivate, self.LOCATION_BATCH_SIZE):
+            await self.db.execute(
+                update(model)
+                .where(model.id.in_(batch))
+                .values(is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+
+        counts["inserted"] += len(inserts)
+        counts["updated"] += len(updates)
+        counts["deactivated"] += len(deactivate)
+        return ids, {row["id"] for row in updates} | set(deactivate)
@@ -0,0 +1,136 @@
+"""库位编码索引"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, func, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.warehouse import Location
+from app.utils.bulk import chunked
+
+
+class LocationRef(NamedTuple):
+    """索引中的库位"""
+    id: int
+    shelf_id: int
+
+
+class LocationIndex:
+    """
+    进程内共享的库位编码索引
+
+    一次查询加载全部库位的 full_code -> (id, shelf_id)，按整列编码批量解析。
+    除完整编码外，也接受 _parse_location_code 能解析的其他格式
+    （如带后缀的 A-01巷-货架01-A1-x），按前四段组成的标准编码查找。
+
+    通过 WarehouseService 修改布局时调用 invalidate() 失效；
+    每次解析前比对库位表的 (行数, 最大 id)，其他进程修改布局后也会重新加载。
+    索引中查不到的编码再查一次数据库（结果不写入索引，避免缓存未提交的库位）。
+    """
+
+    # 库位部分的格式（与 ImportService._parse_location_code 一致）: 库区代码 + 顺序号
+    LOCATION_SEQ_PATTERN = re.compile(r'^[A-Z]+\d+$')
+
+    # 批量查询数据库时每批的编码数量
+    LOOKUP_BATCH_SIZE = 500
+
+    _entries: Optional[Dict[str, LocationRef]] = None
+    _signature: Optional[Tuple[int, int]] = None
+    # 每次失效递增，加载期间发生失效时不缓存加载结果
+    _version = 0
+
+    @classmethod
+    def invalidate(cls, db: Optional[AsyncSession] = None) -> None:
+        """
+        使索引失效
+
+        传入会话时在该会话提交后再失效一次，避免提交前其他请求按旧数据重新加载
+        """
+        cls._entries = None
+        cls._signature = None
+        cls._version += 1
+
+        if db is not None:
+            event.listen(db.sync_session, "after_commit", lambda session: cls.invalidate(), once=True)
+
+    @classmethod
+    def canonical_code(cls, code: str) -> Optional[str]:
+        """按 _parse_location_code 的规则得到标准编码（库区-巷道-货架-库位），无法解析时返回 None"""
+        parts = code.split("-")
+        if len(parts) < 4 or not cls.LOCATION_SEQ_PATTERN.match(parts[3]):
+            return None
+        return "-".join(parts[:4])
+
+    @classmethod
+    async def _load(cls, db: AsyncSession) -> Dict[str, LocationRef]:
+        """确保索引已加载且与库位表一致，返回索引"""
+        result = await db.execute(select(func.count(Location.id), func.max(Location.id)))
+        count, max_id = result.one()
+        signature = (count, max_id or 0)
+
+        if cls._entries is not None and cls._signature == signature:
+            return cls._entries
+
+        version = cls._version
+        result = await db.execute(select(Location.full_code, Location.id, Location.shelf_id))
+        entries = {
+            full_code: LocationRef(location_id, shelf_id)
+            for full_code, location_id, shelf_id in result.all()
+        }
+        if version == cls._version:
+            cls._entries = entries
+            cls._signature = signature
+        return entries
+
+    @classmethod
+    async def resolve(cls, db: AsyncSession, codes: Iterable[str]) -> Dict[str, LocationRef]:
+        """
+        批量解析库位编码
+
+        返回 {输入编码: LocationRef}，完整编码优先，其次为标准编码；解析不到的编码不在结果中
+        """
+        entries = await cls._load(db)
+
+        found: Dict[str, LocationRef] = {}
+        missing: List[str] = []
+        for code in set(codes):
+            ref = entries.get(code)
+            if ref is None:
+                canonical = cls.canonical_code(code)
+                if canonical is not None:
+                    ref = entries.get(canonical)
+            if ref is None:
+                missing.append(code)
+            else:
+                found[code] = ref
+
+        if missing:
+            found.update(await cls._resolve_from_db(db, missing))
+        return found
+
+    @classmethod
+    async def _resolve_from_db(cls, db: AsyncSession, codes: List[str]) -> Dict[str, LocationRef]:
+        """在数据库中查找索引之外的编码"""
+        lookup: Dict[str, List[str]] = {}
+        for code in codes:
+            lookup.setdefault(code, []).append(code)
+            canonical = cls.canonical_code(code)
+            if canonical is not None and canonical != code:
+                lookup.setdefault(canonical, []).append(code)
+
+        refs: Dict[str, LocationRef] = {}
+        for batch in chunked(list(lookup.keys()), cls.LOOKUP_BATCH_SIZE):
+            result = await db.execute(
+                select(Location.full_code, Location.id, Location.shelf_id)
+                .where(Location.full_code.in_(batch))
+            )
+            for full_code, location_id, shelf_id in result.all():
+                refs[full_code] = LocationRef(location_id, shelf_id)
+
+        found: Dict[str, LocationRef] = {}
+        for code in codes:
+            ref = refs.get(code)
+            if ref is None:
+                canonical = cls.canonical_code(code)
+                ref = refs.get(canonical) if canonical is not None else None
+            if ref is not None:
+                found[code] = ref
+        return found
@@ -0,0 +1,263 @@
+"""拣货事件实时上报服务"""
+import asyncio
+import logging
+from collections import deque
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy.exc import DBAPIError
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.schemas.warehouse import PickEvent
+from app.services.heatmap_service import HeatmapService
+from app.services.location_index import LocationIndex
+
+logger = logging.getLogger(__name__)
+
+
+class PickEventBuffer:
+    """
+    拣货事件的进程内缓冲
+
+    上报的事件按 (库位编码, 日期) 合并为 [事件数, 数量合计]，不访问数据库；
+    后台任务每 PICK_FLUSH_INTERVAL_SECONDS 秒、或缓冲达到 PICK_FLUSH_EVENTS 个事件时，
+    一次解析全部库位编码，并通过 HeatmapService.bulk_increment_heat_data 累加写入
+    （拣货频次 += 事件数，出库数量 += 数量合计）。
+
+    缓冲（含写入中的）达到 PICK_BUFFER_MAX_EVENTS 时拒绝新的上报，由调用方稍后重试；
+    写入失败时本批事件放回缓冲，下次重试。临时性错误（数据库锁定、连接中断等）一直重试，
+    其他错误连续出现 PICK_FLUSH_MAX_FAILURES 次后丢弃本批事件（计入 dropped_events），
+    避免同一批事件无限重试使缓冲一直占满。同一时间只有一个写入在执行。
+    """
+
+    _pending: Dict[Tuple[str, date], List[int]] = {}
+    _pending_events = 0
+    _inflight_events = 0
+
+    _lock: Optional[asyncio.Lock] = None
+    _wake: Optional[asyncio.Event] = None
+    _worker: Optional[asyncio.Task] = None
+
+    # 统计（本进程）
+    _accepted = 0
+    _rejected = 0
+    _written_events = 0
+    _written_rows = 0
+    _unknown_events = 0
+    _failed_flushes = 0
+    _consecutive_failures = 0
+    _dropped_events = 0
+    _last_flush_at: Optional[datetime] = None
+    _last_error: Optional[str] = None
+    _last_error_at: Optional[datetime] = None
+    _recent_unknown_codes: deque = deque(maxlen=20)
+
+    @classmethod
+    def start(cls) -> None:
+        """启动后台写入任务（应用启动时调用）"""
+        if cls._worker is None or cls._worker.done():
+            cls._worker = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止后台任务并写入剩余的事件（应用关闭时调用）"""
+        if cls._worker is not None:
+            cls._worker.cancel()
+            try:
+                await cls._worker
+            except asyncio.CancelledError:
+                pass
+            cls._worker = None
+        try:
+            await cls.flush()
+        except Exception:
+            logger.exception("关闭时写入拣货事件失败")
+
+    @classmethod
+    def _get_lock(cls) -> asyncio.Lock:
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        return cls._lock
+
+    @classmethod
+    def _get_wake(cls) -> asyncio.Event:
+        if cls._wake is None:
+            cls._wake = asyncio.Event()
+        return cls._wake
+
+    # ==================== 上报 ====================
+
+    @classmethod
+    def add(cls, events: List[PickEvent]) -> bool:
+        """
+        将一批事件加入缓冲
+
+        缓冲已满时整批不接受并返回 False
+        """
+        if cls._pending_events + cls._inflight_events + len(events) > settings.PICK_BUFFER_MAX_EVENTS:
+            cls._rejected += len(events)
+            return False
+
+        pending = cls._pending
+        for event in events:
+            key = (event.location_code, cls._event_day(event.timestamp))
+            entry = pending.get(key)
+            if entry is None:
+                pending[key] = [1, event.qty]
+            else:
+                entry[0] += 1
+                entry[1] += event.qty
+
+        cls._pending_events += len(events)
+        cls._accepted += len(events)
+        if cls._pending_events >= settings.PICK_FLUSH_EVENTS:
+            cls._get_wake().set()
+        return True
+
+    @staticmethod
+    def _event_day(timestamp: datetime) -> date:
+        """事件所属的日期（带时区的时间先转换为服务器本地时间，与热度数据的日期一致）"""
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return timestamp.date()
+
+    @classmethod
+    def pending_events(cls) -> int:
+        return cls._pending_events + cls._inflight_events
+
+    # ==================== 写入 ====================
+
+    @classmethod
+    async def _run(cls) -> None:
+        wake = cls._get_wake()
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=settings.PICK_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                await cls.flush()
+            except Exception:
+                logger.exception("写入拣货事件失败")
+
+    @classmethod
+    async def flush(cls) -> int:
+        """写入缓冲中的全部事件，返回写入的 (库位, 日期) 记录数"""
+        async with cls._get_lock():
+            if not cls._pending:
+                return 0
+
+            batch, cls._pending = cls._pending, {}
+            cls._inflight_events, cls._pending_events = cls._pending_events, 0
+            try:
+                rows, unknown = await cls._write(batch)
+            except Exception as e:
+                cls._record_failure(batch, e)
+                raise
+            finally:
+                events, cls._inflight_events = cls._inflight_events, 0
+
+            cls._consecutive_failures = 0
+            cls._written_events += events - unknown
+            cls._written_rows += rows
+            cls._unknown_events += unknown
+            cls._last_flush_at = datetime.now()
+            return rows
+
+    @classmethod
+    async def _write(cls, batch: Dict[Tuple[str, date], List[int]]) -> Tuple[int, int]:
+        """解析库位编码并累加写入，返回 (写入的记录数, 编码无法解析的事件数)"""
+        async with AsyncSessionLocal() as db:
+            refs = await LocationIndex.resolve(db, {code for code, _ in batch})
+
+            increments = []
+            unknown = 0
+            unknown_codes: Set[str] = set()
+            for (code, day), (count, qty) in batch.items():
+                ref = refs.get(code)
+                if ref is None:
+                    unknown += count
+                    unknown_codes.add(code)
+                    continue
+                increments.append({
+                    "location_id": ref.id,
+                    "date": datetime.combine(day, time()),
+                    "pick_frequency": count,
+                    "outbound_qty": qty,
+                })
+
+            rows = await HeatmapService(db).bulk_increment_heat_data(increments)
+            await db.commit()
+
+        cls._recent_unknown_codes.extend(sorted(unknown_codes))
+        return rows, unknown
+
+    @classmethod
+    def _record_failure(cls, batch: Dict[Tuple[str, date], List[int]], error: Exception) -> None:
+        """记录写入失败；临时性错误或未达到连续失败上限时放回缓冲，否则丢弃本批"""
+        cls._failed_flushes += 1
+        cls._last_error = f"{type(error).__name__}: {error}"
+        cls._last_error_at = datetime.now()
+
+        if cls._is_transient(error):
+            cls._restore(batch)
+            return
+
+        cls._consecutive_failures += 1
+        if cls._consecutive_failures < settings.PICK_FLUSH_MAX_FAILURES:
+            cls._restore(batch)
+            return
+
+        events = sum(count for count, _ in batch.values())
+        cls._dropped_events += events
+        cls._consecutive_failures = 0
+        logger.error("拣货事件连续 %s 次写入失败，丢弃 %s 个事件: %s",
+                     settings.PICK_FLUSH_MAX_FAILURES, events, cls._last_error)
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """数据库锁定、连接中断、超时等稍后重试可能成功的错误"""
+        if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, DBAPIError):
+            if error.connection_invalidated:
+                return True
+            message = str(error.orig).lower()
+            return any(word in message for word in ("locked", "busy", "deadlock", "timeout", "could not serialize"))
+        return False
+
+    @classmethod
+    def _restore(cls, batch: Dict[Tuple[str, date], List[int]]) -> None:
+        """把写入失败的一批合并回缓冲"""
+        events = 0
+        for key, (count, qty) in batch.items():
+            entry = cls._pending.get(key)
+            if entry is None:
+                cls._pending[key] = [count, qty]
+            else:
+                entry[0] += count
+                entry[1] += qty
+            events += count
+        cls._pending_events += events
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """缓冲与写入统计（本进程）"""
+        return {
+            "pending_events": cls._pending_events,
+            "pending_keys": len(cls._pending),
+            "inflight_events": cls._inflight_events,
+            "max_events": settings.PICK_BUFFER_MAX_EVENTS,
+            "accepted_events": cls._accepted,
+            "rejected_events": cls._rejected,
+            "written_events": cls._written_events,
+            "written_rows": cls._written_rows,
+            "unknown_events": cls._unknown_events,
+            "recent_unknown_codes": list(cls._recent_unknown_codes),
+            "failed_flushes": cls._failed_flushes,
+            "consecutive_failures": cls._consecutive_failures,
+            "dropped_events": cls._dropped_events,
+            "last_error": cls._last_error,
+            "last_error_at": cls._last_error_at.isoformat() if cls._last_error_at else None,
+            "last_flush_at": cls._last_flush_at.isoformat() if cls._last_flush_at else None,
+        }
@@ -0,0 +1,386 @@
+"""分析报告数据服务"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, Table, and_, case, func, literal, select
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.warehouse import (
+    Warehouse, Zone, Aisle, Shelf, Location, LocationHeatData, LocationHeatRollup
+)
+from app.schemas.warehouse import ReportDataSourceEnum
+from app.services.heat_rollup_service import HeatRollupService
+
+# TOP 热门 / 冷门库位的数量
+TOP_LOCATION_LIMIT = 20
+
+# 货架分析（热门货架）的数量
+TOP_SHELF_LIMIT = 15
+
+
+def heat_distribution_levels() -> List[str]:
+    """报告热度分布各档的名称，如 “极冷 (0-50)”（按 REPORT_HEAT_BUCKETS / REPORT_HEAT_BUCKET_LABELS）"""
+    edges = settings.report_heat_bucket_edges
+    levels = []
+    for index, label in enumerate(settings.report_heat_bucket_labels):
+        if not edges:
+            levels.append(label)
+        elif index == 0:
+            levels.append(f"{label} (0-{edges[0]:g})")
+        elif index == len(edges):
+            levels.append(f"{label} (>{edges[-1]:g})")
+        else:
+            levels.append(f"{label} ({edges[index - 1]:g}-{edges[index]:g})")
+    return levels
+
+
+def heat_bucket_condition(heat_value, index: int, edges: List[float]):
+    """热度值落在第 index 档的条件: 不小于 edges[index - 1] 且小于 edges[index]"""
+    conditions = []
+    if index > 0:
+        conditions.append(heat_value >= edges[index - 1])
+    if index < len(edges):
+        conditions.append(heat_value < edges[index])
+    return and_(*conditions) if conditions else literal(True)
+
+
+class ReportDataService:
+    """
+    分析报告数据
+
+    先把报告范围内每个库位的聚合结果写入临时表（每个库位一行），
+    统计、热度分布、TOP 库位、巷道 / 货架分析都从临时表派生，
+    原始热度数据只扫描一次，各部分不再重复库区筛选子查询。
+
+    临时表的来源（source）:
+    - detail: 按库位聚合原始热度数据，统计口径为每条（库位, 日期）记录，与逐条统计的结果一致
+    - rollup: 直接读取全部历史汇总（每个库位一行），不扫描原始数据；
+      热度范围、热度分布和 TOP 库位按库位的日均热度统计，数字与 detail 不同，需显式选择
+    - 未指定时按 REPORT_DATA_SOURCE（默认 detail），auto 为库区报告用 detail、全部范围用 rollup
+    """
+
+    TEMP_TABLE_NAME = "tmp_report_location_stats"
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.edges = settings.report_heat_bucket_edges
+        self.stats = self._location_stats_table(len(self.edges) + 1)
+
+    @classmethod
+    def _location_stats_table(cls, bucket_count: int) -> Table:
+        """每个库位一行的聚合临时表（bucket_i 为该库位落在第 i 档的记录数）"""
+        return Table(
+            cls.TEMP_TABLE_NAME,
+            MetaData(),
+            Column("location_id", Integer, primary_key=True),
+            Column("shelf_id", Integer),
+            Column("aisle_id", Integer),
+            Column("zone_id", Integer),
+            Column("record_count", Integer),
+            Column("heat_sum", Float),
+            Column("heat_min", Float),
+            Column("heat_max", Float),
+            Column("freq_sum", Float),
+            Column("freq_min", Float),
+            Column("freq_max", Float),
+            Column("turnover_sum", Float),
+            *[Column(f"bucket_{i}", Integer) for i in range(bucket_count)],
+            prefixes=["TEMPORARY"],
+        )
+
+    @staticmethod
+    def resolve_source(
+        zone_id: Optional[int],
+        source: Optional[ReportDataSourceEnum] = None
+    ) -> ReportDataSourceEnum:
+        if source is None and settings.REPORT_DATA_SOURCE != "auto":
+            source = ReportDataSourceEnum(settings.REPORT_DATA_SOURCE)
+        if source is None:
+            source = ReportDataSourceEnum.DETAIL if zone_id else ReportDataSourceEnum.ROLLUP
+        return source
+
+    async def fetch(
+        self,
+        zone_id: Optional[int] = None,
+        source: Optional[ReportDataSourceEnum] = None
+    ) -> Dict[str, Any]:
+        """获取报告数据（不含热力分布图），支持按库区筛选"""
+        source = self.resolve_source(zone_id, source)
+        data: Dict[str, Any] = {"data_source": source.value}
+
+        data.update(await self._fetch_scope(zone_id))
+        data.update(await self._fetch_structure_counts(zone_id))
+
+        warehouses_result = await self.db.execute(
+            select(Warehouse.id, Warehouse.code, Warehouse.name)
+        )
+        data['warehouses'] = [
+            {'id': r[0], 'code': r[1], 'name': r[2]}
+            for r in warehouses_result.fetchall()
+        ]
+
+        await self.db.run_sync(self._create_stats_table)
+        try:
+            if source == ReportDataSourceEnum.ROLLUP:
+                await self._fill_from_rollups(zone_id)
+            else:
+                await self._fill_from_details(zone_id)
+
+            data.update(await self._fetch_totals())
+            data['top_hot'] = await self._fetch_top_locations(hottest=True)
+            data['top_cold'] = await self._fetch_top_locations(hottest=False)
+            data['aisle_analysis'] = await self._fetch_aisle_analysis()
+            data['shelf_analysis'] = await self._fetch_shelf_analysis()
+        finally:
+            await self.db.run_sync(self._drop_stats_table)
+
+        return data
+
+    # ==================== 临时表 ====================
+
+    def _create_stats_table(self, session) -> None:
+        # 同一连接上次未清理的临时表（如 MySQL 中临时表不随事务回滚）先删除
+        connection = session.connection()
+        self.stats.drop(connection, checkfirst=True)
+        self.stats.create(connection)
+
+    def _drop_stats_table(self, session) -> None:
+        self.stats.drop(session.connection(), checkfirst=True)
+
+    def _location_columns(self):
+        return [
+            Location.id,
+            Location.shelf_id,
+            Shelf.aisle_id,
+            Aisle.zone_id,
+        ]
+
+    async def _fill_from_details(self, zone_id: Optional[int]) -> None:
+        """按库位聚合原始热度数据（一次扫描）"""
+        heat_value = func.coalesce(LocationHeatData.heat_value, 0)
+        query = (
+            select(
+                *self._location_columns(),
+                func.count(LocationHeatData.id),
+                func.sum(heat_value),
+                func.min(LocationHeatData.heat_value),
+                func.max(LocationHeatData.heat_value),
+                func.sum(LocationHeatData.pick_frequency),
+                func.min(LocationHeatData.pick_frequency),
+                func.max(LocationHeatData.pick_frequency),
+                func.sum(LocationHeatData.turnover_rate),
+                *[
+                    func.sum(case((heat_bucket_condition(heat_value, i, self.edges), 1), else_=0))
+                    for i in range(len(self.edges) + 1)
+                ]
+            )
+            .join(Location, LocationHeatData.location_id == Location.id)
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .group_by(Location.id, Location.shelf_id, Shelf.aisle_id, Aisle.zone_id)
+        )
+        if zone_id:
+            query = query.where(Aisle.zone_id == zone_id)
+        await self._insert_stats(query)
+
+    async def _fill_from_rollups(self, zone_id: Optional[int]) -> None:
+        """读取全部历史汇总，每个库位按日均热度 / 日均拣货频率计入"""
+        avg_heat = LocationHeatRollup.heat_value * 1.0 / LocationHeatRollup.record_count
+        avg_freq = LocationHeatRollup.pick_frequency * 1.0 / LocationHeatRollup.record_count
+        query = (
+            select(
+                *self._location_columns(),
+                LocationHeatRollup.record_count,
+                LocationHeatRollup.heat_value,
+                avg_heat,
+                avg_heat,
+                LocationHeatRollup.pick_frequency,
+                avg_freq,
+                avg_freq,
+                LocationHeatRollup.turnover_rate_sum,
+                *[
+                    case((heat_bucket_condition(avg_heat, i, self.edges), 1), else_=0)
+                    for i in range(len(self.edges) + 1)
+                ]
+            )
+            .join(Location, LocationHeatRollup.location_id == Location.id)
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+            .where(and_(
+                LocationHeatRollup.granularity == HeatRollupService.GRANULARITY_ALL,
+                LocationHeatRollup.record_count > 0
+            ))
+        )
+        if zone_id:
+            query = query.where(Aisle.zone_id == zone_id)
+        await self._insert_stats(query)
+
+    async def _insert_stats(self, query) -> None:
+        await self.db.execute(
+            self.stats.insert().from_select([column.name for column in self.stats.columns], query)
+        )
+
+    # ==================== 各部分数据 ====================
+
+    async def _fetch_scope(self, zone_id: Optional[int]) -> Dict[str, Any]:
+        """报告范围（用于报告标题）"""
+        if zone_id:
+            zone_result = await self.db.execute(
+                select(Zone.name, Warehouse.name)
+                .join(Warehouse, Zone.warehouse_id == Warehouse.id)
+                .where(Zone.id == zone_id)
+            )
+            zone_info = zone_result.fetchone()
+            if zone_info:
+                return {
+                    'zone_name': zone_info[0],
+                    'warehouse_name': zone_info[1],
+                    'report_scope': f"{zone_info[1]} - {zone_info[0]}",
+                }
+        return {'report_scope': "全部"}
+
+    async def _fetch_structure_counts(self, zone_id: Optional[int]) -> Dict[str, Any]:
+        """仓库 / 库区 / 巷道 / 货架 / 库位数量（一次查询）"""
+        aisle_count = select(func.count(Aisle.id))
+        shelf_count = select(func.count(Shelf.id)).join(Aisle, Shelf.aisle_id == Aisle.id)
+        location_count = (
+            select(func.count(Location.id))
+            .join(Shelf, Location.shelf_id == Shelf.id)
+            .join(Aisle, Shelf.aisle_id == Aisle.id)
+        )
+        if zone_id:
+            warehouse_count = literal(1)
+            zone_count = literal(1)
+            aisle_count = aisle_count.where(Aisle.zone_id == zone_id)
+            shelf_count = shelf_count.where(Aisle.zone_id == zone_id)
+            location_count = location_count.where(Aisle.zone_id == zone_id)
+        else:
+            warehouse_count = select(func.count(Warehouse.id)).scalar_subquery()
+            zone_count = select(func.count(Zone.id)).scalar_subquery()
+
+        row = (await self.db.execute(select(
+            warehouse_count,
+            zone_count,
+            aisle_count.scalar_subquery(),
+            shelf_count.scalar_subquery(),
+            location_count.scalar_subquery(),
+        ))).one()
+        return {
+            'warehouse_count': row[0] or 0,
+            'zone_count': row[1] or 0,
+            'aisle_count': row[2] or 0,
+            'shelf_count': row[3] or 0,
+            'location_count': row[4] or 0,
+        }
+
+    async def _fetch_totals(self) -> Dict[str, Any]:
+        """有数据的库位数、记录数、热度 / 拣货频率统计和热度分布（一次查询）"""
+        stats = self.stats.c
+        bucket_count = len(self.edges) + 1
+        row = (await self.db.execute(select(
+            func.count(),
+            func.sum(stats.record_count),
+            func.min(stats.heat_min),
+            func.max(stats.heat_max),
+            func.sum(stats.heat_sum),
+            func.min(stats.freq_min),
+            func.max(stats.freq_max),
+            func.sum(stats.freq_sum),
+            *[func.sum(stats[f"bucket_{i}"]) for i in range(bucket_count)]
+        ))).one()
+
+        record_count = row[1] or 0
+        freq_min, freq_max = row[5] or 0, row[6] or 0
+        return {
+            'active_location_count': row[0] or 0,
+            'heat_data_count': record_count,
+            'heat_stats': {
+                'min': row[2] or 0,
+                'max': row[3] or 0,
+                'avg': (row[4] or 0) / record_count if record_count else 0,
+            },
+            'freq_stats': {
+                # detail 来源为整数，rollup 来源为日均值
+                'min': int(freq_min) if float(freq_min).is_integer() else freq_min,
+                'max': int(freq_max) if float(freq_max).is_integer() else freq_max,
+                'avg': (row[7] or 0) / record_count if record_count else 0,
+            },
+            'heat_distribution': [
+                {'heat_level': level, 'cnt': int(row[8 + i] or 0)}
+                for i, level in enumerate(heat_distribution_levels())
+            ],
+        }
+
+    async def _fetch_top_locations(self, hottest: bool) -> List[Dict[str, Any]]:
+        """TOP 热门（按最高热度降序）/ 冷门（按最低热度升序）库位"""
+        stats = self.stats.c
+        order_by = stats.heat_max.desc() if hottest else stats.heat_min.asc()
+        result = await self.db.execute(
+            select(
+                Location.full_code,
+                stats.heat_max if hottest else stats.heat_min,
+                stats.freq_sum,
+                stats.turnover_sum / stats.record_count,
+            )
+            .select_from(self.stats)
+            .join(Location, Location.id == stats.location_id)
+            .order_by(order_by, stats.location_id)
+            .limit(TOP_LOCATION_LIMIT)
+        )
+        return [
+            {'full_code': r[0], 'heat_value': r[1] or 0, 'pick_frequency': int(r[2] or 0), 'turnover_rate': r[3] or 0}
+            for r in result.fetchall()
+        ]
+
+    def _avg_heat(self):
+        return func.sum(self.stats.c.heat_sum) / func.sum(self.stats.c.record_count)
+
+    async def _fetch_aisle_analysis(self) -> List[Dict[str, Any]]:
+        """巷道分析（平均热度 = 热度合计 / 记录数）"""
+        stats = self.stats.c
+        avg_heat = self._avg_heat()
+        result = await self.db.execute(
+            select(
+                Zone.code,
+                Aisle.code,
+                Aisle.name,
+                avg_heat,
+                func.sum(stats.freq_sum),
+                func.count(),
+            )
+            .select_from(self.stats)
+            .join(Aisle, Aisle.id == stats.aisle_id)
+            .join(Zone, Zone.id == stats.zone_id)
+            .group_by(Zone.code, Aisle.id, Aisle.code, Aisle.name)
+            .order_by(avg_heat.desc())
+        )
+        return [
+            {'zone_code': r[0], 'code': r[1], 'name': r[2], 'avg_heat': r[3] or 0, 'total_freq': int(r[4] or 0), 'loc_cnt': r[5]}
+            for r in result.fetchall()
+        ]
+
+    async def _fetch_shelf_analysis(self) -> List[Dict[str, Any]]:
+        """货架分析（TOP 热门货架）"""
+        stats = self.stats.c
+        avg_heat = self._avg_heat()
+        result = await self.db.execute(
+            select(
+                Zone.code,
+                Aisle.code,
+                Shelf.code,
+                avg_heat,
+                func.sum(stats.freq_sum),
+                func.count(),
+            )
+            .select_from(self.stats)
+            .join(Shelf, Shelf.id == stats.shelf_id)
+            .join(Aisle, Aisle.id == stats.aisle_id)
+            .join(Zone, Zone.id == stats.zone_id)
+            .group_by(Zone.code, Aisle.code, Shelf.id, Shelf.code)
+            .order_by(avg_heat.desc())
+            .limit(TOP_SHELF_LIMIT)
+        )
+        return [
+            {'zone_code': r[0], 'aisle_code': r[1], 'shelf_code': r[2], 'avg_heat': r[3] or 0, 'total_freq': int(r[4] or 0), 'loc_cnt': r[5]}
+            for r in result.fetchall()
+        ]
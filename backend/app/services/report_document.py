@@ -0,0 +1,255 @@
+"""分析报告 Word 文档生成"""
+import os
+from datetime import datetime
+from app.schemas.warehouse import ReportDataSourceEnum
+
+# 报告模板版本，文档内容或版式变化时递增（已生成的报告不再复用）
+REPORT_TEMPLATE_VERSION = 1
+
+
+def generate_docx_report(data: dict, output_path: str) -> bool:
+    """
+    生成Word文档报告
+
+    在报告任务的进程池中执行（参数和返回值须可序列化）。
+    先写入临时文件再改名，报告列表中不会出现未写完的文件
+    """
+    try:
+        from docx import Document
+        from docx.shared import Pt, Inches
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.oxml.ns import qn
+    except ImportError:
+        raise RuntimeError("python-docx 未安装，无法生成报告")
+    
+    doc = Document()
+    
+    # 设置文档默认字体
+    doc.styles['Normal'].font.name = '微软雅黑'
+    doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '微软雅黑')
+    
+    # 标题
+    report_scope = data.get('report_scope', '全部')
+    title = doc.add_heading('仓库库位热力图分析报告', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # 分析范围
+    scope_para = doc.add_paragraph()
+    scope_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    scope_para.add_run(f'分析范围：{report_scope}').bold = True
+    
+    # 报告信息
+    info_para = doc.add_paragraph()
+    info_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    info_para.add_run(f'生成时间：{datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")}').italic = True
+    
+    doc.add_paragraph()
+    
+    # ===== 第一章：数据概览 =====
+    doc.add_heading('一、数据概览', level=1)
+    
+    # 基础统计表格
+    table = doc.add_table(rows=8, cols=2)
+    table.style = 'Table Grid'
+    
+    stats = [
+        ('指标', '数值'),
+        ('仓库总数', f"{data['warehouse_count']} 个"),
+        ('库区总数', f"{data['zone_count']} 个"),
+        ('巷道总数', f"{data['aisle_count']} 条"),
+        ('货架总数', f"{data['shelf_count']} 个"),
+        ('库位总数', f"{data['location_count']} 个"),
+        ('有热力数据的库位', f"{data['active_location_count']} 个"),
+        ('热力数据记录', f"{data['heat_data_count']} 条"),
+    ]
+    
+    for i, (key, val) in enumerate(stats):
+        table.rows[i].cells[0].text = key
+        table.rows[i].cells[1].text = str(val)
+        if i == 0:
+            for cell in table.rows[i].cells:
+                cell.paragraphs[0].runs[0].bold = True
+    
+    doc.add_paragraph()
+    
+    # ===== 第二章：热度分析 =====
+    doc.add_heading('二、热度分析', level=1)
+    
+    heat_stats = data['heat_stats']
+    freq_stats = data['freq_stats']
+    
+    doc.add_paragraph(f"热度值范围：{heat_stats['min']:.2f} ~ {heat_stats['max']:.2f}")
+    doc.add_paragraph(f"平均热度：{heat_stats['avg']:.2f}")
+    doc.add_paragraph(f"拣货频率范围：{freq_stats['min']} ~ {freq_stats['max']}")
+    doc.add_paragraph(f"平均拣货频率：{freq_stats['avg']:.2f}")
+    if data.get('data_source') == ReportDataSourceEnum.ROLLUP.value:
+        doc.add_paragraph('注：统计基于全部历史汇总，热度值/拣货频率范围、热度分布和库位排名按各库位的日均值计算，热度分布按库位计数。')
+    
+    doc.add_heading('热度分布统计', level=2)
+    
+    # 热度分布表格
+    dist_data = data['heat_distribution']
+    total = sum(d['cnt'] for d in dist_data)
+    
+    table = doc.add_table(rows=len(dist_data) + 1, cols=3)
+    table.style = 'Table Grid'
+    
+    headers = ['热度等级', '库位数量', '占比']
+    for i, h in enumerate(headers):
+        table.rows[0].cells[i].text = h
+        table.rows[0].cells[i].paragraphs[0].runs[0].bold = True
+    
+    for i, d in enumerate(dist_data, 1):
+        pct = d['cnt'] / total * 100 if total > 0 else 0
+        table.rows[i].cells[0].text = d['heat_level']
+        table.rows[i].cells[1].text = str(d['cnt'])
+        table.rows[i].cells[2].text = f"{pct:.1f}%"
+    
+    doc.add_paragraph()
+    
+    # 热力分布图
+    heatmap_images = data.get('heatmap_images', [])
+    if heatmap_images:
+        doc.add_heading('热力分布图', level=2)
+        doc.add_paragraph('按货架实际位置排布，每个色块为一个库位，颜色越深表示热度越高。')
+        for image_title, image_path in heatmap_images:
+            doc.add_picture(image_path, width=Inches(6))
+            caption = doc.add_paragraph()
+            caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            caption.add_run(image_title).font.size = Pt(9)
+        doc.add_paragraph()
+    
+    # ===== 第三章：巷道热度分析 =====
+    doc.add_heading('三、巷道热度分析', level=1)
+    
+    doc.add_paragraph('按巷道统计各区域的热度分布情况，热度越高表示该巷道的拣货频率越高。')
+    doc.add_paragraph()
+    
+    aisle_data = data['aisle_analysis']
+    
+    if aisle_data:
+        table = doc.add_table(rows=len(aisle_data) + 1, cols=4)
+        table.style = 'Table Grid'
+        
+        headers = ['巷道', '平均热度', '总拣货频率', '库位数']
+        for i, h in enumerate(headers):
+            table.rows[0].cells[i].text = h
+            table.rows[0].cells[i].paragraphs[0].runs[0].bold = True
+        
+        for i, d in enumerate(aisle_data, 1):
+            # 巷道名称加上库区前缀，格式：LP-01巷
+            table.rows[i].cells[0].text = f"{d['zone_code']}-{d['code']}"
+            table.rows[i].cells[1].text = f"{d['avg_heat']:.2f}"
+            table.rows[i].cells[2].text = str(int(d['total_freq']))
+            table.rows[i].cells[3].text = str(d['loc_cnt'])
+    
+    doc.add_paragraph()
+    
+    # ===== 第三章补充：热门货架分析 =====
+    doc.add_heading('热门货架 TOP 15', level=2)
+    
+    shelf_data = data['shelf_analysis']
+    
+    if shelf_data:
+        table = doc.add_table(rows=len(shelf_data) + 1, cols=5)
+        table.style = 'Table Grid'
+        
+        headers = ['巷道', '货架', '平均热度', '总拣货频率', '库位数']
+        for i, h in enumerate(headers):
+            table.rows[0].cells[i].text = h
+            table.rows[0].cells[i].paragraphs[0].runs[0].bold = True
+        
+        for i, d in enumerate(shelf_data, 1):
+            # 巷道名称加上库区前缀，格式：LP-01巷
+            table.rows[i].cells[0].text = f"{d['zone_code']}-{d['aisle_code']}"
+            table.rows[i].cells[1].text = d['shelf_code']
+            table.rows[i].cells[2].text = f"{d['avg_heat']:.2f}"
+            table.rows[i].cells[3].text = str(int(d['total_freq']))
+            table.rows[i].cells[4].text = str(d['loc_cnt'])
+    
+    doc.add_paragraph()
+    
+    # ===== 第四章：TOP库位 =====
+    doc.add_heading('四、库位热度排名', level=1)
+    
+    doc.add_heading('TOP 10 热门库位', level=2)
+    hot_data = data['top_hot'][:10]
+    
+    table = doc.add_table(rows=len(hot_data) + 1, cols=4)
+    table.style = 'Table Grid'
+    
+    headers = ['库位编码', '热度值', '拣货频率', '周转率']
+    for i, h in enumerate(headers):
+        table.rows[0].cells[i].text = h
+        table.rows[0].cells[i].paragraphs[0].runs[0].bold = True
+    
+    for i, d in enumerate(hot_data, 1):
+        table.rows[i].cells[0].text = d['full_code']
+        table.rows[i].cells[1].text = f"{d['heat_value']:.2f}"
+        table.rows[i].cells[2].text = str(d['pick_frequency'])
+        table.rows[i].cells[3].text = f"{d['turnover_rate']:.4f}"
+    
+    doc.add_paragraph()
+    
+    doc.add_heading('TOP 10 冷门库位', level=2)
+    cold_data = data['top_cold'][:10]
+    
+    table = doc.add_table(rows=len(cold_data) + 1, cols=4)
+    table.style = 'Table Grid'
+    
+    headers = ['库位编码', '热度值', '拣货频率', '周转率']
+    for i, h in enumerate(headers):
+        table.rows[0].cells[i].text = h
+        table.rows[0].cells[i].paragraphs[0].runs[0].bold = True
+    
+    for i, d in enumerate(cold_data, 1):
+        table.rows[i].cells[0].text = d['full_code']
+        table.rows[i].cells[1].text = f"{d['heat_value']:.2f}"
+        table.rows[i].cells[2].text = str(d['pick_frequency'])
+        table.rows[i].cells[3].text = f"{d['turnover_rate']:.4f}"
+    
+    doc.add_paragraph()
+    
+    # ===== 第五章：优化建议 =====
+    doc.add_heading('五、优化建议', level=1)
+    
+    suggestions = [
+        '【商品ABC分类调整】',
+        '  - A类商品（前20%高频）：靠近出库口的巷道',
+        '  - B类商品（中间30%）：中等位置巷道',
+        '  - C类商品（后50%低频）：远端巷道',
+        '',
+        '【热区分流】',
+        '  - 将热度>400的库位中部分SKU迁移至较冷巷道',
+        '  - 将冷门巷道迁入B类商品，提升利用率',
+        '  - 避免单一巷道过热导致拣货拥堵',
+        '',
+        '【巷道均衡优化】',
+        '  - 热门巷道（热度>300）：控制SKU数量，分散到相邻巷道',
+        '  - 冷门巷道（热度<100）：迁入中频商品提升利用率',
+        '  - 保持各巷道热度相对均衡，提高整体拣货效率',
+        '',
+        '【动态调整机制】',
+        '  - 每月复盘热力图数据',
+        '  - 根据销售季节性调整库位',
+        '  - 建立库位热度监控预警'
+    ]
+    
+    for s in suggestions:
+        doc.add_paragraph(s)
+    
+    # 页脚
+    doc.add_paragraph()
+    footer = doc.add_paragraph()
+    footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    footer.add_run('—— 报告结束 ——').italic = True
+    
+    footer2 = doc.add_paragraph()
+    footer2.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    footer2.add_run('生成工具：WMS仓库热力图系统').font.size = Pt(9)
+    
+    # 保存文档
+    temp_path = output_path + ".tmp"
+    doc.save(temp_path)
+    os.replace(temp_path, output_path)
+    return True
@@ -0,0 +1,401 @@
+"""分析报告生成任务服务"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy import and_, select, desc, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.warehouse import Warehouse, Zone, ReportJob
+from app.schemas.warehouse import HeatmapFilterParams, ReportDataSourceEnum
+from app.services.data_version import DataVersion
+from app.services.heatmap_render_service import HeatmapRenderService
+from app.services.report_data_service import ReportDataService
+from app.services.report_document import REPORT_TEMPLATE_VERSION, generate_docx_report
+
+# 报告文件目录（backend/reports）
+REPORTS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "reports"
+)
+
+
+class ReportJobService:
+    """
+    分析报告生成任务服务类
+
+    提交后立即创建任务记录，报告在后台协程中生成：统计查询和热力分布图使用独立的数据库会话，
+    Word 文档（python-docx，纯 CPU 计算）在进程池中生成，不阻塞事件循环。
+    同时执行的任务数不超过 REPORT_WORKERS，多余的任务保持 pending 状态排队。
+
+    报告按 (范围, 统计来源, 数据版本, 模板版本) 复用：已有相同缓存键的成功任务且文件仍在时直接返回该任务，
+    相同缓存键的任务正在排队或执行时返回该任务（同一报告只生成一次）。
+    每次生成后按 REPORT_RETENTION_DAYS / REPORT_MAX_FILES / REPORT_MAX_TOTAL_MB 清理报告任务生成的旧文件。
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCESS = "success"
+    STATUS_FAILED = "failed"
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    # 等待其他进程中的任务时查询状态的间隔（秒）
+    WAIT_POLL_SECONDS = 0.5
+
+    # 查找可复用任务与创建任务之间的锁，避免同一进程内并发的相同请求各自创建任务（首次使用时创建）
+    _submit_lock: Optional[asyncio.Lock] = None
+    # 限制同时执行任务数的信号量（首次使用时创建）
+    _semaphore: Optional[asyncio.Semaphore] = None
+    # 生成 Word 文档的进程池 / 线程池（首次使用时创建）
+    _executor: Optional[Executor] = None
+    # 后台任务（按任务 ID），同步生成时等待对应任务完成；同时避免任务在完成前被垃圾回收
+    _tasks: Dict[int, asyncio.Task] = {}
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # ==================== 提交与执行 ====================
+
+    async def submit(
+        self,
+        zone_id: Optional[int] = None,
+        source: Optional[ReportDataSourceEnum] = None
+    ) -> ReportJob:
+        """
+        返回可复用的报告任务，没有时创建任务并在后台开始执行
+
+        文件名包含任务 ID，同一秒内提交的多个任务不会互相覆盖；
+        任务记录先提交，保证后台会话能立即看到
+        """
+        source = ReportDataService.resolve_source(zone_id, source)
+        # 缓存键在读取数据之前生成，生成期间提交的变更不会被当作已包含在报告中
+        cache_key = await self.cache_key(zone_id, source)
+
+        async with self._get_submit_lock():
+            job = await self.find_reusable(cache_key)
+            if job is not None:
+                return job
+
+            now = datetime.now()
+            job = ReportJob(
+                zone_id=zone_id,
+                source=source.value,
+                cache_key=cache_key,
+                status=self.STATUS_PENDING,
+                filename="",
+                created_at=now
+            )
+            self.db.add(job)
+            await self.db.flush()
+            job.filename = f"heatmap_report_{now.strftime('%Y%m%d_%H%M%S')}_{job.id}.docx"
+            await self.db.commit()
+
+        task = asyncio.create_task(self._run(job.id, job.filename, zone_id, source))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def cache_key(self, zone_id: Optional[int], source: ReportDataSourceEnum) -> str:
+        """
+        报告缓存键
+
+        库区报告使用库区数据版本，全部范围使用各仓库的数据版本（含布局版本）；
+        模板版本包含报告的热度分档设置
+        """
+        if zone_id:
+            data_version = DataVersion.zone_version(zone_id)
+        else:
+            result = await self.db.execute(
+                select(Warehouse.id, Zone.id)
+                .outerjoin(Zone, Zone.warehouse_id == Warehouse.id)
+                .order_by(Warehouse.id, Zone.id)
+            )
+            zone_ids: Dict[int, List[int]] = {}
+            for warehouse_id, zone in result.all():
+                zone_ids.setdefault(warehouse_id, [])
+                if zone is not None:
+                    zone_ids[warehouse_id].append(zone)
+            data_version = "|".join(
+                DataVersion.warehouse_version(warehouse_id, zones)
+                for warehouse_id, zones in zone_ids.items()
+            )
+
+        template_version = (
+            REPORT_TEMPLATE_VERSION,
+            settings.report_heat_bucket_edges,
+            settings.report_heat_bucket_labels,
+        )
+        parts = (zone_id or "all", source.value, data_version, template_version)
+        return hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    async def find_reusable(self, cache_key: str) -> Optional[ReportJob]:
+        """相同缓存键的排队中 / 执行中任务，或文件仍存在的最近一次成功任务"""
+        result = await self.db.execute(
+            select(ReportJob)
+            .where(and_(
+                ReportJob.cache_key == cache_key,
+                ReportJob.status.in_(self.ACTIVE_STATUSES + (self.STATUS_SUCCESS,))
+            ))
+            .order_by(desc(ReportJob.id))
+        )
+        for job in result.scalars().all():
+            if job.status in self.ACTIVE_STATUSES:
+                return job
+            if os.path.exists(os.path.join(REPORTS_DIR, job.filename)):
+                return job
+        return None
+
+    @classmethod
+    async def wait(cls, job_id: int) -> None:
+        """等待任务结束（任务在其他进程中执行时轮询任务状态）"""
+        task = cls._tasks.get(job_id)
+        if task is not None:
+            # 请求被取消时不影响后台任务
+            await asyncio.shield(task)
+            return
+
+        while True:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(ReportJob, job_id)
+                if job is None or job.status not in cls.ACTIVE_STATUSES:
+                    return
+            await asyncio.sleep(cls.WAIT_POLL_SECONDS)
+
+    @classmethod
+    def _get_submit_lock(cls) -> asyncio.Lock:
+        if cls._submit_lock is None:
+            cls._submit_lock = asyncio.Lock()
+        return cls._submit_lock
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(max(settings.REPORT_WORKERS, 1))
+        return cls._semaphore
+
+    @classmethod
+    def _get_executor(cls) -> Executor:
+        """
+        REPORT_EXECUTOR=process 时使用进程池（spawn 启动，不继承事件循环和数据库连接），
+        thread 时使用线程池（文档生成仍会占用 GIL，只适合无法创建子进程的环境）
+        """
+        if cls._executor is None:
+            workers = max(settings.REPORT_WORKERS, 1)
+            if settings.REPORT_EXECUTOR == "thread":
+                cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+            else:
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        return cls._executor
+
+    @classmethod
+    async def _run(
+        cls,
+        job_id: int,
+        filename: str,
+        zone_id: Optional[int],
+        source: ReportDataSourceEnum
+    ) -> None:
+        """
+        后台执行报告任务
+
+        任务被取消（如应用关闭）时标记为失败后继续抛出，相同缓存键的请求不再复用该任务
+        """
+        finished = False
+        try:
+            async with cls._get_semaphore():
+                await cls._update(job_id, status=cls.STATUS_RUNNING, started_at=datetime.now(), error=None)
+
+                async with AsyncSessionLocal() as db:
+                    data = await ReportDataService(db).fetch(zone_id, source)
+                    # 热力分布图（服务端渲染，数据未变化时直接使用缓存的图片）
+                    data['heatmap_images'] = await render_report_images(db, zone_id)
+
+                os.makedirs(REPORTS_DIR, exist_ok=True)
+                output_path = os.path.join(REPORTS_DIR, filename)
+                loop = asyncio.get_running_loop()
+                try:
+                    await loop.run_in_executor(cls._get_executor(), generate_docx_report, data, output_path)
+                except BrokenProcessPool:
+                    # 工作进程异常退出后进程池不可再用，下一个任务重新创建
+                    cls._executor = None
+                    raise
+
+                await cls._update(job_id, status=cls.STATUS_SUCCESS, error=None, finished_at=datetime.now())
+                finished = True
+            await asyncio.to_thread(cls.evict_reports, await cls._generated_files(), filename)
+        except asyncio.CancelledError:
+            if not finished:
+                await asyncio.shield(cls._update(
+                    job_id,
+                    status=cls.STATUS_FAILED,
+                    error="报告任务已取消",
+                    finished_at=datetime.now()
+                ))
+            raise
+        except Exception as e:
+            await cls._update(
+                job_id,
+                status=cls.STATUS_FAILED,
+                error=f"报告生成失败: {str(e) or type(e).__name__}",
+                finished_at=datetime.now()
+            )
+
+    @staticmethod
+    async def _update(job_id: int, **values) -> None:
+        """在独立会话中更新任务状态"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(ReportJob).where(ReportJob.id == job_id).values(**values))
+            await db.commit()
+
+    @classmethod
+    async def fail_interrupted_jobs(cls) -> int:
+        """将服务重启前未完成的任务标记为失败，返回任务数"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ReportJob)
+                .where(ReportJob.status.in_(cls.ACTIVE_STATUSES))
+                .values(
+                    status=cls.STATUS_FAILED,
+                    error="服务重启，报告任务已中断",
+                    finished_at=datetime.now()
+                )
+            )
+            await db.commit()
+            return result.rowcount
+
+    @staticmethod
+    async def _generated_files() -> Set[str]:
+        """报告任务生成的文件名（report_jobs 中有记录的文件）"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(ReportJob.filename).where(ReportJob.filename != ""))
+            return set(result.scalars().all())
+
+    @staticmethod
+    def evict_reports(generated: Iterable[str], keep: Optional[str] = None) -> List[str]:
+        """
+        按保留策略删除旧报告文件，返回删除的文件名
+
+        只处理 generated 中的文件（报告任务生成的报告），目录中的其他文件不计入也不删除。
+        先删除超过 REPORT_RETENTION_DAYS 的文件，文件数或总大小仍超出上限时
+        从最早的文件开始删除；keep 指定的文件（刚生成的报告）不删除
+        """
+        if not os.path.isdir(REPORTS_DIR):
+            return []
+
+        generated = set(generated)
+        files = []
+        for filename in os.listdir(REPORTS_DIR):
+            if filename not in generated:
+                continue
+            try:
+                stat = os.stat(os.path.join(REPORTS_DIR, filename))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+        files.sort()
+
+        expire_before = time.time() - settings.REPORT_RETENTION_DAYS * 86400
+        max_bytes = settings.REPORT_MAX_TOTAL_MB * 1024 * 1024
+        count = len(files)
+        total_size = sum(size for _, size, _ in files)
+
+        removed = []
+        for mtime, size, filename in files:
+            expired = settings.REPORT_RETENTION_DAYS > 0 and mtime < expire_before
+            too_many = settings.REPORT_MAX_FILES > 0 and count > settings.REPORT_MAX_FILES
+            too_large = settings.REPORT_MAX_TOTAL_MB > 0 and total_size > max_bytes
+            if not (expired or too_many or too_large):
+                break
+            if filename == keep:
+                continue
+            try:
+                os.unlink(os.path.join(REPORTS_DIR, filename))
+            except OSError:
+                continue
+            count -= 1
+            total_size -= size
+            removed.append(filename)
+        return removed
+
+    @classmethod
+    async def stop(cls) -> None:
+        """
+        取消本进程中未完成的任务（标记为失败）并关闭进程池
+
+        应用退出时在关闭数据库连接之前调用，不等待排队中的文档
+        """
+        tasks = list(cls._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    # ==================== 查询 ====================
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务状态"""
+        job = await self.db.get(ReportJob, job_id)
+        if not job:
+            return None
+        return self.job_to_dict(job)
+
+    async def get_active_jobs(self) -> List[Dict[str, Any]]:
+        """获取排队中和执行中的任务（按创建时间倒序）"""
+        result = await self.db.execute(
+            select(ReportJob)
+            .where(ReportJob.status.in_(self.ACTIVE_STATUSES))
+            .order_by(desc(ReportJob.created_at))
+        )
+        return [self.job_to_dict(job) for job in result.scalars().all()]
+
+    @classmethod
+    def job_to_dict(cls, job: ReportJob) -> Dict[str, Any]:
+        """任务状态字典"""
+        def format_time(value: Optional[datetime]) -> Optional[str]:
+            return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+        return {
+            "job_id": job.id,
+            "zone_id": job.zone_id,
+            "source": job.source,
+            "status": job.status,
+            "filename": job.filename,
+            "error": job.error,
+            "download_url": f"/api/report/download/{job.filename}" if job.status == cls.STATUS_SUCCESS else None,
+            "created_at": format_time(job.created_at),
+            "started_at": format_time(job.started_at),
+            "finished_at": format_time(job.finished_at)
+        }
+
+
+async def render_report_images(db: AsyncSession, zone_id: Optional[int] = None):
+    """渲染报告中的热力分布图（全部历史数据），返回 [(标题, 图片路径)]"""
+    service = HeatmapRenderService(db)
+    params = HeatmapFilterParams(time_range="all")
+
+    if zone_id:
+        zone = await db.get(Zone, zone_id)
+        path = await service.render_zone_image(zone_id, params) if zone else None
+        return [(zone.name, path)] if path else []
+
+    # 全部范围：每个启用的仓库一张图，库区自上而下排列
+    warehouse_result = await db.execute(
+        select(Warehouse).where(Warehouse.is_active == True).order_by(Warehouse.id)
+    )
+    images = []
+    for warehouse in warehouse_result.scalars().all():
+        path = await service.render_warehouse_image(warehouse.id, params)
+        if path:
+            images.append((warehouse.name, path))
+    return images
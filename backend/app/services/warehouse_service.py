@@ -2,17 +2,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from app.models.warehouse import Warehouse, Zone, Aisle, Shelf, Location, ShelfType
+from app.services.data_version import DataVersion
+from app.services.heatmap_cache import HeatmapCache
+from app.services.layout_builder import LayoutBuilder, build_location_rows, shelf_code_prefix
+from app.services.location_index import LocationIndex
+from app.utils.etag import make_etag
 from app.schemas.warehouse import (
     WarehouseCreate, WarehouseUpdate, ZoneCreate, 
-    AisleCreate, ShelfCreate
+    AisleCreate, ShelfCreate, LayoutModeEnum
 )
 
 
 class WarehouseService:
     """仓库服务类"""
     
+    # 布局数据中的库区颜色（按库区顺序循环使用）
+    ZONE_COLORS = [
+        '#409eff', '#67c23a', '#e6a23c', '#f56c6c',
+        '#909399', '#9c27b0', '#00bcd4', '#ff9800'
+    ]
+    
     def __init__(self, db: AsyncSession):
         self.db = db
     
@@ -62,6 +73,8 @@ class WarehouseService:
         self.db.add(zone)
         await self.db.flush()
         await self.db.refresh(zone)
+        DataVersion.mark_zones(self.db, [zone.id])
+        DataVersion.mark_layout(self.db, zone.warehouse_id)
         return zone
     
     async def get_zones(self, warehouse_id: int, is_active: bool = True) -> List[Zone]:
@@ -81,6 +94,9 @@ class WarehouseService:
         self.db.add(aisle)
         await self.db.flush()
         await self.db.refresh(aisle)
+        zone = await self.db.get(Zone, aisle.zone_id)
+        DataVersion.mark_zones(self.db, [zone.id])
+        DataVersion.mark_layout(self.db, zone.warehouse_id)
         return aisle
     
     async def get_aisles(self, zone_id: int, is_active: bool = True) -> List[Aisle]:
@@ -96,48 +112,37 @@ class WarehouseService:
     
     async def create_shelf(self, data: ShelfCreate) -> Shelf:
         """创建货架"""
-        shelf = Shelf(**data.model_dump())
+        shelf_data = data.model_dump()
+        shelf_data["shelf_type"] = ShelfType(shelf_data["shelf_type"])
+        shelf = Shelf(**shelf_data)
         self.db.add(shelf)
         await self.db.flush()
         await self.db.refresh(shelf)
         
         # 自动创建库位
-        await self._create_locations_for_shelf(shelf)
+        zone_id, warehouse_id = await self._create_locations_for_shelf(shelf)
+        LocationIndex.invalidate(self.db)
+        DataVersion.mark_zones(self.db, [zone_id])
+        DataVersion.mark_layout(self.db, warehouse_id)
         
         return shelf
     
-    async def _create_locations_for_shelf(self, shelf: Shelf):
-        """为货架创建库位"""
-        # 获取货架的完整路径用于生成库位编码
-        aisle = await self.db.get(Aisle, shelf.aisle_id)
-        zone = await self.db.get(Zone, aisle.zone_id)
-        warehouse = await self.db.get(Warehouse, zone.warehouse_id)
-        
-        row_labels = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        
-        for row_idx in range(shelf.rows):
-            row_label = row_labels[row_idx]
-            for col_idx in range(shelf.columns):
-                col_num = col_idx + 1
-                # 库位编码格式: 库区代码 + 顺序号（如 C1, C2, B1, B2）
-                # 顺序号 = 行索引 * 列数 + 列索引 + 1
-                seq_num = row_idx * shelf.columns + col_idx + 1
-                code = f"{zone.code}{seq_num}"
-                # 加入仓库编码确保全局唯一
-                full_code = f"{warehouse.code}-{zone.code}-{aisle.code}-{shelf.code}-{code}"
-                
-                location = Location(
-                    shelf_id=shelf.id,
-                    code=code,
-                    full_code=full_code,
-                    row_label=row_label,
-                    column_number=col_num,
-                    row_index=row_idx,
-                    column_index=col_idx
-                )
-                self.db.add(location)
+    async def _create_locations_for_shelf(self, shelf: Shelf) -> Tuple[int, int]:
+        """为货架批量创建库位，返回 (库区ID, 仓库ID)"""
+        # 一次查询货架的完整路径用于生成库位编码
+        result = await self.db.execute(
+            select(Warehouse.code, Zone.code, Aisle.code, Zone.id, Zone.warehouse_id)
+            .join(Zone, Aisle.zone_id == Zone.id)
+            .join(Warehouse, Zone.warehouse_id == Warehouse.id)
+            .where(Aisle.id == shelf.aisle_id)
+        )
+        warehouse_code, zone_code, aisle_code, zone_id, warehouse_id = result.one()
         
-        await self.db.flush()
+        code_prefix = shelf_code_prefix(warehouse_code, zone_code, aisle_code, shelf.code)
+        await LayoutBuilder(self.db).insert_locations(
+            build_location_rows(shelf.id, shelf.rows, shelf.columns, zone_code, code_prefix)
+        )
+        return zone_id, warehouse_id
     
     async def get_shelves(
         self, 
@@ -171,6 +176,8 @@ class WarehouseService:
             return None
         
         shelf.display_label = display_label
+        aisle = await self.db.get(Aisle, shelf.aisle_id)
+        DataVersion.mark_zones(self.db, [aisle.zone_id])
         await self.db.flush()
         await self.db.refresh(shelf)
         await self.db.commit()
@@ -198,6 +205,10 @@ class WarehouseService:
         """
         获取仓库的完整布局数据，用于画布编辑器加载
         
+        一次查询取得全部启用的库区、通道、货架，结果按布局版本缓存，
+        布局变化（DataVersion.mark_layout）提交后缓存失效。
+        返回的缓存对象可能被多个请求共享，调用方不应修改
+        
         返回格式:
         {
             "zones": [
@@ -225,62 +236,97 @@ class WarehouseService:
             ]
         }
         """
-        # 库区颜色列表
-        zone_colors = [
-            '#409eff', '#67c23a', '#e6a23c', '#f56c6c', 
-            '#909399', '#9c27b0', '#00bcd4', '#ff9800'
-        ]
+        # 布局版本在读取数据库之前取得，读取期间提交的变更不会写入新版本的缓存项
+        cache_key = self._layout_cache_key(warehouse_id)
+        cached = HeatmapCache.get(cache_key, model=None)
+        if cached is not None:
+            return cached
         
-        zones = await self.get_zones(warehouse_id)
-        layout_data = {"zones": []}
+        # 一次外连接查询 库区-通道-货架，没有通道的库区、没有货架的通道也保留
+        result = await self.db.execute(
+            select(
+                Zone.id, Zone.code, Zone.name,
+                Aisle.id, Aisle.code, Aisle.name, Aisle.y_coordinate,
+                Shelf.id, Shelf.code, Shelf.name, Shelf.shelf_type,
+                Shelf.rows, Shelf.columns, Shelf.layers, Shelf.x_coordinate
+            )
+            .select_from(Zone)
+            .outerjoin(Aisle, and_(Aisle.zone_id == Zone.id, Aisle.is_active == True))
+            .outerjoin(Shelf, and_(Shelf.aisle_id == Aisle.id, Shelf.is_active == True))
+            .where(and_(Zone.warehouse_id == warehouse_id, Zone.is_active == True))
+            .order_by(Zone.sort_order, Zone.id, Aisle.sort_order, Aisle.id, Shelf.sort_order, Shelf.id)
+        )
         
-        for zone_idx, zone in enumerate(zones):
-            zone_data = {
-                "code": zone.code,
-                "name": zone.name,
-                "color": zone_colors[zone_idx % len(zone_colors)],
-                "aisles": []
-            }
+        layout_data = {"zones": []}
+        zones = {}
+        aisles = {}
+        for (
+            zone_id, zone_code, zone_name,
+            aisle_id, aisle_code, aisle_name, y_coordinate,
+            shelf_id, shelf_code, shelf_name, shelf_type,
+            rows, columns, layers, x_coordinate
+        ) in result.all():
+            zone_data = zones.get(zone_id)
+            if zone_data is None:
+                zone_data = zones[zone_id] = {
+                    "code": zone_code,
+                    "name": zone_name,
+                    "color": self.ZONE_COLORS[len(zones) % len(self.ZONE_COLORS)],
+                    "aisles": []
+                }
+                layout_data["zones"].append(zone_data)
+            if aisle_id is None:
+                continue
             
-            aisles = await self.get_aisles(zone.id)
-            for aisle in aisles:
-                aisle_data = {
-                    "code": aisle.code,
-                    "name": aisle.name,
-                    "y_coordinate": aisle.y_coordinate,
+            aisle_data = aisles.get(aisle_id)
+            if aisle_data is None:
+                aisle_data = aisles[aisle_id] = {
+                    "code": aisle_code,
+                    "name": aisle_name,
+                    "y_coordinate": y_coordinate,
                     "shelves": []
                 }
-                
-                shelves = await self.get_shelves(aisle.id)
-                for shelf in shelves:
-                    shelf_data = {
-                        "code": shelf.code,
-                        "name": shelf.name,
-                        "shelf_type": shelf.shelf_type.value,
-                        "rows": shelf.rows,
-                        "columns": shelf.columns,
-                        "layers": shelf.layers if hasattr(shelf, 'layers') else 1,
-                        "x_coordinate": shelf.x_coordinate
-                    }
-                    aisle_data["shelves"].append(shelf_data)
-                
                 zone_data["aisles"].append(aisle_data)
+            if shelf_id is None:
+                continue
             
-            layout_data["zones"].append(zone_data)
+            aisle_data["shelves"].append({
+                "code": shelf_code,
+                "name": shelf_name,
+                "shelf_type": shelf_type.value,
+                "rows": rows,
+                "columns": columns,
+                "layers": layers,
+                "x_coordinate": x_coordinate
+            })
         
+        HeatmapCache.set(cache_key, layout_data)
         return layout_data
     
+    @staticmethod
+    def _layout_cache_key(warehouse_id: int) -> str:
+        """布局数据的缓存键（包含布局版本，布局变化后旧缓存项不再命中）"""
+        return "cache:layout:{}:{}".format(warehouse_id, DataVersion.layout_version(warehouse_id))
+    
+    def get_layout_etag(self, warehouse_id: int) -> str:
+        """仓库布局数据的 ETag（由布局版本生成，不查询数据库）"""
+        return make_etag("layout", warehouse_id, DataVersion.layout_version(warehouse_id))
+    
     # ==================== 批量创建 ====================
     
     async def setup_warehouse_layout(
         self,
         warehouse_code: str,
         warehouse_name: str,
-        zones_config: List[dict]
+        zones_config: List[dict],
+        mode: LayoutModeEnum = LayoutModeEnum.REPLACE
     ) -> Warehouse:
         """
         批量设置仓库布局
         
+        mode=replace 时删除现有布局后重建；mode=reconcile 时按编码对比，
+        只新增、更新、停用变化的部分，保留的库位 ID 和热度数据不变
+        
         zones_config 示例:
         [
             {
@@ -312,62 +358,31 @@ class WarehouseService:
         )
         warehouse = result.scalar_one_or_none()
         
+        builder = LayoutBuilder(self.db)
+        if warehouse and mode == LayoutModeEnum.RECONCILE:
+            changes = await builder.reconcile(warehouse, zones_config)
+            LocationIndex.invalidate(self.db)
+            # 库位 ID 不变，只使发生变化的库区的数据版本失效
+            DataVersion.mark_zones(self.db, changes["zone_ids"])
+            DataVersion.mark_layout(self.db, warehouse.id)
+            await self.db.refresh(warehouse)
+            return warehouse
+        
         if warehouse:
-            # 仓库已存在，先删除所有现有的库区（级联删除巷道、货架、库位）
-            zones_result = await self.db.execute(
-                select(Zone).where(Zone.warehouse_id == warehouse.id)
-            )
-            existing_zones = list(zones_result.scalars().all())
-            for zone in existing_zones:
-                await self.db.delete(zone)
-            await self.db.flush()
+            # 仓库已存在，先批量删除所有现有的库区（及巷道、货架、库位和库位的热度数据）
+            await builder.clear(warehouse.id)
         else:
             # 仓库不存在，创建新仓库
             warehouse = Warehouse(code=warehouse_code, name=warehouse_name)
             self.db.add(warehouse)
             await self.db.flush()
         
-        for zone_idx, zone_config in enumerate(zones_config):
-            zone = Zone(
-                warehouse_id=warehouse.id,
-                code=zone_config["code"],
-                name=zone_config["name"],
-                sort_order=zone_idx
-            )
-            self.db.add(zone)
-            await self.db.flush()
-            
-            for aisle_idx, aisle_config in enumerate(zone_config.get("aisles", [])):
-                aisle = Aisle(
-                    zone_id=zone.id,
-                    code=aisle_config["code"],
-                    name=aisle_config["name"],
-                    y_coordinate=aisle_config.get("y_coordinate", aisle_idx),
-                    sort_order=aisle_idx
-                )
-                self.db.add(aisle)
-                await self.db.flush()
-                
-                for shelf_idx, shelf_config in enumerate(aisle_config.get("shelves", [])):
-                    shelf_type_str = shelf_config.get("shelf_type", "normal")
-                    shelf_type = ShelfType(shelf_type_str)
-                    
-                    shelf = Shelf(
-                        aisle_id=aisle.id,
-                        code=shelf_config["code"],
-                        name=shelf_config["name"],
-                        shelf_type=shelf_type,
-                        rows=shelf_config.get("rows", 4),
-                        columns=shelf_config.get("columns", 5),
-                        layers=shelf_config.get("layers", 1),
-                        x_coordinate=shelf_config.get("x_coordinate", shelf_idx),
-                        sort_order=shelf_idx
-                    )
-                    self.db.add(shelf)
-                    await self.db.flush()
-                    
-                    # 创建库位
-                    await self._create_locations_for_shelf(shelf)
+        # 各层布局在内存中生成后批量插入
+        await builder.build(warehouse, zones_config)
         
+        LocationIndex.invalidate(self.db)
+        # 库区被删除重建，ID 可能复用，使全部库区的数据版本失效
+        DataVersion.mark_all(self.db)
+        DataVersion.mark_layout(self.db, warehouse.id)
         await self.db.refresh(warehouse)
         return warehouse
@@ -0,0 +1,9 @@
+"""工具函数模块"""
+from app.utils.bulk import chunked, upsert_rows
+from app.utils.upload import spool_upload
+
+__all__ = [
+    "chunked",
+    "upsert_rows",
+    "spool_upload"
+]
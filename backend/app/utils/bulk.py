@@ -0,0 +1,132 @@
+"""批量写入工具函数"""
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+# 单条 SQL 允许的最大绑定参数数量
+MAX_BIND_PARAMS = {
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+    "postgresql": 32767,
+    "mysql": 65535,
+}
+
+# 单条多行 INSERT 的默认最大行数
+DEFAULT_BATCH_SIZE = 2000
+
+
+def enable_multirow_inserts(engine: AsyncEngine) -> None:
+    """
+    executemany 形式的 INSERT（含 ON CONFLICT / ON DUPLICATE KEY）以多行 INSERT 发送
+
+    使用 SQLAlchemy 的 insertmanyvalues：单行语句只编译一次并被缓存，
+    执行时按行数展开为多行 VALUES，每条语句不超过 DEFAULT_BATCH_SIZE 行和 MAX_BIND_PARAMS 个参数。
+    不必为每批构造 insert().values(rows) 再逐个编译（行数多时编译比执行还慢，且在事件循环上进行）
+    """
+    dialect = engine.dialect
+    dialect.use_insertmanyvalues = True
+    dialect.use_insertmanyvalues_wo_returning = True
+    dialect.insertmanyvalues_page_size = DEFAULT_BATCH_SIZE
+    dialect.insertmanyvalues_max_parameters = MAX_BIND_PARAMS.get(dialect.name, 999)
+
+
+def chunked(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    """按固定大小切分序列"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _dialect_insert(dialect_name: str):
+    """获取支持冲突处理的方言 INSERT 构造函数"""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
+    return insert
+
+
+def _merge_duplicates(
+    rows: Iterable[Dict[str, Any]],
+    key_columns: Sequence[str],
+    update_columns: Sequence[str],
+    additive: bool,
+    replace_columns: Sequence[str] = ()
+) -> List[Dict[str, Any]]:
+    """
+    合并同一主键的重复行
+    
+    同一条多行 INSERT 中不能出现重复的冲突键（PostgreSQL 会直接报错），
+    累加模式下对更新列求和（replace_columns 取最后一行的值），覆盖模式下保留最后一行。
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[c] for c in key_columns)
+        existing = merged.get(key)
+        if existing is None or not additive:
+            merged[key] = dict(row)
+        else:
+            for column in update_columns:
+                existing[column] = (existing.get(column) or 0) + (row.get(column) or 0)
+            for column in replace_columns:
+                existing[column] = row.get(column)
+    return list(merged.values())
+
+
+async def upsert_rows(
+    db: AsyncSession,
+    table: Table,
+    rows: Iterable[Dict[str, Any]],
+    key_columns: Sequence[str],
+    update_columns: Sequence[str],
+    additive: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    replace_columns: Sequence[str] = ()
+) -> int:
+    """
+    按方言批量插入或更新
+    
+    - SQLite / PostgreSQL: INSERT ... ON CONFLICT (key_columns) DO UPDATE
+    - MySQL: INSERT ... ON DUPLICATE KEY UPDATE
+    
+    key_columns 必须对应表上的唯一约束。
+    additive=True 时冲突行的 update_columns 在原值上累加，否则直接覆盖；
+    replace_columns 在累加模式下也直接覆盖。
+    
+    语句以 executemany 分批执行，应用的引擎已启用 enable_multirow_inserts，
+    每批以多行 INSERT 发送；未启用时由驱动逐行执行，结果相同。
+    rows 中各行的列须相同。
+    
+    返回写入的行数（合并重复键之后）
+    """
+    rows = _merge_duplicates(rows, key_columns, update_columns, additive, replace_columns)
+    if not rows:
+        return 0
+    
+    dialect_name = db.get_bind().dialect.name
+    insert = _dialect_insert(dialect_name)
+    
+    stmt = insert(table)
+    if dialect_name == "mysql":
+        new_values = stmt.inserted
+    else:
+        new_values = stmt.excluded
+    
+    if additive:
+        set_ = {c: table.c[c] + new_values[c] for c in update_columns}
+    else:
+        set_ = {c: new_values[c] for c in update_columns}
+    set_.update({c: new_values[c] for c in replace_columns})
+    
+    if dialect_name == "mysql":
+        stmt = stmt.on_duplicate_key_update(set_)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_)
+    
+    for batch in chunked(rows, batch_size):
+        await db.execute(stmt, list(batch))
+    
+    return len(rows)
@@ -0,0 +1,114 @@
+"""缓存后端"""
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.config import settings
+
+
+class LocalCacheBackend:
+    """
+    进程内缓存后端
+
+    缓存项按 LRU 淘汰，数量不超过 max_entries；计数器（数据版本）单独保存，不参与淘汰。
+    缓存项直接保存 Python 对象，不做序列化。
+    计数器随进程重启归零，epoch 为每次启动生成的随机标识，用于区分重启前后相同的计数
+    """
+
+    name = "local"
+    stores_objects = True
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex[:8]
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Redis 缓存后端（多个进程共享缓存和数据版本）
+
+    缓存项以字符串保存并设置过期时间，容量和淘汰策略由 Redis 的 maxmemory 配置决定。
+    使用同步客户端，使数据版本可以在会话提交的事件回调中直接递增
+    """
+
+    name = "redis"
+    stores_objects = False
+
+    def __init__(self, url: str, prefix: str = "heatmap:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis 需要安装 redis 包: pip install redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.max_entries = None
+        # 所有进程共用第一个进程写入的 epoch
+        self.client.set(self.prefix + "epoch", uuid.uuid4().hex[:8], nx=True)
+        self.epoch = self.client.get(self.prefix + "epoch").decode()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+    def get_counter(self, key: str) -> int:
+        value = self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class NullCacheBackend(LocalCacheBackend):
+    """不缓存（CACHE_BACKEND=none），只保留数据版本计数"""
+
+    name = "none"
+
+    def __init__(self):
+        super().__init__(max_entries=0)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        pass
+
+
+_backend = None
+
+
+def get_cache_backend():
+    """获取全局缓存后端（按 CACHE_BACKEND 配置首次使用时创建）"""
+    global _backend
+    if _backend is None:
+        if settings.CACHE_BACKEND == "redis":
+            _backend = RedisCacheBackend(settings.CACHE_REDIS_URL)
+        elif settings.CACHE_BACKEND == "none":
+            _backend = NullCacheBackend()
+        else:
+            _backend = LocalCacheBackend(settings.HEATMAP_CACHE_SIZE)
+    return _backend
@@ -0,0 +1,45 @@
+"""ETag / 条件请求工具函数"""
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+# 响应可以缓存，但每次使用前必须用 If-None-Match 向服务器验证
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    """由数据版本等组成部分生成强 ETag"""
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """请求的 If-None-Match 是否与 ETag 匹配（按弱比较，忽略 W/ 前缀）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """在响应中设置 ETag 和要求重新验证的 Cache-Control"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match 匹配时返回 304 响应，否则返回 None"""
+    if not etag_matches(request, etag):
+        return None
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
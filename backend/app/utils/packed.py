@@ -0,0 +1,54 @@
+"""二进制列式打包工具函数"""
+import json
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+
+# 文件标识与版本
+PACKED_MAGIC = b"HMP1"
+
+# 支持的列类型（小端序），与 JS 的 Int32Array / Uint32Array / Float64Array 对应
+PACKED_DTYPES = {
+    "int32": "<i4",
+    "uint32": "<u4",
+    "float64": "<f8",
+}
+
+# 每列数据的起始偏移按该字节数对齐，使前端可以直接在 ArrayBuffer 上创建类型数组视图
+PACKED_ALIGNMENT = 8
+
+
+def _padding(length: int) -> int:
+    return (-length) % PACKED_ALIGNMENT
+
+
+def pack_columns(header: Dict[str, Any], columns: Sequence[Tuple[str, str, List[Any]]]) -> bytes:
+    """
+    将 JSON 头部和若干等长数值列打包为二进制
+
+    布局:
+    - 4 字节标识 HMP1
+    - 4 字节小端 uint32: 头部 JSON 的字节数
+    - 头部 JSON（UTF-8），额外包含 columns: [{name, dtype, offset, length}]
+    - 补齐到 8 字节边界后为数据区，依次存放各列数据，每列都按 8 字节对齐；
+      offset 为列数据相对数据区开头的字节偏移
+
+    columns: [(列名, 类型, 值列表)]，类型为 PACKED_DTYPES 中的键
+    """
+    buffers = [np.asarray(values, dtype=PACKED_DTYPES[dtype]).tobytes() for _, dtype, values in columns]
+
+    descriptors = []
+    offset = 0
+    for (name, dtype, values), buffer in zip(columns, buffers):
+        descriptors.append({"name": name, "dtype": dtype, "offset": offset, "length": len(values)})
+        offset += len(buffer) + _padding(len(buffer))
+
+    header_bytes = json.dumps(
+        {**header, "columns": descriptors}, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    parts = [PACKED_MAGIC, struct.pack("<I", len(header_bytes)), header_bytes, b"\0" * _padding(8 + len(header_bytes))]
+    for buffer in buffers:
+        parts.append(buffer)
+        parts.append(b"\0" * _padding(len(buffer)))
+    return b"".join(parts)
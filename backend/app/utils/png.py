@@ -0,0 +1,37 @@
+"""PNG 编码工具函数"""
+import struct
+import zlib
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def encode_png(rgb: np.ndarray, compress_level: int = 6) -> bytes:
+    """
+    将 (高, 宽, 3) 的 uint8 数组编码为 8 位 RGB 的 PNG
+
+    不依赖图像库：每行前加滤波类型 0（None）后整体 zlib 压缩。
+    热力图由大块纯色组成，不做行滤波也能获得较好的压缩率
+    """
+    if rgb.ndim != 3 or rgb.shape[2] != 3:
+        raise ValueError("rgb 必须是 (高, 宽, 3) 的数组")
+    height, width = rgb.shape[:2]
+    if height == 0 or width == 0:
+        raise ValueError("图像尺寸不能为 0")
+
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = np.ascontiguousarray(rgb, dtype=np.uint8).reshape(height, width * 3)
+
+    # 宽、高、位深 8、颜色类型 2（RGB）、压缩/滤波/隔行方式均为 0
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"".join((
+        PNG_SIGNATURE,
+        _chunk(b"IHDR", header),
+        _chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)),
+        _chunk(b"IEND", b""),
+    ))
@@ -0,0 +1,149 @@
+"""分位数与分级断点工具函数"""
+import math
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    对数分桶的近似分位数草图（DDSketch）
+
+    正值 x 落入下标为 ceil(log_gamma(x)) 的桶，gamma = (1 + a) / (1 - a)，
+    返回的分位数与真实值的相对误差不超过 a；0 和负值单独计数（按 0 处理）。
+    add 对整批数据向量化分桶，耗时与数据量成线性，内存只与值域跨度有关；
+    两个草图可以 merge 合并（如多个库区汇总为整个仓库）。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 应在 (0, 1) 之间")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        # counts[i] 为下标 offset + i 的桶的计数
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + int(self.counts.sum())
+
+    def add(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive):
+            indexes = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            low = int(indexes.min())
+            self._add_counts(low, np.bincount(indexes - low))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("只能合并精度相同的草图")
+        self.zero_count += other.zero_count
+        if len(other.counts):
+            self._add_counts(other.offset, other.counts)
+
+    def _add_counts(self, offset: int, counts: np.ndarray) -> None:
+        if not len(self.counts):
+            self.offset, self.counts = offset, counts.astype(np.int64)
+            return
+        low = min(self.offset, offset)
+        high = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(high - low, dtype=np.int64)
+        merged[self.offset - low:self.offset - low + len(self.counts)] += self.counts
+        merged[offset - low:offset - low + len(counts)] += counts
+        self.offset, self.counts = low, merged
+
+    def bucket_values(self) -> np.ndarray:
+        """各桶的代表值（与桶内任意值的相对误差不超过 relative_accuracy）"""
+        indexes = np.arange(self.offset, self.offset + len(self.counts), dtype=np.float64)
+        return 2 * np.power(self.gamma, indexes) / (self.gamma + 1)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """近似分位数（q 取 0~1，与 numpy 的 lower 插值方式相同按排名取值）"""
+        total = self.count
+        if total == 0:
+            return np.zeros(len(qs))
+        ranks = np.floor(np.asarray(qs, dtype=np.float64) * (total - 1))
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        positions = np.searchsorted(cumulative, ranks, side="right")
+        values = self.bucket_values()
+        result = np.zeros(len(ranks))
+        in_buckets = ranks >= self.zero_count
+        result[in_buckets] = values[np.minimum(positions[in_buckets], len(values) - 1)]
+        return result
+
+    def histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """非空桶的 (代表值, 计数)，不含 0 值"""
+        nonzero = self.counts > 0
+        return self.bucket_values()[nonzero], self.counts[nonzero]
+
+
+def jenks_breaks(values: np.ndarray, weights: np.ndarray, classes: int) -> np.ndarray:
+    """
+    加权的 Jenks 自然断点（Fisher 动态规划，组内加权离差平方和最小）
+
+    values 须升序且互不相同，weights 为各值的计数。
+    耗时 O(classes * m^2)，m 为不同值的数量，调用方应先用直方图/草图把 m 控制在几百以内。
+    返回 classes - 1 个内部断点（第 i 档的下界），值的种类不足时断点相应减少
+    """
+    m = len(values)
+    classes = min(classes, m)
+    if classes <= 1:
+        return np.zeros(0)
+
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    # 前缀和: W = 权重, S = 加权和, Q = 加权平方和；区间 [s, e] 的离差平方和 = Q - S^2 / W
+    W = np.concatenate(([0.0], np.cumsum(weights)))
+    S = np.concatenate(([0.0], np.cumsum(weights * values)))
+    Q = np.concatenate(([0.0], np.cumsum(weights * values * values)))
+
+    start = np.arange(m)[:, None]
+    end = np.arange(m)[None, :]
+    valid = start <= end
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_weight = W[end + 1] - W[start]
+        segment_sum = S[end + 1] - S[start]
+        ssd = np.where(valid, Q[end + 1] - Q[start] - segment_sum * segment_sum / segment_weight, np.inf)
+
+    # cost[e]: 把 [0, e] 分为 j 档的最小代价；first[j][e]: 最优分法中最后一档的起点
+    cost = ssd[0].copy()
+    first = np.zeros((classes, m), dtype=np.int64)
+    for j in range(1, classes):
+        # 最后一档为 [s, e]（s >= j），前面 [0, s - 1] 分为 j 档
+        candidates = np.full((m, m), np.inf)
+        candidates[1:] = cost[:-1, None] + ssd[1:]
+        candidates[:j] = np.inf
+        first[j] = np.argmin(candidates, axis=0)
+        cost = candidates[first[j], np.arange(m)]
+
+    breaks = []
+    e = m - 1
+    for j in range(classes - 1, 0, -1):
+        s = int(first[j][e])
+        breaks.append(values[s])
+        e = s - 1
+    return np.array(breaks[::-1])
+
+
+def assign_buckets(values: Iterable[float], breaks: Sequence[float]) -> np.ndarray:
+    """按内部断点分档: 小于 breaks[0] 为第 0 档，不小于 breaks[i - 1] 且小于 breaks[i] 为第 i 档"""
+    return np.searchsorted(np.asarray(breaks, dtype=np.float64), np.asarray(values, dtype=np.float64), side="right")
+
+
+def exact_or_sketch_quantiles(
+    values: np.ndarray,
+    qs: Sequence[float],
+    exact_max: int,
+    sketch: Optional[QuantileSketch] = None
+) -> Tuple[np.ndarray, bool]:
+    """数量不超过 exact_max 时精确计算，否则使用草图，返回 (分位数, 是否近似)"""
+    if len(values) <= exact_max:
+        return np.quantile(values, qs, method="lower") if len(values) else np.zeros(len(qs)), False
+    if sketch is None:
+        sketch = QuantileSketch()
+        sketch.add(values)
+    return sketch.quantiles(qs), True
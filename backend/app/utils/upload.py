@@ -0,0 +1,48 @@
+"""上传文件工具函数"""
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO
+from fastapi import UploadFile
+
+# 每次从上传流读取的字节数
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+async def _copy_upload(file: UploadFile, target: BinaryIO) -> None:
+    """分段复制上传内容到目标文件"""
+    while True:
+        data = await file.read(UPLOAD_READ_SIZE)
+        if not data:
+            break
+        target.write(data)
+
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile) -> AsyncIterator[BinaryIO]:
+    """
+    将上传文件分段写入磁盘临时文件，返回定位到开头的文件对象
+
+    避免一次性 read() 整个上传内容，退出上下文时删除临时文件
+    """
+    with tempfile.TemporaryFile() as spooled:
+        await _copy_upload(file, spooled)
+        spooled.seek(0)
+        yield spooled
+
+
+async def save_upload(file: UploadFile) -> str:
+    """
+    将上传文件分段写入磁盘临时文件并返回路径
+
+    用于请求结束后仍需读取文件的场景（如后台导入任务），由调用方负责删除
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as saved:
+        try:
+            await _copy_upload(file, saved)
+        except Exception:
+            saved.close()
+            os.unlink(saved.name)
+            raise
+        return saved.name
@@ -9,21 +9,49 @@ from contextlib import asynccontextmanager
 from app.config import settings
 from app.database import init_db, close_db, init_default_admin
 from app.api import api_router
+from app.services.import_job_service import ImportJobService
+from app.services.report_job_service import ReportJobService
+from app.services.heat_push_service import HeatPushHub
+from app.services.heat_rollup_service import HeatRollupService
+from app.services.pick_event_service import PickEventBuffer
+from app.services.heat_scoring import HeatScoringService
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    # 热度公式配置无效时启动失败，配置了权重但所选公式不使用时给出警告
+    HeatScoringService.check_settings()
     # 启动时尝试初始化数据库（失败不影响应用启动）
     try:
         await init_db()
         print("数据库初始化完成")
         # 初始化默认管理员账户
         await init_default_admin()
+        # 服务重启前未完成的异步导入任务和报告任务标记为失败
+        await ImportJobService.fail_interrupted_jobs()
+        await ReportJobService.fail_interrupted_jobs()
+        # 旧版本写入的热度值（为 0）在接受请求之前按当前公式重算，重算时一并重建汇总
+        await HeatScoringService.recompute_if_unscored()
+        # 热度汇总为空或与原始数据不一致（如旧版本升级后）时重建，在接受写入之前完成
+        await HeatRollupService.rebuild_if_inconsistent()
     except Exception as e:
         print(f"警告: 数据库连接失败 - {e}")
         print("部分功能（如模板下载）仍可使用，但数据导入功能需要数据库连接")
+    # 热度实时推送：监听提交后的数据变更
+    HeatPushHub.start()
+    # 拣货事件的后台批量写入
+    PickEventBuffer.start()
+    # 热度公式变化后在后台重算已存储的热度值
+    HeatScoringService.start()
     yield
+    await HeatScoringService.stop()
+    # 写入缓冲中剩余的拣货事件
+    await PickEventBuffer.stop()
+    # 通知推送连接关闭，避免长连接阻塞退出
+    await HeatPushHub.stop()
+    # 取消未完成的报告任务（标记为失败），关闭生成报告文档的进程池
+    await ReportJobService.stop()
     # 关闭时清理资源
     try:
         await close_db()
@@ -48,12 +76,16 @@ app = FastAPI(
     
     ### 热度计算公式
     
-    $$H = w_1 \\cdot F + w_2 \\cdot Q$$
+    由 HEAT_SCORER 选择，默认热度值等于拣货频率（留空且配置了 HEAT_WEIGHT_* 时使用 weighted）；weighted 公式为
+    
+    $$H = S \\cdot \\frac{w_1 \\cdot F / F_{max} + w_2 \\cdot Q / Q_{max} + w_3 \\cdot O / O_{max}}{w_1 + w_2 + w_3}$$
     
     - H = 热度值
     - F = 拣货频率
     - Q = 周转率
-    - w1, w2 = 权重系数
+    - O = 出库数量
+    - F_max, Q_max, O_max = 所在库区单日记录的最大值
+    - w1, w2, w3 = 权重系数，S = 热度值上限
     """,
     version="1.0.0",
     lifespan=lifespan
@@ -66,6 +98,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 允许前端读取条件请求使用的 ETag
+    expose_headers=["ETag"],
 )
 
 # 注册路由
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为 location_heat_data 添加 (location_id, date) 唯一约束
+
+批量导入和拣货事件使用 INSERT ... ON CONFLICT 写入热度数据，依赖该唯一约束。
+迁移会先把 date 归一化为当天 00:00:00，并删除同一库位同一天的重复记录（保留最新一条），
+然后重建热度汇总。
+
+应用启动时会自动执行同样的检查（init_db 和 HeatRollupService.rebuild_if_inconsistent），
+本脚本用于不启动服务时手动迁移，支持 SQLite / PostgreSQL / MySQL。
+
+运行方式：
+    cd backend
+    python migrate_add_heat_unique_key.py
+"""
+import asyncio
+
+import app.models  # noqa: F401  注册全部模型
+from app.database import engine, init_db
+from app.services.heat_rollup_service import HeatRollupService
+
+
+async def migrate():
+    """执行迁移"""
+    try:
+        # 创建缺失的表，缺少唯一约束时去重并创建唯一索引
+        await init_db()
+        print("location_heat_data 已有 (location_id, date) 唯一约束。")
+
+        if await HeatRollupService.rebuild_if_inconsistent():
+            print("热度汇总已重建。")
+        print("迁移成功！")
+    except Exception as e:
+        print(f"迁移失败: {e}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
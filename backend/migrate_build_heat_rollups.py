@@ -0,0 +1,33 @@
+"""
+数据库迁移脚本：创建 location_heat_rollups 表（库位热度汇总）并根据现有热度数据重建
+
+运行方式：
+    cd backend
+    python migrate_build_heat_rollups.py
+"""
+import asyncio
+
+from app.database import engine, init_db, AsyncSessionLocal
+from app.services.heat_rollup_service import HeatRollupService
+
+
+async def migrate():
+    """执行迁移"""
+    try:
+        # 创建缺失的表（已存在的表不受影响）
+        await init_db()
+        
+        async with AsyncSessionLocal() as db:
+            print("正在根据 location_heat_data 重建热度汇总...")
+            await HeatRollupService(db).rebuild()
+            await db.commit()
+        
+        print("迁移成功！location_heat_rollups 已重建。")
+    except Exception as e:
+        print(f"迁移失败: {e}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
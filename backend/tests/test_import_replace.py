@@ -0,0 +1,118 @@
+"""替换模式导入：中途失败时原有热度数据保持不变"""
+import asyncio
+from io import BytesIO
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import app.models  # noqa: F401  注册全部模型
+from app.config import settings
+from app.database import Base
+from app.models.warehouse import Location, LocationHeatData
+from app.schemas.warehouse import ImportModeEnum
+from app.services.heat_rollup_service import HeatRollupService
+from app.services.heatmap_service import HeatmapService
+from app.services.import_service import ImportService
+
+ORIGINAL_ROWS = [
+    ("A-01-01-A1", "2026-01-01", 5),
+    ("A-01-01-A2", "2026-01-01", 7),
+    ("A-01-01-A1", "2026-01-02", 3),
+]
+
+REPLACEMENT_ROWS = [
+    ("A-01-01-A1", "2026-02-01", 11),
+    ("A-01-01-A3", "2026-02-01", 13),
+    ("A-01-01-A4", "2026-02-02", 17),
+    ("A-01-01-A5", "2026-02-02", 19),
+]
+
+
+def make_csv(rows, trailer: str = "") -> BytesIO:
+    lines = ["库位编码,日期,拣货频率"] + [f"{code},{day},{frequency}" for code, day, frequency in rows]
+    return BytesIO(("\n".join(lines) + "\n" + trailer).encode("utf-8"))
+
+
+async def heat_snapshot(db: AsyncSession):
+    result = await db.execute(
+        select(Location.full_code, LocationHeatData.date, LocationHeatData.pick_frequency)
+        .join(Location, LocationHeatData.location_id == Location.id)
+    )
+    return sorted((code, day.strftime("%Y-%m-%d"), frequency) for code, day, frequency in result.all())
+
+
+def run_replace_after_original(tmp_path, replacement: BytesIO, before_replace=None):
+    """
+    先以替换模式导入 ORIGINAL_ROWS，再导入 replacement
+
+    before_replace 在两次导入之间调用。返回第二次导入的结果、之后的热度数据和汇总是否一致
+    """
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'import.db'}", poolclass=NullPool)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+            async with session_factory() as db:
+                result = await ImportService(db).import_csv_file(make_csv(ORIGINAL_ROWS), "original.csv")
+                assert result["status"] == "success"
+
+            if before_replace:
+                before_replace()
+            async with session_factory() as db:
+                result = await ImportService(db).import_csv_file(replacement, "replacement.csv", ImportModeEnum.REPLACE)
+
+            async with session_factory() as db:
+                return result, await heat_snapshot(db), await HeatRollupService(db).is_consistent()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+
+
+def expected_original():
+    return sorted(ORIGINAL_ROWS)
+
+
+def test_replace_keeps_original_data_when_later_chunk_fails_to_parse(tmp_path):
+    # 第三块中的引号没有闭合，读取到该块时 read_csv 报错
+    replacement = make_csv(REPLACEMENT_ROWS, trailer='"A-01-01-A6,2026-02-03,23\n')
+
+    result, heat_rows, consistent = run_replace_after_original(tmp_path, replacement)
+
+    assert result["status"] == "failed"
+    assert result["imported_rows"] == 0
+    assert heat_rows == expected_original()
+    assert consistent
+
+
+def test_replace_keeps_original_data_when_later_chunk_fails_to_write(tmp_path, monkeypatch):
+    original_upsert = HeatmapService.bulk_upsert_heat_data
+    calls = []
+
+    async def failing_upsert(self, records, *args, **kwargs):
+        # 第一块正常写入，第二块写入失败
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise RuntimeError("写入失败")
+        return await original_upsert(self, records, *args, **kwargs)
+
+    result, heat_rows, consistent = run_replace_after_original(
+        tmp_path,
+        make_csv(REPLACEMENT_ROWS),
+        before_replace=lambda: monkeypatch.setattr(HeatmapService, "bulk_upsert_heat_data", failing_upsert)
+    )
+
+    assert len(calls) == 2
+    assert result["status"] == "failed"
+    assert result["imported_rows"] == 0
+    assert heat_rows == expected_original()
+    assert consistent
@@ -1,7 +1,7 @@
 import axios from 'axios'
 import type { 
   Warehouse, Zone, Aisle, Shelf, 
-  HeatmapData, HeatmapFilterParams, ImportResult,
+  HeatmapData, WarehouseHeatmapData, HeatmapFilterParams, HeatmapColumns, ColumnarLocations, HeatDelta, HeatScaleOptions, ImportResult,
   User, LoginRequest, LoginResponse, 
   CreateUserRequest, UpdateUserRequest,
   ChangePasswordRequest, ResetPasswordRequest, UserProfileUpdate
@@ -178,18 +178,123 @@ export const warehouseApi = {
 
 // ==================== 热力图 ====================
 
+const PACKED_ARRAY_TYPES = {
+  int32: Int32Array,
+  uint32: Uint32Array,
+  float64: Float64Array
+} as const
+
+interface PackedColumn {
+  name: string
+  dtype: keyof typeof PACKED_ARRAY_TYPES
+  offset: number
+  length: number
+}
+
+/**
+ * 解码 format=packed 的热力图响应
+ *
+ * 布局: "HMP1" + uint32 头部长度 + JSON 头部，补齐到 8 字节后为数据区；
+ * 库位各列直接在 ArrayBuffer 上创建类型数组视图，不复制也不逐个创建对象
+ */
+export const decodePackedHeatmap = (
+  buffer: ArrayBuffer
+): HeatmapColumns<ColumnarLocations<Int32Array | Uint32Array, Float64Array>> => {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== 'HMP1') {
+    throw new Error('无法识别的热力图数据格式')
+  }
+  const headerLength = view.getUint32(4, true)
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)))
+  const dataStart = Math.ceil((8 + headerLength) / 8) * 8
+
+  const locations: Record<string, Int32Array | Uint32Array | Float64Array> = {}
+  for (const column of header.columns as PackedColumn[]) {
+    const ArrayType = PACKED_ARRAY_TYPES[column.dtype]
+    locations[column.name] = new ArrayType(buffer, dataStart + column.offset, column.length)
+  }
+  delete header.columns
+  delete header.location_count
+  return { ...header, locations }
+}
+
+const heatmapQueryParams = (params: HeatmapFilterParams) => ({
+  time_range: params.time_range,
+  shelf_type: params.shelf_type,
+  start_date: params.start_date,
+  end_date: params.end_date
+})
+
+// 图片/瓦片地址的查询字符串（用于 <img> 或瓦片图层，省略未设置的参数）
+const heatmapImageQuery = (params: HeatmapFilterParams, zoom?: number) => {
+  const query = new URLSearchParams()
+  Object.entries({ ...heatmapQueryParams(params), zoom }).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') query.set(key, String(value))
+  })
+  const text = query.toString()
+  return text ? `?${text}` : ''
+}
+
 export const heatmapApi = {
-  // 获取热力图数据
-  getHeatmapData: (zoneId: number, params: HeatmapFilterParams): Promise<HeatmapData> => 
+  // 获取热力图数据（传入 scale 时附带服务端热度分级和每个库位的档位）
+  getHeatmapData: (zoneId: number, params: HeatmapFilterParams, scale?: HeatScaleOptions): Promise<HeatmapData> => 
     api.get(`/heatmap/zone/${zoneId}`, { 
-      params: {
-        time_range: params.time_range,
-        shelf_type: params.shelf_type,
-        start_date: params.start_date,
-        end_date: params.end_date
-      }
+      params: { ...heatmapQueryParams(params), ...scale }
     }),
   
+  // 获取整个仓库（所有库区）的热力图数据
+  getWarehouseHeatmap: (
+    warehouseId: number,
+    params: HeatmapFilterParams,
+    scale?: HeatScaleOptions
+  ): Promise<WarehouseHeatmapData> =>
+    api.get(`/heatmap/warehouse/${warehouseId}`, {
+      params: { ...heatmapQueryParams(params), ...scale }
+    }),
+  
+  // 获取列式热力图数据（库位字段为平行数组）
+  getHeatmapColumns: (zoneId: number, params: HeatmapFilterParams, scale?: HeatScaleOptions): Promise<HeatmapColumns> =>
+    api.get(`/heatmap/zone/${zoneId}`, {
+      params: { ...heatmapQueryParams(params), ...scale, format: 'columnar' }
+    }),
+  
+  // 获取二进制列式热力图数据（解码为类型数组）
+  getHeatmapPacked: async (zoneId: number, params: HeatmapFilterParams, scale?: HeatScaleOptions) => {
+    const buffer: ArrayBuffer = await api.get(`/heatmap/zone/${zoneId}`, {
+      params: { ...heatmapQueryParams(params), ...scale, format: 'packed' },
+      responseType: 'arraybuffer'
+    })
+    return decodePackedHeatmap(buffer)
+  },
+  
+  // 订阅库区热度实时推送（Server-Sent Events），返回的 EventSource 需在离开页面时 close()
+  subscribeZoneHeat: (
+    zoneId: number,
+    params: HeatmapFilterParams,
+    handlers: { onDelta: (delta: HeatDelta) => void, onReload: () => void }
+  ): EventSource => {
+    // 货架类型不影响库位热度，推送接口不接受该参数
+    const source = new EventSource(
+      `${api.defaults.baseURL}/heatmap/zone/${zoneId}/stream${heatmapImageQuery({ ...params, shelf_type: undefined })}`
+    )
+    source.addEventListener('delta', (event) => handlers.onDelta(JSON.parse((event as MessageEvent).data)))
+    source.addEventListener('reload', () => handlers.onReload())
+    return source
+  },
+  
+  // 库区热力图 PNG 地址（zoom 为空时服务端自动选择缩放级别）
+  getZoneImageUrl: (zoneId: number, params: HeatmapFilterParams, zoom?: number): string =>
+    `${api.defaults.baseURL}/heatmap/zone/${zoneId}/image${heatmapImageQuery(params, zoom)}`,
+  
+  // 仓库热力图 PNG 地址
+  getWarehouseImageUrl: (warehouseId: number, params: HeatmapFilterParams, zoom?: number): string =>
+    `${api.defaults.baseURL}/heatmap/warehouse/${warehouseId}/image${heatmapImageQuery(params, zoom)}`,
+  
+  // 库区热力图瓦片地址模板（{z}/{x}/{y} 由瓦片图层替换）
+  getZoneTileUrlTemplate: (zoneId: number, params: HeatmapFilterParams): string =>
+    `${api.defaults.baseURL}/heatmap/zone/${zoneId}/tiles/{z}/{x}/{y}.png${heatmapImageQuery(params)}`,
+  
   // 更新单个库位热度
   updateHeatData: (
     locationId: number,
@@ -216,17 +321,37 @@ export const heatmapApi = {
 // ==================== 数据导入 ====================
 
 export interface ImportHistoryItem {
-  id: number
+  id: number | null
+  job_id?: number
   filename: string
   file_type: string
   total_rows: number
   success_rows: number
   failed_rows: number
-  status: 'success' | 'partial' | 'failed'
+  status: 'success' | 'partial' | 'failed' | 'pending' | 'running'
   errors: string[] | null
   import_time: string
 }
 
+export interface ImportJobStatus {
+  job_id: number
+  filename: string
+  file_type: string
+  status: 'pending' | 'running' | 'success' | 'partial' | 'failed'
+  processed_rows: number
+  estimated_total_rows: number | null
+  imported_rows: number
+  skipped_rows: number
+  failed_rows: number
+  rows_per_second: number | null
+  eta_seconds: number | null
+  errors: string[] | null
+  result: ImportResult | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
 export const importApi = {
   // 导入 Excel
   importExcel: (file: File): Promise<ImportResult> => {
@@ -256,28 +381,66 @@ export const importApi = {
   
   // 获取导入历史记录
   getImportHistory: (limit: number = 20): Promise<ImportHistoryItem[]> =>
-    api.get('/import/history', { params: { limit } })
+    api.get('/import/history', { params: { limit } }),
+  
+  // 获取异步导入任务状态
+  getImportJob: (jobId: number): Promise<ImportJobStatus> =>
+    api.get(`/import/jobs/${jobId}`)
 }
 
 // ==================== 分析报告 ====================
 
+export type ReportJobStatusValue = 'pending' | 'running' | 'success' | 'failed'
+
 export interface ReportInfo {
   filename: string
   size: number
   created_at: string
+  // 排队中 / 生成中的报告带有任务 ID，文件生成后才能下载
+  status: ReportJobStatusValue
+  job_id?: number
 }
 
 export interface GenerateReportResult {
   success: boolean
+  job_id: number
   filename: string
   message: string
 }
 
+export interface ReportJobSubmitResult {
+  job_id: number
+  status: ReportJobStatusValue
+  filename: string
+  status_url: string
+}
+
+export interface ReportJobStatus {
+  job_id: number
+  zone_id: number | null
+  source: 'detail' | 'rollup'
+  status: ReportJobStatusValue
+  filename: string
+  error: string | null
+  download_url: string | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
 export const reportApi = {
   // 生成分析报告
   generateReport: (zoneId?: number): Promise<GenerateReportResult> => 
     api.get('/report/generate', { params: { zone_id: zoneId } }),
   
+  // 提交后台生成任务（立即返回任务 ID）
+  submitReportJob: (zoneId?: number): Promise<ReportJobSubmitResult> => 
+    api.get('/report/generate', { params: { zone_id: zoneId, async_mode: true } }),
+  
+  // 获取报告任务状态
+  getReportJob: (jobId: number): Promise<ReportJobStatus> => 
+    api.get(`/report/jobs/${jobId}`),
+  
   // 获取报告列表
   getReportList: (): Promise<{ reports: ReportInfo[] }> => 
     api.get('/report/list'),
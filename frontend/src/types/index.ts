@@ -138,6 +138,26 @@ export interface LocationHeatItem {
   pick_frequency: number
   turnover_rate: number
   inventory_qty: number
+  heat_bucket?: number | null  // 热度分级的档位（请求分级时返回）
+}
+
+// 热度分级方法：quantile 等数量分级，jenks 自然断点分级
+export type HeatScaleMethod = 'quantile' | 'jenks'
+
+// 服务端计算的热度分级（热度为 0 的库位归入第 0 档）
+export interface HeatScale {
+  method: HeatScaleMethod
+  bucket_count: number
+  breaks: number[]  // 第 1 档起各档的下界
+  percentiles: Record<'p50' | 'p90' | 'p99', number>
+  sample_count: number
+  approximate: boolean
+}
+
+// 热度分级请求参数
+export interface HeatScaleOptions {
+  scale: HeatScaleMethod
+  buckets?: number  // 2~20，默认 5
 }
 
 // 货架热度数据
@@ -174,6 +194,87 @@ export interface HeatmapData {
   time_range: TimeRange
   start_date: string
   end_date: string
+  heat_scale?: HeatScale | null
+}
+
+// 仓库热力图中的库区数据（min_heat / max_heat 为库区内的范围）
+export interface ZoneHeatData {
+  zone_id: number
+  zone_code: string
+  zone_name: string
+  aisles: AisleHeatData[]
+  min_heat: number
+  max_heat: number
+}
+
+// 仓库热力图响应（min_heat / max_heat 为所有库区共用的范围）
+export interface WarehouseHeatmapData {
+  warehouse_id: number
+  warehouse_code: string
+  warehouse_name: string
+  zones: ZoneHeatData[]
+  min_heat: number
+  max_heat: number
+  time_range: TimeRange
+  start_date: string
+  end_date: string
+  heat_scale?: HeatScale | null  // 所有库区共用的分级
+}
+
+// 列式热力图：货架（库位为 locations 中 [location_start, location_start + location_count) 区间）
+export interface ColumnarShelf {
+  shelf_id: number
+  aisle_index: number
+  shelf_code: string
+  shelf_name: string
+  display_label?: string | null
+  shelf_type: ShelfType
+  x_coordinate: number
+  rows: number
+  columns: number
+  layers: number
+  location_start: number
+  location_count: number
+}
+
+// 列式热力图：库位各列的平行数组（编码类字段为 strings 中的下标）
+export interface ColumnarLocations<I = ArrayLike<number>, F = ArrayLike<number>> {
+  location_id: I
+  code: I
+  full_code_prefix: I
+  full_code_suffix: I
+  row_label: I
+  column_number: I
+  row_index: I
+  column_index: I
+  heat_value: F
+  pick_frequency: I
+  turnover_rate: F
+  inventory_qty: I
+  heat_bucket?: I  // 请求热度分级时返回
+}
+
+// 列式热力图响应（format=columnar 为普通数组，format=packed 解码后为类型数组）
+export interface HeatmapColumns<L = ColumnarLocations> {
+  zone_id: number
+  zone_code: string
+  zone_name: string
+  min_heat: number
+  max_heat: number
+  time_range: TimeRange
+  start_date: string
+  end_date: string
+  heat_scale?: HeatScale
+  strings: string[]
+  aisles: Omit<AisleHeatData, 'shelves'>[]
+  shelves: ColumnarShelf[]
+  locations: L
+}
+
+// 实时推送的库位热度增量（所选时间范围内的聚合值，直接替换对应库位）
+export interface HeatDelta {
+  zone_id: number
+  locations: Pick<ColumnarLocations<number[], number[]>, 'location_id' | 'heat_value' | 'pick_frequency' | 'turnover_rate' | 'inventory_qty'>
 }
 
 // 筛选参数